@@ -14,12 +14,21 @@ import handlers as hand
 from core.config import settings
 from core.err import exception_logging
 from db import models, utils  # NOTE for subserver
+from db.database import redis_engine
+from db.utils.redis import LOCAL_CACHE, CashManager
 from db.utils.tests import test_base, test_redis_base
 from scheduler.balance import balance_decrement, users_notice
+from scheduler.cluster import refresh_cluster
 from scheduler.config_freezer import check_freeze_configs, validate_configs
 from scheduler.dump import regular_dump
+from scheduler.idle import freeze_idle_configs
 from scheduler.notices import send_notice
-from wg.utils import SSH
+from scheduler.peer_pool import refill_peer_pool
+from scheduler.rebalance import rebalance_cluster
+from scheduler.server_status import poll_server_status
+from scheduler.sync import sync_servers
+from scheduler.telemetry import collect_peer_stats
+from wg.utils import CLUSTER, KEYS, load_addresses
 
 logger = logging.getLogger()
 
@@ -114,6 +123,55 @@ def create_scheduler(bot):
         seconds=3600,
         start_date=datetime.now() + timedelta(seconds=15),
     )
+    scheduler.add_job(
+        poll_server_status,
+        trigger="interval",
+        seconds=settings.status_interval,
+        start_date=datetime.now() + timedelta(seconds=1),
+    )
+    scheduler.add_job(
+        refresh_cluster,
+        trigger="interval",
+        seconds=60,
+        start_date=datetime.now() + timedelta(seconds=60),
+    )
+    scheduler.add_job(
+        refill_peer_pool,
+        trigger="interval",
+        seconds=60,
+        start_date=datetime.now() + timedelta(seconds=5),
+    )
+    scheduler.add_job(
+        rebalance_cluster,
+        trigger="interval",
+        seconds=3600,
+        start_date=datetime.now() + timedelta(seconds=120),
+        kwargs={"bot": bot},
+    )
+    scheduler.add_job(
+        collect_peer_stats,
+        trigger="interval",
+        seconds=settings.stats_interval,
+        start_date=datetime.now() + timedelta(seconds=25),
+    )
+    if settings.wg_sync:
+        scheduler.add_job(
+            sync_servers,
+            trigger="interval",
+            seconds=settings.wg_sync_interval,
+            start_date=datetime.now() + timedelta(seconds=45),
+        )
+    scheduler.add_job(
+        freeze_idle_configs,
+        trigger="interval",
+        seconds=settings.idle_interval,
+        start_date=datetime.now() + timedelta(seconds=90),
+    )
+    scheduler.add_job(
+        CashManager.migrate,
+        trigger="date",
+        run_date=datetime.now() + timedelta(seconds=5),
+    )
     scheduler.add_job(
         regular_dump,
         trigger="interval",
@@ -217,13 +275,19 @@ async def test_subserver():
 async def start_bot():
     """Запускает бота и его службы.
 
-    Эта функция инициализирует подключение по SSH к wireguard серверу, 
+    Эта функция загружает реестр серверов wireguard и подключается к ним по SSH,
     создает бота, диспетчер и планировщик, а затем запускает все службы.
 
     Returns:
         set: Множество задач, которые были созданы для выполнения.
     """
-    await SSH.connect()
+    await utils.register_default_server()
+    CLUSTER.load(await utils.get_wg_servers())
+    await CLUSTER.connect()
+    await refresh_cluster()
+    await load_addresses(await utils.get_wg_addresses())
+    KEYS.start()
+    LOCAL_CACHE.start(redis_engine)
     bot, dp = create_bot()
     scheduler = create_scheduler(bot)
     return await start_services(bot, dp, scheduler)
@@ -3,6 +3,7 @@
 import logging
 import os
 from datetime import datetime
+from typing import Literal
 
 from pandas import DataFrame
 from pydantic import HttpUrl, SecretStr
@@ -149,11 +150,94 @@ class Settings(BaseSettings):
     """Стоимость подписки."""
     cash_ttl: int
     """Время жизни кэша."""
+    cash_local_size: int = 10000
+    """Максимальное количество записей кэша в памяти процесса (0 - отключен)."""
+    cash_local_ttl: float = 30
+    """Время жизни записи кэша в памяти процесса (сек)."""
+    cash_local_strict: bool = False
+    """Выдавать записи кэша в памяти процесса только при активной подписке на инвалидации."""
     transfer_fee: float
     """Комиссия за перевод."""
     max_dumps: int
     """Максимальное количество дампов."""
 
+    ssh_pool_size: int = 2
+    """Количество SSH-соединений с сервером WireGuard."""
+    ssh_pool_channels: int = 8
+    """Максимальное количество одновременных каналов на одно SSH-соединение."""
+    ssh_pool_timeout: float = 10
+    """Время ожидания свободного SSH-канала (сек)."""
+    ssh_pool_check: float = 30
+    """Период фоновой проверки SSH-соединений (сек)."""
+
+    wg_server_capacity: int = 1000
+    """Емкость сервера из настроек (количество конфигураций) при регистрации в реестре."""
+
+    wg_network: str = "10.1.0.0/16"
+    """Подсеть адресов пиров WireGuard."""
+    wg_reserved: list[str] = ["10.1.0.1"]
+    """Зарезервированные адреса и диапазоны подсети (адрес сервера и т.п.)."""
+
+    wg_key_pool: int = 32
+    """Количество заранее сгенерированных пар ключей WireGuard."""
+
+    peer_pool_size: int = 20
+    """Количество заранее созданных (заблокированных) пиров в пуле."""
+    peer_pool_batch: int = 10
+    """Максимальное количество пиров, добавляемых в пул за одно пополнение."""
+
+    rebalance_dry_run: bool = True
+    """Только планировать перенос пиров между серверами (план записывается в лог)."""
+    rebalance_max_moves: int = 20
+    """Максимальное количество переносов пиров за один запуск."""
+    rebalance_threshold: float = 0.1
+    """Допустимая разница заполненности серверов (доля емкости), при которой перенос не выполняется."""
+    rebalance_notice_delay: float = 0.1
+    """Пауза между уведомлениями пользователей о переносе (сек)."""
+
+    status_interval: float = 5
+    """Период опроса состояния серверов WireGuard (сек)."""
+    status_ttl: int = 30
+    """Время жизни состояния серверов в кэше (сек); более старое состояние считается неизвестным."""
+
+    stats_interval: int = 300
+    """Период сбора статистики трафика пиров (сек)."""
+    stats_retention: int = 7
+    """Срок хранения замеров трафика пиров (дни); суточная статистика хранится бессрочно."""
+
+    idle_days: dict = {0: 0, 0.3: 7, 1: 14, 2.5: 30, 5: 30}
+    """Срок без рукопожатий (дни), после которого конфигурация замораживается из-за простоя, для разных тарифов (0 - не замораживать)."""
+    idle_interval: int = 3600
+    """Период поиска простаивающих конфигураций (сек)."""
+    idle_batch: int = 200
+    """Максимальное количество конфигураций, замораживаемых из-за простоя за один запуск."""
+
+    wg_backend: Literal["ssh", "local", "fake"] = "ssh"
+    """Драйвер доступа к серверам WireGuard: ssh, local (сервер из настроек на том же хосте, что и бот) или fake (серверы в памяти, для тестов)."""
+    wg_local_pywg: str = "~/Scripts/pywg.py"
+    """Путь к pywg.py для локального драйвера (запускается через `sudo -n`)."""
+
+    wg_agent: bool = False
+    """Использовать долгоживущий агент pywg вместо запуска скрипта на каждую команду."""
+    wg_agent_socket: str | None = None
+    """Unix-сокет агента, запущенного через systemd (если не задан - агент запускается через SSH)."""
+    wg_agent_timeout: float = 10
+    """Время ожидания ответа агента (сек)."""
+    wg_agent_coalesce: int = 200
+    """Окно объединения изменений в агенте (мсек), 0 - каждое изменение применяется отдельно."""
+
+    wg_ops_concurrency: int = 8
+    """Максимум одновременных операций с одним сервером WireGuard."""
+    wg_ops_limits: dict[str, int] = {"interactive": 8, "billing": 4, "reconciliation": 2}
+    """Максимум одновременных операций с сервером по классам приоритета (`wg.ops.OpClass`)."""
+    wg_ops_timeout: float = 30
+    """Время ожидания очереди операций сервера WireGuard (сек)."""
+
+    wg_sync: bool = False
+    """Периодически приводить серверы WireGuard к состоянию из БД (`scheduler.sync`)."""
+    wg_sync_interval: int = 60
+    """Период синхронизации серверов WireGuard с БД (сек)."""
+
     model_config = SettingsConfigDict(
         env_file=os.path.join(PATH, ".env"),
         env_file_encoding="utf-8",
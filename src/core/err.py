@@ -107,12 +107,12 @@ def redis_exceptor(func):
     """
 
     @wraps(func)
-    async def wrapper(pipeline: Pipeline):
+    async def wrapper(pipeline: Pipeline, *args, **kwargs):
         """Обертка для функции с обработкой исключений Redis."""
         try:
             logQuery = str(getattr(pipeline, "command_stack", ""))
 
-            result = await func(pipeline)
+            result = await func(pipeline, *args, **kwargs)
             return result
 
         except rexc.AuthenticationError:
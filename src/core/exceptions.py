@@ -68,6 +68,17 @@ class WireguardError(BaseBotError):
         super().__init__(text)
 
 
+class AddressPoolError(WireguardError):
+    """Ошибка, возникающая при отсутствии свободных адресов в подсети WireGuard.
+
+    Args:
+        text (str): Сообщение об ошибке. Defaults to "Свободные адреса подсети wireguard закончились".
+    """
+
+    def __init__(self, text="Свободные адреса подсети wireguard закончились") -> None:
+        super().__init__(text)
+
+
 class PayError(BaseBotError):
     """Ошибка, возникающая при проблемах с оплатой.
 
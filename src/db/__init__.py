@@ -9,5 +9,7 @@
     - models - Модели таблиц БД
     - ddl - триггеры и триггерные функции
     - database - точки входа в PostgreSQL и Redis
+    - local_cache - кэш данных Redis в памяти процесса
+    - codec - кодирование объектов моделей для кэша в Redis
 
 """
@@ -0,0 +1,186 @@
+"""Кодирование объектов моделей для кэша в Redis"""
+
+import enum
+import logging
+from collections.abc import Sequence
+from operator import attrgetter
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from ipaddress import IPv4Address, IPv4Interface, IPv6Address, IPv6Interface
+from uuid import UUID
+from zlib import crc32
+
+import msgpack
+
+logger = logging.getLogger("redis")
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+"""datetime: Начало отсчета времени для кодирования дат."""
+MICROSECOND = timedelta(microseconds=1)
+
+EXT_DATETIME = 1
+"""int: Код типа msgpack для datetime: [микросекунды от EPOCH, смещение часового пояса (сек) | None]."""
+EXT_DECIMAL = 2
+"""int: Код типа msgpack для Decimal (строка)."""
+EXT_UUID = 3
+"""int: Код типа msgpack для UUID (16 байт)."""
+EXT_INTERFACE = 4
+"""int: Код типа msgpack для IPv4Interface / IPv6Interface (адрес и длина префикса)."""
+EXT_ADDRESS = 5
+"""int: Код типа msgpack для IPv4Address / IPv6Address (адрес)."""
+EXT_ENUM = 6
+"""int: Код типа msgpack для перечислений: [номер перечисления в кодеке, значение]."""
+
+
+class ModelCodec:
+    """Компактное кодирование объектов модели с сохранением типов.
+
+    Объект кодируется одним значением msgpack: `[schema_id, version, *values]`,
+    где values - значения колонок в порядке `columns`, без имен полей. Типы,
+    которых нет в msgpack (datetime, Decimal, UUID, IP-адреса, перечисления),
+    кодируются расширениями, поэтому значения восстанавливаются точно, а None
+    остается None. Версия схемы вычисляется по набору колонок и перечислений: значение,
+    записанное другой схемой, не декодируется и считается промахом кэша.
+
+    Объекты восстанавливаются без валидации моделью (`build`), так как
+    значения уже имеют типы колонок.
+
+    Args:
+        schema_id (int): Идентификатор модели в закодированных значениях.
+        model (type): Класс модели.
+        columns (Sequence[str]): Кодируемые колонки.
+        enums (Sequence[type[enum.Enum]], optional): Перечисления в значениях колонок.
+    """
+
+    def __init__(
+        self,
+        schema_id: int,
+        model: type,
+        columns: Sequence[str],
+        enums: Sequence[type[enum.Enum]] = (),
+    ) -> None:
+        self.schema_id = schema_id
+        self.model = model
+        self.columns = tuple(columns)
+        self.enums = tuple(enums)
+        self.version = crc32(
+            ",".join((*self.columns, *(cls.__name__ for cls in self.enums))).encode()
+        )
+        """int: Версия схемы (контрольная сумма имен колонок и перечислений)."""
+        self.__packer = msgpack.Packer(default=self.__default)
+        self.__ext_packer = msgpack.Packer()
+        self.__values = attrgetter(*self.columns)
+        self.__enum_index = {cls: index for index, cls in enumerate(self.enums)}
+
+    def __default(self, value):
+        """Кодирует значение, не поддерживаемое msgpack."""
+        match value:
+            case datetime():
+                offset = value.utcoffset()
+                if offset is None:
+                    micros = (value - EPOCH.replace(tzinfo=None)) // MICROSECOND
+                    seconds = None
+                else:
+                    micros = (value - EPOCH) // MICROSECOND
+                    seconds = offset // timedelta(seconds=1)
+                return msgpack.ExtType(
+                    EXT_DATETIME, self.__ext_packer.pack([micros, seconds])
+                )
+            case Decimal():
+                return msgpack.ExtType(EXT_DECIMAL, str(value).encode())
+            case UUID():
+                return msgpack.ExtType(EXT_UUID, value.bytes)
+            case IPv4Interface() | IPv6Interface():
+                return msgpack.ExtType(
+                    EXT_INTERFACE, value.ip.packed + bytes([value.network.prefixlen])
+                )
+            case IPv4Address() | IPv6Address():
+                return msgpack.ExtType(EXT_ADDRESS, value.packed)
+            case enum.Enum():
+                index = self.__enum_index[type(value)]
+                return msgpack.ExtType(
+                    EXT_ENUM, self.__ext_packer.pack([index, value.value])
+                )
+        raise TypeError(f"Неподдерживаемый тип значения кэша: {type(value).__name__}")
+
+    def __ext_hook(self, code: int, data: bytes):
+        """Декодирует расширение msgpack."""
+        if code == EXT_DATETIME:
+            micros, offset = msgpack.unpackb(data)
+            if offset is None:
+                return EPOCH.replace(tzinfo=None) + micros * MICROSECOND
+            return (EPOCH + micros * MICROSECOND).astimezone(
+                timezone(timedelta(seconds=offset))
+            )
+        if code == EXT_DECIMAL:
+            return Decimal(data.decode())
+        if code == EXT_UUID:
+            return UUID(bytes=data)
+        if code == EXT_INTERFACE:
+            interface = IPv4Interface if len(data) == 5 else IPv6Interface
+            return interface((int.from_bytes(data[:-1]), data[-1]))
+        if code == EXT_ADDRESS:
+            return IPv4Address(data) if len(data) == 4 else IPv6Address(data)
+        if code == EXT_ENUM:
+            index, value = msgpack.unpackb(data)
+            return self.enums[index](value)
+        return msgpack.ExtType(code, data)
+
+    def encode(self, obj) -> bytes:
+        """Кодирует объект модели.
+
+        Args:
+            obj: Объект модели.
+
+        Returns:
+            bytes: Закодированное значение.
+
+        Raises:
+            TypeError: Если значение колонки имеет неподдерживаемый тип.
+        """
+        values = self.__values(obj)
+        if len(self.columns) == 1:
+            values = (values,)
+        return self.__packer.pack([self.schema_id, self.version, *values])
+
+    def decode(self, data: bytes):
+        """Декодирует значения колонок.
+
+        Args:
+            data (bytes): Закодированное значение.
+
+        Returns:
+            dict | None: Значения колонок (None, если значение закодировано
+            другой схемой или повреждено).
+        """
+        try:
+            values = msgpack.unpackb(data, ext_hook=self.__ext_hook)
+        except (ValueError, TypeError, IndexError, msgpack.UnpackException):
+            logger.warning(f"Поврежденное значение кэша модели {self.model.__name__}")
+            return None
+
+        if (
+            not isinstance(values, list)
+            or values[:2] != [self.schema_id, self.version]
+            or len(values) != len(self.columns) + 2
+        ):
+            return None
+        return dict(zip(self.columns, values[2:]))
+
+    def build(self, data: bytes):
+        """Восстанавливает объект модели.
+
+        Args:
+            data (bytes): Закодированное значение.
+
+        Returns:
+            object | None: Объект модели (None, если значение не декодировано).
+        """
+        values = self.decode(data)
+        if values is None:
+            return None
+
+        obj = self.model()
+        for col, value in values.items():
+            setattr(obj, col, value)
+        return obj
@@ -35,6 +35,12 @@ __pool = ConnectionPool.from_url(settings.CASHBASE_URL, decode_responses=True)
 redis_engine = Redis.from_pool(__pool)
 """Redis: Асинхронный клиент Redis, использующий пул соединений."""
 
+__binary_pool = ConnectionPool.from_url(settings.CASHBASE_URL)
+"""ConnectionPool: Пул соединений для Redis без декодирования ответов."""
+
+redis_binary = Redis.from_pool(__binary_pool)
+"""Redis: Асинхронный клиент Redis для двоичных значений (закодированных объектов моделей)."""
+
 
 async def execute_query(query, echo=True):
     """Выполняет SQL-запрос в асинхронной сессии.
@@ -76,11 +82,13 @@ async def execute_query(query, echo=True):
 
 
 @redis_exceptor
-async def execute_redis_query(pipeline: Pipeline):
+async def execute_redis_query(pipeline: Pipeline, raise_on_error: bool = True):
     """Выполняет запросы Redis в рамках асинхронного пайплайна.
 
     Args:
         pipeline (Pipeline): Пайплайн Redis с командами для выполнения.
+        raise_on_error (bool, optional): Если False, ошибки отдельных команд
+            возвращаются в результатах вместо исключения.
 
     Returns:
         list: Результаты выполнения команд в пайплайне.
@@ -91,7 +99,7 @@ async def execute_redis_query(pipeline: Pipeline):
     if pipeline.command_stack:
         rlogger.info(f"TRYING TO REDIS QUERY :: {pipeline.command_stack}")
         async with pipeline as pipe:
-            result = await pipe.execute()
+            result = await pipe.execute(raise_on_error=raise_on_error)
             rlogger.info("REDIS QUERY COMPLETED")
             return result
     return []
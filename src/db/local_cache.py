@@ -0,0 +1,208 @@
+"""Кэш данных Redis в памяти процесса"""
+
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from time import monotonic
+from uuid import uuid4
+
+logger = logging.getLogger("redis")
+
+INVALIDATE_CHANNEL = "cache:invalidate"
+"""str: Канал Redis, в который публикуются инвалидированные ключи."""
+
+
+class LocalCache:
+    """LRU-кэш с ограниченным временем жизни записей перед Redis.
+
+    Хранит ответы Redis (а не объекты моделей: обработчики меняют полученные
+    объекты на месте) не дольше `ttl` и не более `size` записей. Записи,
+    измененные в Redis любым процессом, удаляются по сообщениям канала
+    `INVALIDATE_CHANNEL` (`listen`); собственные сообщения процесс пропускает.
+
+    Запись, прочитанная из Redis до инвалидации, но сохраняемая после нее,
+    отбрасывается (`version`). При потере подписки кэш очищается: в строгом
+    режиме (`strict`) записи до восстановления подписки не выдаются, иначе
+    устаревание ограничено `ttl`.
+
+    Args:
+        size (int): Максимальное количество записей (0 - кэш отключен).
+        ttl (float): Время жизни записи (сек).
+        strict (bool, optional): Выдавать записи только при активной подписке.
+    """
+
+    def __init__(self, size: int, ttl: float, strict: bool = False) -> None:
+        self.size = size
+        self.ttl = ttl
+        self.strict = strict
+        self.origin = f"{os.getpid()}:{uuid4().hex[:8]}"
+        """str: Идентификатор процесса в сообщениях инвалидации."""
+
+        self.version = 0
+        """int: Номер последней инвалидации."""
+        self.connected = False
+        """bool: Активна ли подписка на инвалидации."""
+        self.__data: OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self.__task: asyncio.Task = None
+
+        self.hits = 0
+        """int: Количество выданных записей."""
+        self.misses = 0
+        """int: Количество промахов (включая пропуски в строгом режиме)."""
+        self.evictions = 0
+        """int: Количество вытесненных и истекших записей."""
+        self.invalidations = 0
+        """int: Количество инвалидированных записей."""
+        self.stale = 0
+        """int: Количество отброшенных записей, инвалидированных во время чтения."""
+
+    def __len__(self):
+        return len(self.__data)
+
+    @property
+    def enabled(self):
+        """bool: Выдаются ли записи кэша."""
+        return self.size > 0 and (self.connected or not self.strict)
+
+    @property
+    def metrics(self):
+        """dict[str, int | float | bool]: Счетчики кэша."""
+        requests = self.hits + self.misses
+        return {
+            "size": len(self.__data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / requests, 3) if requests else 0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "stale": self.stale,
+            "connected": self.connected,
+        }
+
+    def get(self, key: str):
+        """Получает запись.
+
+        Returns:
+            object | None: Значение или None, если записи нет, она истекла или кэш не выдает записи.
+        """
+        if not self.enabled:
+            self.misses += 1
+            return None
+
+        item = self.__data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        if item[0] < monotonic():
+            del self.__data[key]
+            self.evictions += 1
+            self.misses += 1
+            return None
+
+        self.__data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: str, value, version: int):
+        """Сохраняет запись, прочитанную из Redis.
+
+        Args:
+            key (str): Ключ записи.
+            value (object): Ответ Redis.
+            version (int): `version` на момент начала чтения: если с тех пор
+                была инвалидация, запись может быть устаревшей и не сохраняется.
+        """
+        if not self.enabled:
+            return
+        if version != self.version:
+            self.stale += 1
+            return
+
+        self.__data[key] = (monotonic() + self.ttl, value)
+        self.__data.move_to_end(key)
+        while len(self.__data) > self.size:
+            self.__data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, keys):
+        """Удаляет записи по ключам."""
+        self.version += 1
+        for key in keys:
+            if self.__data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Удаляет все записи."""
+        self.version += 1
+        self.invalidations += len(self.__data)
+        self.__data.clear()
+
+    def message(self, keys):
+        """Сообщение инвалидации для публикации в `INVALIDATE_CHANNEL`.
+
+        Args:
+            keys (Iterable[str]): Ключи записей.
+
+        Returns:
+            str: Сообщение в JSON.
+        """
+        return json.dumps({"origin": self.origin, "keys": list(keys)})
+
+    def receive(self, message: str | bytes):
+        """Применяет сообщение инвалидации другого процесса.
+
+        Некорректное сообщение очищает кэш целиком.
+        """
+        try:
+            data = json.loads(message)
+            origin, keys = data["origin"], data["keys"]
+        except (ValueError, TypeError, KeyError):
+            logger.warning(f"Некорректное сообщение инвалидации кэша: {message!r}")
+            self.clear()
+            return
+        if origin != self.origin:
+            self.invalidate(keys)
+
+    def start(self, redis, retry: float = 5):
+        """Запускает подписку на инвалидации (в работающем цикле событий).
+
+        Args:
+            redis (Redis): Асинхронный клиент Redis.
+            retry (float, optional): Пауза перед переподключением (сек).
+        """
+        if self.size > 0 and (self.__task is None or self.__task.done()):
+            self.__task = asyncio.create_task(self.listen(redis, retry))
+
+    async def close(self):
+        """Останавливает подписку на инвалидации."""
+        if self.__task is not None:
+            self.__task.cancel()
+
+    async def listen(self, redis, retry: float = 5):
+        """Получает сообщения инвалидации, переподключаясь при ошибках.
+
+        Сообщения, отправленные без подписки, потеряны, поэтому кэш очищается
+        и при подписке, и при ее потере.
+        """
+        while True:
+            try:
+                async with redis.pubsub() as pubsub:
+                    await pubsub.subscribe(INVALIDATE_CHANNEL)
+                    async for message in pubsub.listen():
+                        match message["type"]:
+                            case "subscribe":
+                                self.clear()
+                                self.connected = True
+                                logger.info("Подписка на инвалидации кэша активна")
+                            case "message":
+                                self.receive(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("Потеряна подписка на инвалидации кэша", exc_info=True)
+            finally:
+                self.connected = False
+                self.clear()
+            await asyncio.sleep(retry)
@@ -0,0 +1,27 @@
+"""idle freeze
+
+Revision ID: a3f9c2d71e48
+Revises: e91a6d3c7f25
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3f9c2d71e48'
+down_revision: Union[str, None] = 'e91a6d3c7f25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Новое значение перечисления нельзя использовать в транзакции, где оно добавлено
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE freezesteps ADD VALUE IF NOT EXISTS 'idle'")
+
+
+def downgrade() -> None:
+    # Значение перечисления удалить нельзя: простаивающие конфигурации размораживаются
+    op.execute("UPDATE wg_config SET freeze = 'wait_no' WHERE freeze = 'idle'")
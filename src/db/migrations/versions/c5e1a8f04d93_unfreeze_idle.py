@@ -0,0 +1,28 @@
+"""unfreeze idle
+
+Revision ID: c5e1a8f04d93
+Revises: a3f9c2d71e48
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from db.ddl import unfreeze_configs
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e1a8f04d93'
+down_revision: Union[str, None] = 'a3f9c2d71e48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Функция создается только вместе с таблицами: пересоздается с обработкой 'idle'
+    op.execute(unfreeze_configs)
+
+
+def downgrade() -> None:
+    # Обработка 'idle' совместима с предыдущей ревизией
+    pass
@@ -12,6 +12,10 @@
 - YoomoneyOperation: Модель операции YooMoney.
 - YoomoneyOperationDetails: Модель деталей операции YooMoney.
 - News: Модель новостей.
+- WgPeerPool: Модель пула заранее созданных пиров WireGuard.
+- WgPeerStats: Модель замеров трафика пиров WireGuard.
+- WgPeerDaily: Модель суточной статистики пиров WireGuard.
+- WgServer: Модель сервера WireGuard (реестр кластера).
 
 Перечисления:
 - FreezeSteps: Шаги заморозки.
@@ -29,10 +33,13 @@ from core.config import Base
 from db import ddl as _  # NOTE TRIGGERS
 from db.models.enums import FreezeSteps, ReportStatus, UserActivity
 from db.models.news import News
+from db.models.peer_pool import WgPeerPool
+from db.models.peer_stats import WgPeerDaily, WgPeerStats
 from db.models.reports import Reports
 from db.models.transactions import Transactions
 from db.models.userdata import UserData
 from db.models.wg_config import WgConfig
+from db.models.wg_server import WgServer
 from db.models.yoomoney import (YoomoneyOperation, YoomoneyOperationDetails,
                                 yoomoney_site_display)
 
@@ -35,6 +35,8 @@ class FreezeSteps(enum.Enum):
     """Заморозка отклонена"""
     wait_no = "wait_no"
     """Ожидание отклонения заморозки"""
+    idle = "idle"
+    """Заморожена из-за простоя (размораживается при запросе конфигураций)"""
 
     def __str__(self) -> str:
         """Возвращает строковое представление шага заморозки.
@@ -0,0 +1,40 @@
+from datetime import datetime
+from ipaddress import IPv4Interface
+
+from sqlalchemy import DateTime, ForeignKey, String, func
+from sqlalchemy.dialects.postgresql import CIDR
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.config import Base
+
+
+class WgPeerPool(Base):
+    """Модель пула заранее созданных пиров WireGuard.
+
+    Пиры пула уже зарегистрированы на сервере в заблокированном состоянии.
+    При создании конфигурации пир забирается из пула (`claim_pool_config`)
+    и разблокируется, поэтому пользователь не ждет работы с сервером.
+    """
+
+    __tablename__ = "wg_peer_pool"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    """int: Уникальный идентификатор пира пула."""
+
+    user_private_key: Mapped[str] = mapped_column(String(44))
+    """str: Приватный ключ пира."""
+
+    server_public_key: Mapped[str] = mapped_column(String(44), unique=True)
+    """str: Публичный ключ пира (как в `WgConfig.server_public_key`)."""
+
+    address: Mapped[IPv4Interface] = mapped_column(type_=CIDR, unique=True)
+    """IPv4Interface: IP-адрес пира."""
+
+    server_id: Mapped[int | None] = mapped_column(ForeignKey("wg_server.id"))
+    """int | None: Сервер WireGuard, на котором создан пир."""
+
+    created: Mapped[datetime] = mapped_column(
+        type_=DateTime(timezone=True), server_default=func.now()
+    )
+    """datetime: Время создания пира."""
@@ -0,0 +1,69 @@
+from datetime import date as date_cls
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Date, DateTime, ForeignKey, Index, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.config import Base
+
+
+class WgPeerStats(Base):
+    """Модель замеров трафика пиров WireGuard (временной ряд).
+
+    Каждая строка - один замер `wg show wg1 dump` для одной конфигурации:
+    время последнего рукопожатия и трафик с предыдущего замера. Замеры
+    хранятся `settings.stats_retention` дней, долгосрочная статистика -
+    в `WgPeerDaily`.
+    """
+
+    __tablename__ = "wg_peer_stats"
+    __table_args__ = (
+        Index("ix_wg_peer_stats_ts", "ts"),
+        {"extend_existing": True},
+    )
+
+    config_id: Mapped[int] = mapped_column(
+        ForeignKey("wg_config.id", ondelete="CASCADE"), primary_key=True
+    )
+    """int: Идентификатор конфигурации."""
+
+    ts: Mapped[datetime] = mapped_column(
+        type_=DateTime(timezone=True), primary_key=True
+    )
+    """datetime: Время замера."""
+
+    handshake: Mapped[datetime | None] = mapped_column(type_=DateTime(timezone=True))
+    """datetime | None: Время последнего рукопожатия (None - не было)."""
+
+    rx: Mapped[int] = mapped_column(type_=BigInteger, default=0)
+    """int: Получено сервером с предыдущего замера (байт)."""
+
+    tx: Mapped[int] = mapped_column(type_=BigInteger, default=0)
+    """int: Отправлено сервером с предыдущего замера (байт)."""
+
+
+class WgPeerDaily(Base):
+    """Модель суточной статистики пиров WireGuard."""
+
+    __tablename__ = "wg_peer_daily"
+    __table_args__ = {"extend_existing": True}
+
+    config_id: Mapped[int] = mapped_column(
+        ForeignKey("wg_config.id", ondelete="CASCADE"), primary_key=True
+    )
+    """int: Идентификатор конфигурации."""
+
+    day: Mapped[date_cls] = mapped_column(type_=Date, primary_key=True)
+    """date_cls: Дата."""
+
+    handshake: Mapped[datetime | None] = mapped_column(type_=DateTime(timezone=True))
+    """datetime | None: Время последнего рукопожатия за сутки."""
+
+    rx: Mapped[int] = mapped_column(type_=BigInteger, default=0)
+    """int: Получено сервером за сутки (байт)."""
+
+    tx: Mapped[int] = mapped_column(type_=BigInteger, default=0)
+    """int: Отправлено сервером за сутки (байт)."""
+
+    samples: Mapped[int] = mapped_column(type_=Integer, default=0)
+    """int: Количество замеров за сутки."""
@@ -1,4 +1,3 @@
-from collections.abc import Iterable
 from datetime import datetime
 from uuid import UUID
 
@@ -96,21 +95,6 @@ class Transactions(Base):
         site_date: str = Field(init=False, title="Transaction date", default="00:00")
         """Строковое представление даты транзакции (не инициализируется при создании)."""
 
-        @model_validator(mode="before")
-        def convert_str_to_none(cls, values):
-            """Преобразует строки 'None' в None.
-
-            Args:
-                cls: Класс схемы.
-                values: Значения для валидации.
-
-            Returns:
-                dict: Обновленные значения.
-            """
-            if isinstance(values, Iterable):
-                return {k: None if v == "None" else v for k, v in dict(values).items()}
-            return values
-
         @model_validator(mode="after")
         def set_site_date(cls, values: BaseModel):
             """Устанавливает строковое представление даты транзакции.
@@ -65,6 +65,9 @@ class WgConfig(Base):
     endpoint_port: Mapped[int] = mapped_column(default=settings.WG_PORT)
     """int: Порт конечной точки WireGuard (по умолчанию из настроек)."""
 
+    server_id: Mapped[int | None] = mapped_column(ForeignKey("wg_server.id"))
+    """int | None: Сервер WireGuard конфигурации (None - сервер из настроек)."""
+
     conf_connect: Mapped["UserData"] = relationship(  # noqa: F821 # type: ignore
         back_populates="configs", lazy="subquery"
     )
@@ -109,6 +112,9 @@ class WgConfig(Base):
         endpoint_port: int = Field(default=settings.WG_PORT, title="Endpoint Port")
         """Порт конечной точки WireGuard."""
 
+        server_id: int | None = Field(default=None, title="Server ID")
+        """Сервер WireGuard конфигурации."""
+
         model_config = ConfigDict(extra="ignore")
 
     # INTERFACE (fastui)
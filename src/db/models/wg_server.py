@@ -0,0 +1,42 @@
+from ipaddress import IPv4Address
+
+from sqlalchemy import String
+from sqlalchemy.dialects.postgresql import INET
+from sqlalchemy.orm import Mapped, mapped_column
+
+from core.config import Base
+
+
+class WgServer(Base):
+    """Модель сервера WireGuard (реестр узлов кластера).
+
+    SSH-доступ ко всем серверам выполняется с общими учетными данными
+    (`settings.WG_USER`, `settings.WG_KEY`, `settings.WG_PASS`).
+    """
+
+    __tablename__ = "wg_server"
+    __table_args__ = {"extend_existing": True}
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    """int: Уникальный идентификатор сервера."""
+
+    name: Mapped[str] = mapped_column(unique=True)
+    """str: Название сервера."""
+
+    host: Mapped[str]
+    """str: Хост для SSH-подключения."""
+
+    endpoint_ip: Mapped[IPv4Address] = mapped_column(type_=INET)
+    """IPv4Address: IP-адрес конечной точки WireGuard для клиентов."""
+
+    endpoint_port: Mapped[int]
+    """int: Порт конечной точки WireGuard."""
+
+    public_key: Mapped[str] = mapped_column(String(44))
+    """str: Публичный ключ интерфейса сервера."""
+
+    capacity: Mapped[int]
+    """int: Максимальное количество конфигураций на сервере."""
+
+    active: Mapped[bool] = mapped_column(default=True, server_default="1")
+    """bool: Размещаются ли на сервере новые конфигурации."""
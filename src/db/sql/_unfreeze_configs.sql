@@ -23,11 +23,15 @@ BEGIN
     WHERE user_id = telegram_id 
     ORDER BY id LIMIT num);
 
+    -- Простаивающие конфигурации ('idle') в пределах лимита остаются замороженными
+    -- до запроса пользователем списка конфигураций: их размораживает бот.
+    -- Сверх лимита они уже заблокированы на сервере и становятся замороженными ('yes').
     IF overflow > 0 THEN
         UPDATE public.wg_config
         SET "freeze" = CASE 
             WHEN "freeze" = 'wait_no' THEN 'yes'
             WHEN "freeze" = 'no' THEN 'wait_yes'
+            WHEN "freeze" = 'idle' THEN 'yes'
             ELSE "freeze" 
         END
         WHERE id IN
@@ -28,6 +28,21 @@
     - insert_transaction: Вставляет транзакцию.
     - raise_money: Cписывает деньги.
 
+- Статистика трафика пиров:
+    - delete_old_peer_stats: Удаляет устаревшие замеры.
+    - get_active_configs: Получает конфигурации с недавними рукопожатиями.
+    - get_config_ids: Получает идентификаторы конфигураций по публичным ключам.
+    - get_configs_traffic: Получает трафик каждой конфигурации за период.
+    - get_dead_configs: Получает конфигурации без рукопожатий.
+    - get_idle_configs: Получает конфигурации, простаивающие дольше срока тарифа.
+    - get_top_talkers: Получает конфигурации с наибольшим трафиком.
+    - get_user_usage: Получает суточный трафик пользователя.
+    - insert_peer_stats: Записывает замеры и суточную статистику.
+
+- Состояние серверов WireGuard:
+    - get_server_snapshot: Получает состояние сервера из кэша.
+    - set_server_snapshots: Сохраняет состояние серверов в кэше.
+
 - Пользователи:
     - add_user: Добавляет нового пользователя.
     - ban_user: Блокирует пользователя.
@@ -40,10 +55,21 @@
 
 - Конфигурации WireGuard:
     - add_wg_config: Добавляет конфигурацию WireGuard.
+    - claim_pool_config: Создает конфигурацию из пира пула.
+    - count_pool_peers: Получает количество пиров в пуле.
+    - add_pool_peers: Добавляет пиры в пул.
+    - get_pool_public_keys: Получает публичные ключи пиров пула.
+    - get_pool_peers: Получает все пиры пула.
     - freeze_config: Замораживает конфигурацию WireGuard.
+    - set_freeze_states: Устанавливает шаги заморозки группам конфигураций одним запросом.
     - get_all_wg_configs: Получает все конфигурации WireGuard.
     - get_user_with_configs: Получает пользователя с его конфигурациями.
     - get_wg_config: Получает конфигурацию WireGuard по идентификатору.
+    - get_wg_addresses: Получает адреса всех конфигураций WireGuard.
+    - get_wg_servers: Получает реестр серверов WireGuard.
+    - register_default_server: Регистрирует сервер из настроек в реестре.
+    - count_server_configs: Получает количество конфигураций на серверах.
+    - move_wg_configs: Переносит конфигурации на другой сервер.
     - delete_unregistered_wg_configs: Удаляет из БД конфигурации, которых нет на WG сервере.
 """
 
@@ -52,6 +78,12 @@ from db.utils.admin import (get_admins, get_all_users, get_valid_users,
 from db.utils.news import add_news
 from db.utils.reports import add_report
 from db.utils.save import async_backup, dump
+from db.utils.stats import (delete_old_peer_stats, get_active_configs,
+                            get_config_ids, get_configs_traffic,
+                            get_dead_configs, get_idle_configs,
+                            get_top_talkers, get_user_usage,
+                            insert_peer_stats)
+from db.utils.status import get_server_snapshot, set_server_snapshots
 from db.utils.tests import test_server_speed
 from db.utils.transactions import (close_free_trial, confirm_success_pay,
                                    delete_cash_transactions,
@@ -59,6 +91,11 @@ from db.utils.transactions import (close_free_trial, confirm_success_pay,
                                    raise_money)
 from db.utils.user import (add_user, ban_user, clear_cash, freeze_user,
                            get_user, mute_user, recover_user, update_rate_user)
-from db.utils.wg import (add_wg_config, delete_unregistered_wg_configs,
-                         freeze_config, get_all_wg_configs,
-                         get_user_with_configs, get_wg_config)
+from db.utils.wg import (add_pool_peers, add_wg_config, claim_pool_config,
+                         count_pool_peers, count_server_configs,
+                         delete_unregistered_wg_configs, freeze_config,
+                         get_all_wg_configs, get_pool_peers,
+                         get_pool_public_keys, get_user_with_configs,
+                         get_wg_addresses, get_wg_config, get_wg_servers,
+                         move_wg_configs,
+                         register_default_server, set_freeze_states)
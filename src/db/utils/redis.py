@@ -8,14 +8,55 @@ from typing import Union
 
 from core.config import settings
 from core.exceptions import RedisTypeError
-from db.database import execute_redis_query, iter_redis_keys, redis_engine
-from db.models import Transactions, UserData, WgConfig
+from db.codec import ModelCodec
+from db.database import (execute_redis_query, iter_redis_keys, redis_binary,
+                         redis_engine)
+from db.local_cache import INVALIDATE_CHANNEL, LocalCache
+from db.models import (FreezeSteps, Transactions, UserActivity, UserData,
+                       WgConfig)
 
 logger = logging.getLogger("redis")
 
+INDEX_VERSION_KEY = "index:version"
+"""str: Ключ с версией индексов пользователей (устанавливается `CashManager.migrate`)."""
+INDEX_VERSION = "1"
+"""str: Текущая версия индексов пользователей."""
+
+LOCAL_CACHE = LocalCache(
+    settings.cash_local_size, settings.cash_local_ttl, settings.cash_local_strict
+)
+"""LocalCache: Кэш данных пользователей и конфигураций в памяти процесса."""
+
+CODECS: dict[str, ModelCodec] = {
+    codec.model.__tablename__: codec
+    for codec in (
+        ModelCodec(1, UserData, UserData.__table__.columns.keys(), (UserActivity,)),
+        ModelCodec(2, WgConfig, WgConfig.__table__.columns.keys(), (FreezeSteps,)),
+        ModelCodec(3, Transactions, Transactions.__table__.columns.keys()),
+    )
+}
+"""dict[str, ModelCodec]: Кодирование объектов моделей по таблицам."""
+
 
 class CashManager:
-    """Менеджер для работы с кэшем в Redis."""
+    """Менеджер для работы с кэшем в Redis.
+
+    Ключи данных имеют вид `data:<таблица>:...:<user_id>`. Для каждого
+    пользователя и таблицы поддерживается индекс - множество
+    `index:<таблица>:<user_id>` с ключами его данных, поэтому данные
+    пользователя читаются и удаляются без просмотра всех ключей (SCAN).
+    Пока индексы не построены для ключей, созданных до их появления
+    (`migrate`), ключи пользователя ищутся через SCAN.
+
+    Объекты моделей (`CODECS`) хранятся одним значением на объект (`ModelCodec`)
+    с сохранением типов колонок и читаются `load` и `items` клиентом без
+    декодирования ответов (`redis_binary`).
+
+    Данные пользователей (`load`) и списки конфигураций (`items`) читаются через
+    кэш процесса `LOCAL_CACHE`. Запись и удаление данных этих таблиц
+    инвалидируют его записи в этом процессе и, сообщением в том же пайплайне,
+    в остальных процессах.
+    """
 
     class user_id:
         """Класс для аннотации типов."""
@@ -23,6 +64,15 @@ class CashManager:
     redis_types = (bytes, str, int, float, NoneType)
     """Допустимые типы данных для хранения в Redis."""
 
+    tables = (UserData.__tablename__, WgConfig.__tablename__, Transactions.__tablename__)
+    """Таблицы, данные которых кэшируются (для очистки кэша пользователя)."""
+
+    local_tables = (UserData.__tablename__, WgConfig.__tablename__)
+    """Таблицы, данные которых кэшируются в памяти процесса (`LOCAL_CACHE`)."""
+
+    indexed: bool = False
+    """bool: Построены ли индексы для всех ключей (проверяется до первого положительного ответа)."""
+
     def __init__(
         self, validation_model: Union[UserData, WgConfig, Transactions]
     ) -> None:
@@ -33,6 +83,7 @@ class CashManager:
         """
         self.pipe = redis_engine.pipeline()
         self.model = validation_model
+        self.codec = CODECS.get(getattr(validation_model, "__tablename__", None))
 
     @property
     def cmd(self):
@@ -49,8 +100,17 @@ class CashManager:
         Returns:
             list: Список объектов модели, представляющих результаты выполнения команд.
         """
-        results = await execute_redis_query(self.pipe)
+        return self.validate(await execute_redis_query(self.pipe))
+
+    def validate(self, results: list):
+        """Преобразует ответы Redis в объекты модели.
 
+        Args:
+            results (list): Результаты выполнения команд.
+
+        Returns:
+            list: Список объектов модели (None, если данных нет).
+        """
         validated_results = []
         for result in results:
             if result and isinstance(result, (dict, str, tuple, list)):
@@ -65,6 +125,206 @@ class CashManager:
         if len(validated_results):
             return validated_results
 
+    @staticmethod
+    def index_key(key: str):
+        """Индекс, в который входит полный ключ данных `data:<таблица>:...:<user_id>`."""
+        parts = key.split(":")
+        return f"index:{parts[1]}:{parts[-1]}"
+
+    @classmethod
+    async def is_indexed(cls):
+        """Построены ли индексы для всех ключей (`migrate`).
+
+        Returns:
+            bool: Можно ли искать ключи пользователя только по индексу.
+        """
+        if not cls.indexed:
+            pipe = redis_engine.pipeline()
+            pipe.get(INDEX_VERSION_KEY)
+            cls.indexed = (await execute_redis_query(pipe))[0] == INDEX_VERSION
+        return cls.indexed
+
+    @classmethod
+    async def migrate(cls, batch: int = 1000):
+        """Строит индексы для ключей, созданных до их появления.
+
+        Ключи просматриваются один раз (SCAN), индексы заполняются пакетами по
+        `batch` команд. Новые ключи индексируются при записи (`add`), поэтому
+        миграция выполняется в фоне, не останавливая работу с кэшем: до ее
+        окончания ключи пользователя ищутся через SCAN.
+
+        Returns:
+            int: Количество проиндексированных ключей.
+        """
+        if await cls.is_indexed():
+            return 0
+
+        count = 0
+        ttl = timedelta(hours=settings.cash_ttl)
+        pipe = redis_engine.pipeline()
+        async for key in await iter_redis_keys("data:*"):
+            if key.count(":") < 2:
+                continue
+            index = cls.index_key(key)
+            pipe.sadd(index, key)
+            pipe.expire(index, ttl)
+            count += 1
+            if len(pipe.command_stack) >= batch:
+                await execute_redis_query(pipe)
+
+        pipe.set(INDEX_VERSION_KEY, INDEX_VERSION)
+        await execute_redis_query(pipe)
+        cls.indexed = True
+
+        logger.info(f"Проиндексировано ключей кэша: {count}")
+        return count
+
+    async def keys(self, user_id, table: str = None):
+        """Получает ключи данных пользователя в таблице.
+
+        Args:
+            user_id (int): Идентификатор пользователя.
+            table (str, optional): Таблица (по умолчанию - таблица модели).
+
+        Returns:
+            list[str]: Полные ключи данных вида `data:<таблица>:<id>:<user_id>`.
+        """
+        table = table or self.model.__tablename__
+        if not await self.is_indexed():
+            return [
+                key async for key in await iter_redis_keys(f"data:{table}:*:{user_id}")
+            ]
+
+        # Индекс может пережить истекшие и удаленные ключи данных: такие ключи
+        # удаляются из индекса при чтении (`items`)
+        pipe = redis_engine.pipeline()
+        pipe.smembers(f"index:{table}:{user_id}")
+        return [
+            key
+            for key in (await execute_redis_query(pipe))[0]
+            if key.count(":") > 2
+        ]
+
+    def decode(self, results: list):
+        """Восстанавливает объекты модели из закодированных значений.
+
+        Args:
+            results (list): Ответы `redis_binary` на GET.
+
+        Returns:
+            list | None: Список объектов модели (None, если хотя бы одно значение
+            отсутствует, записано в другом формате или другой схемой).
+        """
+        objects = []
+        for result in results:
+            obj = self.codec.build(result) if isinstance(result, bytes) else None
+            if obj is None:
+                return None
+            objects.append(obj)
+        return objects or None
+
+    async def read(self, keys: list[str]):
+        """Читает закодированные значения по полным ключам.
+
+        Ключи старого формата (хэши) возвращают ошибку типа, которая, как и
+        отсутствие ключа, считается промахом: значение перезаписывается `add`.
+
+        Returns:
+            list: Ответы Redis (bytes, None или ошибки).
+        """
+        pipe = redis_binary.pipeline()
+        for key in keys:
+            pipe.get(key)
+        return await execute_redis_query(pipe, raise_on_error=False)
+
+    async def load(self, *keys):
+        """Получает объекты модели, записанные `add`, по ключам.
+
+        Args:
+            *keys (str | int): Ключи без префикса таблицы.
+
+        Returns:
+            list | None: Список объектов модели (None, если хотя бы один не найден).
+        """
+        keys = [f"data:{self.model.__tablename__}:{key}" for key in keys]
+        local = None
+        if len(keys) == 1 and self.model.__tablename__ in self.local_tables:
+            local = keys[0]
+            results = LOCAL_CACHE.get(local)
+            if results is not None:
+                return self.decode(results)
+            version = LOCAL_CACHE.version
+
+        results = await self.read(keys)
+        if local:
+            LOCAL_CACHE.set(local, results, version)
+        return self.decode(results)
+
+    async def items(self, user_id):
+        """Получает все объекты пользователя в таблице модели (`data:<таблица>:<id>:<user_id>`).
+
+        Args:
+            user_id (int): Идентификатор пользователя.
+
+        Ключи индекса, значений которых уже нет в Redis, удаляются из индекса:
+        иначе каждое чтение оставалось бы промахом, пока обновляется TTL индекса.
+
+        Returns:
+            list | None: Список объектов модели (None, если записей нет или
+            хотя бы одна запись не прочитана).
+        """
+        index = f"index:{self.model.__tablename__}:{user_id}"
+        local = self.model.__tablename__ in self.local_tables
+        if local:
+            results = LOCAL_CACHE.get(index)
+            if results is not None:
+                return self.decode(results)
+            version = LOCAL_CACHE.version
+
+        keys = await self.keys(user_id)
+        results = await self.read(keys)
+        missing = [key for key, result in zip(keys, results) if result is None]
+        if missing:
+            if await self.is_indexed():
+                pipe = redis_engine.pipeline()
+                pipe.srem(index, *missing)
+                await execute_redis_query(pipe)
+        elif local:
+            LOCAL_CACHE.set(index, results, version)
+        return self.decode(results)
+
+    async def delete_items(self, user_id):
+        """Удаляет все записи пользователя в таблице модели вместе с индексом.
+
+        Args:
+            user_id (int): Идентификатор пользователя.
+        """
+        keys = await self.keys(user_id)
+        await self.delete(*keys, f"index:{self.model.__tablename__}:{user_id}", fullkey=True)
+
+    def invalidate(self, keys):
+        """Добавляет в пайплайн сообщение инвалидации кэша процессов для ключей.
+
+        Кэш этого процесса очищается вызовом `LOCAL_CACHE.invalidate` с
+        возвращаемыми ключами после выполнения пайплайна.
+
+        Args:
+            keys (Iterable[str]): Полные ключи данных и индексов.
+
+        Returns:
+            set[str]: Ключи записей `LOCAL_CACHE` (ключи данных и их индексы).
+        """
+        local = set()
+        for key in keys:
+            parts = key.split(":")
+            if len(parts) > 2 and parts[1] in self.local_tables:
+                local.add(key)
+                if parts[0] == "data":
+                    local.add(self.index_key(key))
+        if local:
+            self.pipe.publish(INVALIDATE_CHANNEL, LOCAL_CACHE.message(local))
+        return local
+
     def converter(self, data):
         """Преобразует данные в допустимые типы для Redis.
 
@@ -95,23 +355,29 @@ class CashManager:
 
     async def add(
         self,
-        key_map: dict[user_id, dict | list | tuple | set | str | int | float] = None,
-        **mapping: dict[user_id, dict | list | tuple | set | str | int | float],
+        key_map: dict[user_id, object | dict | list | tuple | set | str | int | float] = None,
+        **mapping: dict[user_id, object | dict | list | tuple | set | str | int | float],
     ):
         """Добавляет данные в Redis.
 
+        Объекты модели записываются одним закодированным значением (`CODECS`).
+
         Args:
             key_map (dict, optional): Словарь ключей и значений для добавления.
             **mapping (dict): Дополнительные ключи и значения для добавления.
 
         Examples:
             add({user_id: {data}})
+            add({user_id: user_data})
         """
+        keys = []
         for key, item in key_map.items() if key_map else mapping.items():
             if not item:
                 return
             item = self.converter(item)
             key = f"data:{self.model.__tablename__}:{key}"
+            index = self.index_key(key)
+            keys.append(key)
 
             match item:
                 case dict():
@@ -122,12 +388,18 @@ class CashManager:
                     self.pipe.sadd(name=key, *item)
                 case str() | int() | float():
                     self.pipe.set(name=key, value=item)
+                case _ if self.codec and isinstance(item, self.codec.model):
+                    self.pipe.set(name=key, value=self.codec.encode(item))
 
                 case _:
                     raise RedisTypeError
 
             self.pipe.expire(key, timedelta(hours=settings.cash_ttl))
+            self.pipe.sadd(index, key)
+            self.pipe.expire(index, timedelta(hours=settings.cash_ttl))
+        local = self.invalidate(keys)
         await execute_redis_query(self.pipe)
+        LOCAL_CACHE.invalidate(local)
 
     async def get(self, *id_obj: dict | list | tuple | set | str | int | float):
         """Получает данные из Redis по заданным ключам.
@@ -168,24 +440,42 @@ class CashManager:
             keys = [f"data:{self.model.__tablename__}:{key}" for key in keys]
         if keys:
             self.pipe.delete(*keys)
-            return await self.__call__()
-
-    async def clear(self, user_id, fullkey=False):
+            for key in keys:
+                if key.startswith("data:"):
+                    self.pipe.srem(self.index_key(key), key)
+            local = self.invalidate(keys)
+            results = await execute_redis_query(self.pipe)
+            LOCAL_CACHE.invalidate(local)
+            return self.validate(results)
+
+    async def clear(self, user_id):
         """Очищает данные из Redis для указанного пользователя.
 
+        Ключи всех таблиц читаются из индексов пользователя одним запросом
+        (до окончания `migrate` - через SCAN) и удаляются вместе с индексами.
+
         Args:
             user_id (str): Идентификатор пользователя.
-            fullkey (bool, optional): Указывает, нужно ли использовать полные ключи. По умолчанию False.
 
         Returns:
             list: Список объектов модели, представляющих очищенные данные.
         """
-        if not fullkey:
-            rkeys = []
+        indexes = [f"index:{table}:{user_id}" for table in self.tables]
+        rkeys = list(indexes)
+        if await self.is_indexed():
+            pipe = redis_engine.pipeline()
+            for index in indexes:
+                pipe.smembers(index)
+            for members in await execute_redis_query(pipe):
+                rkeys.extend(members)
+        else:
             pattern = ":*"
             for n in range(1, 4):
                 async for key in await iter_redis_keys(f"data{pattern*n}:{user_id}"):
                     rkeys.append(key)
-        if rkeys:
-            self.pipe.delete(*rkeys)
-            return await self.__call__()
+
+        self.pipe.delete(*rkeys)
+        local = self.invalidate(rkeys)
+        results = await execute_redis_query(self.pipe)
+        LOCAL_CACHE.invalidate(local)
+        return self.validate(results)
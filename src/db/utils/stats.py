@@ -0,0 +1,268 @@
+"""Функционал для работы с БД. Статистика трафика пиров"""
+
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy import (Date, DateTime, Integer, and_, case, cast, delete,
+                        func, literal, or_, select)
+from sqlalchemy.dialects.postgresql import insert
+
+from core.metric import async_speed_metric
+from db.database import execute_query
+from db.models import (FreezeSteps, UserActivity, UserData, WgConfig,
+                       WgPeerDaily, WgPeerStats)
+
+logger = logging.getLogger()
+
+
+@async_speed_metric
+async def get_config_ids():
+    """Получает идентификаторы конфигураций по публичным ключам пиров.
+
+    Returns:
+        dict[str, int]: Идентификаторы конфигураций по `server_public_key`.
+    """
+    query = select(WgConfig.server_public_key, WgConfig.id)
+
+    return dict((await execute_query(query, echo=False)).all())
+
+
+@async_speed_metric
+async def insert_peer_stats(rows: list[dict]):
+    """Записывает замеры пиров и обновляет суточную статистику.
+
+    Замеры вставляются одним многострочным INSERT, суточная статистика
+    обновляется в том же запросе (INSERT ... ON CONFLICT DO UPDATE по
+    вставленным строкам).
+
+    Args:
+        rows (list[dict]): Замеры вида {"config_id", "ts", "handshake", "rx", "tx"}
+            (одно время замера на пакет).
+    """
+    if not rows:
+        return
+
+    inserted = (
+        insert(WgPeerStats)
+        .values(rows)
+        .returning(
+            WgPeerStats.config_id,
+            WgPeerStats.ts,
+            WgPeerStats.handshake,
+            WgPeerStats.rx,
+            WgPeerStats.tx,
+        )
+        .cte("inserted")
+    )
+    query = insert(WgPeerDaily).from_select(
+        ["config_id", "day", "handshake", "rx", "tx", "samples"],
+        select(
+            inserted.c.config_id,
+            cast(inserted.c.ts, Date),
+            inserted.c.handshake,
+            inserted.c.rx,
+            inserted.c.tx,
+            literal(1),
+        ),
+    )
+    query = query.on_conflict_do_update(
+        index_elements=[WgPeerDaily.config_id, WgPeerDaily.day],
+        set_=dict(
+            handshake=func.greatest(WgPeerDaily.handshake, query.excluded.handshake),
+            rx=WgPeerDaily.rx + query.excluded.rx,
+            tx=WgPeerDaily.tx + query.excluded.tx,
+            samples=WgPeerDaily.samples + 1,
+        ),
+    )
+
+    await execute_query(query, echo=False)
+
+
+@async_speed_metric
+async def delete_old_peer_stats(days: int):
+    """Удаляет замеры старше `days` дней (суточная статистика сохраняется).
+
+    Args:
+        days (int): Срок хранения замеров (дни).
+    """
+    query = delete(WgPeerStats).where(
+        WgPeerStats.ts < datetime.now().astimezone() - timedelta(days=days)
+    )
+    await execute_query(query, echo=False)
+
+
+@async_speed_metric
+async def get_active_configs(hours: int = 24):
+    """Получает конфигурации, пиры которых выполняли рукопожатие за последние `hours` часов.
+
+    Returns:
+        list[WgConfig]: Активные конфигурации.
+    """
+    since = datetime.now().astimezone() - timedelta(hours=hours)
+    query = select(WgConfig).where(
+        WgConfig.id.in_(
+            select(WgPeerDaily.config_id).where(
+                WgPeerDaily.day >= since.date(), WgPeerDaily.handshake >= since
+            )
+        )
+    )
+    return (await execute_query(query)).scalars().all()
+
+
+@async_speed_metric
+async def get_dead_configs(days: int = 30):
+    """Получает конфигурации без рукопожатий за последние `days` дней.
+
+    Returns:
+        list[WgConfig]: Неиспользуемые конфигурации.
+    """
+    since = datetime.now().astimezone() - timedelta(days=days)
+    query = select(WgConfig).where(
+        WgConfig.id.not_in(
+            select(WgPeerDaily.config_id).where(
+                WgPeerDaily.day >= since.date(), WgPeerDaily.handshake >= since
+            )
+        )
+    )
+    return (await execute_query(query)).scalars().all()
+
+
+@async_speed_metric
+async def get_idle_configs(days: dict[float, int], limit: int = None):
+    """Получает незамороженные конфигурации активных пользователей, простаивающие дольше срока тарифа.
+
+    Конфигурация простаивает, если ее пир был на интерфейсе сервера (есть суточная
+    статистика) каждый день срока, но не выполнял рукопожатий за срок. Поэтому
+    только что созданные и недавно размороженные конфигурации не считаются простаивающими.
+
+    Args:
+        days (dict[float, int]): Срок простоя (дни) по тарифам (`UserData.stage`);
+            тарифы без срока или со сроком 0 пропускаются.
+        limit (int, optional): Максимальное количество конфигураций.
+
+    Returns:
+        list[WgConfig]: Простаивающие конфигурации.
+    """
+    now = datetime.now().astimezone()
+    days = {stage: value for stage, value in days.items() if value > 0}
+    if not days:
+        return []
+
+    cutoff = case(
+        *(
+            (
+                UserData.stage == stage,
+                literal(now - timedelta(days=value), DateTime(timezone=True)),
+            )
+            for stage, value in days.items()
+        ),
+        else_=None,
+    )
+    period = case(
+        *(
+            (UserData.stage == stage, literal(value, Integer))
+            for stage, value in days.items()
+        ),
+        else_=None,
+    )
+    last_handshake = func.max(WgPeerDaily.handshake)
+
+    query = (
+        select(WgConfig)
+        .join(UserData, UserData.telegram_id == WgConfig.user_id)
+        .join(
+            WgPeerDaily,
+            and_(
+                WgPeerDaily.config_id == WgConfig.id,
+                WgPeerDaily.day > cast(cutoff, Date),
+            ),
+        )
+        .where(
+            WgConfig.freeze == FreezeSteps.no,
+            UserData.active == UserActivity.active,
+        )
+        .group_by(WgConfig.id, UserData.id)
+        .having(
+            func.count(WgPeerDaily.day) >= period,
+            or_(last_handshake.is_(None), last_handshake < cutoff),
+        )
+        .order_by(WgConfig.id)
+        .limit(limit)
+    )
+    return (await execute_query(query, echo=False)).scalars().all()
+
+
+@async_speed_metric
+async def get_top_talkers(days: int = 1, limit: int = 10):
+    """Получает конфигурации с наибольшим трафиком.
+
+    Args:
+        days (int, optional): Период (дни, включая текущий).
+        limit (int, optional): Количество конфигураций.
+
+    Returns:
+        list[tuple[WgConfig, int]]: Конфигурации и их трафик (байт) по убыванию трафика.
+    """
+    since = datetime.now().date() - timedelta(days=days - 1)
+    traffic = (
+        select(
+            WgPeerDaily.config_id,
+            func.sum(WgPeerDaily.rx + WgPeerDaily.tx).label("traffic"),
+        )
+        .where(WgPeerDaily.day >= since)
+        .group_by(WgPeerDaily.config_id)
+        .subquery()
+    )
+    query = (
+        select(WgConfig, traffic.c.traffic)
+        .join(traffic, traffic.c.config_id == WgConfig.id)
+        .order_by(traffic.c.traffic.desc())
+        .limit(limit)
+    )
+    return (await execute_query(query)).tuples().all()
+
+
+@async_speed_metric
+async def get_user_usage(user_id, days: int = 30):
+    """Получает суточный трафик пользователя по всем его конфигурациям.
+
+    Args:
+        user_id (int): Идентификатор пользователя.
+        days (int, optional): Период (дни, включая текущий).
+
+    Returns:
+        list[tuple[date, int, int]]: Дата, получено и отправлено сервером (байт).
+    """
+    since = datetime.now().date() - timedelta(days=days - 1)
+    query = (
+        select(
+            WgPeerDaily.day,
+            func.sum(WgPeerDaily.rx),
+            func.sum(WgPeerDaily.tx),
+        )
+        .join(WgConfig, WgConfig.id == WgPeerDaily.config_id)
+        .where(WgConfig.user_id == user_id, WgPeerDaily.day >= since)
+        .group_by(WgPeerDaily.day)
+        .order_by(WgPeerDaily.day)
+    )
+    return (await execute_query(query)).tuples().all()
+
+
+@async_speed_metric
+async def get_configs_traffic(days: int = 1):
+    """Получает трафик каждой конфигурации за период.
+
+    Args:
+        days (int, optional): Период (дни, включая текущий).
+
+    Returns:
+        dict[int, int]: Трафик (байт) по идентификаторам конфигураций
+        (конфигурации без трафика отсутствуют).
+    """
+    since = datetime.now().date() - timedelta(days=days - 1)
+    query = (
+        select(WgPeerDaily.config_id, func.sum(WgPeerDaily.rx + WgPeerDaily.tx))
+        .where(WgPeerDaily.day >= since)
+        .group_by(WgPeerDaily.config_id)
+    )
+    return dict((await execute_query(query, echo=False)).all())
@@ -0,0 +1,72 @@
+"""Функционал для работы с БД. Состояние серверов WireGuard"""
+
+import logging
+from datetime import datetime
+
+from core.exceptions import DatabaseError
+from core.metric import async_speed_metric
+from db.database import execute_redis_query, redis_engine
+
+logger = logging.getLogger("redis")
+
+UNKNOWN = "unknown"
+"""str: Значение полей состояния, если данные устарели или отсутствуют."""
+
+
+def status_key(server_id):
+    """Ключ Redis с состоянием сервера."""
+    return f"server_status:{server_id}"
+
+
+@async_speed_metric
+async def set_server_snapshots(snapshots: dict, ttl: int):
+    """Сохраняет состояние серверов в кэше.
+
+    Args:
+        snapshots (dict[int | None, dict]): Состояние по идентификаторам серверов
+            (поля "status", "cpu", "peers"; поля со значением None не сохраняются).
+        ttl (int): Время жизни состояния (сек); после него состояние считается неизвестным.
+    """
+    updated = datetime.now().astimezone().isoformat(timespec="seconds")
+
+    pipe = redis_engine.pipeline()
+    for server_id, snapshot in snapshots.items():
+        key = status_key(server_id)
+        pipe.delete(key)
+        pipe.hset(
+            key,
+            mapping={
+                "updated": updated,
+                **{
+                    field: str(value)
+                    for field, value in snapshot.items()
+                    if value is not None
+                },
+            },
+        )
+        pipe.expire(key, ttl)
+    await execute_redis_query(pipe)
+
+
+@async_speed_metric
+async def get_server_snapshot(server_id=None):
+    """Получает состояние сервера из кэша (без обращения к серверу).
+
+    Args:
+        server_id (int | None, optional): Идентификатор сервера.
+
+    Returns:
+        dict[str, str]: Поля "status", "cpu", "peers" и "updated"; отсутствующие
+        или устаревшие значения равны `UNKNOWN`.
+    """
+    snapshot = dict.fromkeys(("status", "cpu", "peers", "updated"), UNKNOWN)
+
+    pipe = redis_engine.pipeline()
+    pipe.hgetall(status_key(server_id))
+    try:
+        (cached,) = await execute_redis_query(pipe)
+    except DatabaseError:
+        logger.warning("Состояние сервера wireguard недоступно в кэше")
+    else:
+        snapshot.update(cached or {})
+    return snapshot
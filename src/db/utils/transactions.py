@@ -8,7 +8,7 @@ from sqlalchemy import and_, insert, select, update
 
 from core.config import settings
 from core.metric import async_speed_metric
-from db.database import execute_query, iter_redis_keys
+from db.database import execute_query
 from db.models import Transactions, UserActivity, UserData
 from db.utils.redis import CashManager
 
@@ -19,8 +19,7 @@ logger = logging.getLogger()
 async def get_cash_wg_transactions(user_id):
     """Получает транзакции пользователя из кеша.
 
-    Функция ищет транзакции пользователя в Redis, используя ключи,
-    соответствующие его идентификатору.
+    Функция читает транзакции пользователя из Redis по его индексу ключей.
 
     Args:
         user_id (str): Идентификатор пользователя.
@@ -28,13 +27,7 @@ async def get_cash_wg_transactions(user_id):
     Returns:
         list: Список транзакций пользователя.
     """
-    cash = CashManager(Transactions)
-
-    tr_keys = await iter_redis_keys(f"data:{Transactions.__tablename__}:*:{user_id}")
-    async for trans_key in tr_keys:
-        cash.cmd.hgetall(trans_key)
-
-    return await cash()
+    return await CashManager(Transactions).items(user_id)
 
 
 @async_speed_metric
@@ -49,8 +42,7 @@ async def delete_cash_transactions(user_id):
     Returns:
         None
     """
-    rkeys = await iter_redis_keys(f"data:{Transactions.__tablename__}:*:{user_id}")
-    await CashManager(Transactions).delete(*[key async for key in rkeys], fullkey=True)
+    await CashManager(Transactions).delete_items(user_id)
 
 
 @async_speed_metric
@@ -175,7 +167,7 @@ async def get_user_transactions(user_id):
 
     if result:
         await CashManager(Transactions).add(
-            **{f"{trans.id}:{user_id}": trans.__ustr_dict__ for trans in result}
+            **{f"{trans.id}:{user_id}": trans for trans in result}
         )
 
     return result
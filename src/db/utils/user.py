@@ -29,7 +29,7 @@ async def get_user(user_id):
     Returns:
         UserData: Объект данных пользователя или None, если пользователь не найден.
     """
-    result: UserData = await CashManager(UserData).get({user_id: ...})
+    result: list[UserData] = await CashManager(UserData).load(user_id)
     if result:
         return result[0]
 
@@ -37,7 +37,7 @@ async def get_user(user_id):
     result: UserData = (await execute_query(query)).scalar_one_or_none()
 
     if result:
-        await CashManager(UserData).add({user_id: result.__ustr_dict__})
+        await CashManager(UserData).add({user_id: result})
 
     return result
 
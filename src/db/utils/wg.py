@@ -2,13 +2,17 @@
 
 import logging
 
-from sqlalchemy import and_, delete, insert, select, update
+from sqlalchemy import (Integer, and_, case, delete, func, insert, literal,
+                        select, update)
+from sqlalchemy.dialects.postgresql import INET
 from sqlalchemy.orm import joinedload
 
+from core.config import settings
 from core.exceptions import DatabaseError, UniquenessError
 from core.metric import async_speed_metric
-from db.database import execute_query, iter_redis_keys
-from db.models import FreezeSteps, UserData, WgConfig
+from db.database import execute_query
+from db.models import FreezeSteps, UserData, WgConfig, WgPeerPool, WgServer
+from db.models.wg_config import name_gen
 from db.utils import get_user
 from db.utils.redis import CashManager
 
@@ -25,13 +29,7 @@ async def get_cash_wg_configs(user_id):
     Returns:
         list[WgConfig]: Список конфигураций WireGuard, связанных с пользователем.
     """
-    cash = CashManager(WgConfig)
-
-    wg_keys = await iter_redis_keys(f"data:{WgConfig.__tablename__}:*:{user_id}")
-    async for wg_conf_key in wg_keys:
-        cash.cmd.hgetall(wg_conf_key)
-
-    return await cash()
+    return await CashManager(WgConfig).items(user_id)
 
 
 @async_speed_metric
@@ -41,11 +39,7 @@ async def delete_cash_configs(user_id):
     Args:
         user_id (int): Идентификатор пользователя.
     """
-    rkeys = await iter_redis_keys(f"data:{WgConfig.__tablename__}:*:{user_id}")
-    await CashManager(WgConfig).delete(
-        *[key async for key in rkeys],
-        fullkey=True,
-    )
+    await CashManager(WgConfig).delete_items(user_id)
 
 
 @async_speed_metric
@@ -98,10 +92,7 @@ async def get_user_with_configs(user_id):
     result: UserData = (await execute_query(query)).unique().scalar_one_or_none()
     if result:
         await CashManager(WgConfig).add(
-            **{
-                f"{config.name}:{user_id}": config.__ustr_dict__
-                for config in result.configs
-            }
+            **{f"{config.name}:{user_id}": config for config in result.configs}
         )
 
     return result
@@ -139,6 +130,145 @@ async def add_wg_config(conf: dict, user_id):
     return result
 
 
+@async_speed_metric
+async def claim_pool_config(
+    user_id,
+    server_id: int | None = None,
+    endpoint_ip: str = settings.WG_HOST,
+    endpoint_port: int = settings.WG_PORT,
+):
+    """Забирает пир из пула и создает из него конфигурацию пользователя.
+
+    Удаление пира из пула и создание конфигурации выполняются одним запросом;
+    конкурентные вызовы получают разные пиры (`FOR UPDATE SKIP LOCKED`).
+
+    Args:
+        user_id (int): Идентификатор пользователя.
+        server_id (int | None, optional): Сервер, пир которого нужно забрать.
+        endpoint_ip (str, optional): IP-адрес конечной точки сервера.
+        endpoint_port (int, optional): Порт конечной точки сервера.
+
+    Returns:
+        WgConfig: Созданная конфигурация или None, если пул пуст.
+
+    Raises:
+        DatabaseError: Если конфигурацию не удалось создать из-за ошибки базы данных.
+    """
+    result = None
+    for _ in range(10):
+        claimed = (
+            delete(WgPeerPool)
+            .where(
+                WgPeerPool.id
+                == select(WgPeerPool.id)
+                .where(WgPeerPool.server_id.is_not_distinct_from(server_id))
+                .order_by(WgPeerPool.id)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+                .scalar_subquery()
+            )
+            .returning(
+                WgPeerPool.user_private_key,
+                WgPeerPool.server_public_key,
+                WgPeerPool.address,
+            )
+            .cte("claimed")
+        )
+        query = (
+            insert(WgConfig)
+            .from_select(
+                [
+                    "user_id",
+                    "name",
+                    "user_private_key",
+                    "server_public_key",
+                    "address",
+                    "server_id",
+                    "endpoint_ip",
+                    "endpoint_port",
+                ],
+                select(
+                    literal(user_id),
+                    literal(name_gen.get_random_word()),
+                    claimed.c.user_private_key,
+                    claimed.c.server_public_key,
+                    claimed.c.address,
+                    literal(server_id, Integer),
+                    literal(str(endpoint_ip), INET),
+                    literal(endpoint_port),
+                ),
+            )
+            .returning(WgConfig)
+        )
+        try:
+            result: WgConfig = (await execute_query(query)).scalar_one_or_none()
+        except UniquenessError:
+            continue
+        else:
+            break
+    else:
+        raise DatabaseError
+
+    if result:
+        await delete_cash_configs(user_id)
+
+    return result
+
+
+@async_speed_metric
+async def count_pool_peers(server_id: int | None = None):
+    """Получает количество пиров в пуле сервера.
+
+    Args:
+        server_id (int | None, optional): Идентификатор сервера.
+
+    Returns:
+        int: Количество пиров в пуле.
+    """
+    query = select(func.count(WgPeerPool.id)).where(
+        WgPeerPool.server_id.is_not_distinct_from(server_id)
+    )
+
+    return (await execute_query(query, echo=False)).scalar_one()
+
+
+@async_speed_metric
+async def get_pool_public_keys():
+    """Получает публичные ключи всех пиров пула.
+
+    Returns:
+        set[str]: Публичные ключи пиров пула.
+    """
+    query = select(WgPeerPool.server_public_key)
+
+    return set((await execute_query(query, echo=False)).scalars().all())
+
+
+@async_speed_metric
+async def get_pool_peers():
+    """Получает все пиры пула.
+
+    Returns:
+        list[WgPeerPool]: Пиры пула.
+    """
+    query = select(WgPeerPool)
+
+    result: list[WgPeerPool] = (await execute_query(query, echo=False)).scalars().all()
+    return result
+
+
+@async_speed_metric
+async def add_pool_peers(peers: list[dict]):
+    """Добавляет пиры в пул.
+
+    Args:
+        peers (list[dict]): Пиры вида
+            {"user_private_key", "server_public_key", "address", "server_id"}.
+    """
+    if peers:
+        await execute_query(insert(WgPeerPool).values(peers))
+
+
 @async_speed_metric
 async def freeze_config(configs: list[WgConfig], freeze: FreezeSteps):
     """Замораживает указанные конфигурации WireGuard.
@@ -161,6 +291,96 @@ async def freeze_config(configs: list[WgConfig], freeze: FreezeSteps):
         await delete_cash_configs(user_id)
 
 
+@async_speed_metric
+async def set_freeze_states(states: dict[FreezeSteps, list[WgConfig]]):
+    """Устанавливает шаги заморозки нескольким группам конфигураций одним запросом.
+
+    Args:
+        states (dict[FreezeSteps, list[WgConfig]]): Конфигурации по новому шагу заморозки.
+
+    Returns:
+        list[WgConfig]: Обновленные конфигурации.
+    """
+    states = {freeze: configs for freeze, configs in states.items() if configs}
+    if not states:
+        return []
+
+    query = (
+        update(WgConfig)
+        .where(
+            WgConfig.id.in_(
+                [config.id for configs in states.values() for config in configs]
+            )
+        )
+        .values(
+            freeze=case(
+                *(
+                    (
+                        WgConfig.id.in_([config.id for config in configs]),
+                        literal(freeze, WgConfig.freeze.type),
+                    )
+                    for freeze, configs in states.items()
+                ),
+                else_=WgConfig.freeze,
+            )
+        )
+        .returning(WgConfig)
+    )
+
+    result: list[WgConfig] = (await execute_query(query)).scalars().all()
+
+    for user_id in {cfg.user_id for cfg in result}:
+        await delete_cash_configs(user_id)
+
+    return result
+
+
+@async_speed_metric
+async def move_wg_configs(
+    configs: list[WgConfig],
+    source_id: int | None,
+    target_id: int | None,
+    endpoint_ip: str,
+    endpoint_port: int,
+):
+    """Переносит конфигурации на другой сервер.
+
+    Конфигурации обновляются одним запросом (одной транзакцией); конфигурации,
+    которые за время переноса были удалены или перенесены на другой сервер,
+    не изменяются. Кэш конфигураций затронутых пользователей удаляется.
+
+    Args:
+        configs (list[WgConfig]): Конфигурации для переноса.
+        source_id (int | None): Сервер, на котором находились конфигурации.
+        target_id (int | None): Сервер назначения.
+        endpoint_ip (str): IP-адрес конечной точки сервера назначения.
+        endpoint_port (int): Порт конечной точки сервера назначения.
+
+    Returns:
+        list[WgConfig]: Перенесенные конфигурации.
+    """
+    query = (
+        update(WgConfig)
+        .where(
+            WgConfig.id.in_([config.id for config in configs]),
+            WgConfig.server_id.is_not_distinct_from(source_id),
+        )
+        .values(
+            server_id=target_id,
+            endpoint_ip=str(endpoint_ip),
+            endpoint_port=endpoint_port,
+        )
+        .returning(WgConfig)
+    )
+
+    result: list[WgConfig] = (await execute_query(query)).scalars().all()
+
+    for user_id in {cfg.user_id for cfg in result}:
+        await delete_cash_configs(user_id)
+
+    return result
+
+
 @async_speed_metric
 async def get_all_wg_configs():
     """Получает все конфигурации WireGuard.
@@ -174,6 +394,20 @@ async def get_all_wg_configs():
     return result
 
 
+@async_speed_metric
+async def get_wg_addresses():
+    """Получает адреса всех конфигураций WireGuard.
+
+    Адреса пиров пула (`WgPeerPool`) тоже считаются занятыми.
+
+    Returns:
+        list[IPv4Interface]: Список адресов конфигураций.
+    """
+    query = select(WgConfig.address).union_all(select(WgPeerPool.address))
+
+    return (await execute_query(query, echo=False)).scalars().all()
+
+
 @async_speed_metric
 async def delete_unregistered_wg_configs(configs: list[WgConfig]):
     """Удаляет незарегистрированные конфигурации WireGuard.
@@ -184,3 +418,65 @@ async def delete_unregistered_wg_configs(configs: list[WgConfig]):
     query = delete(WgConfig).where(WgConfig.id.in_([config.id for config in configs]))
 
     await execute_query(query)
+
+
+@async_speed_metric
+async def get_wg_servers():
+    """Получает реестр серверов WireGuard.
+
+    Returns:
+        list[WgServer]: Список серверов.
+    """
+    query = select(WgServer).order_by(WgServer.id)
+
+    return (await execute_query(query, echo=False)).scalars().all()
+
+
+@async_speed_metric
+async def register_default_server():
+    """Регистрирует сервер из настроек в реестре (если его там нет).
+
+    Конфигурации и пиры пула без сервера привязываются к нему.
+
+    Returns:
+        WgServer: Запись сервера из настроек.
+    """
+    query = select(WgServer).where(WgServer.host == settings.WG_HOST)
+    server: WgServer = (await execute_query(query, echo=False)).scalars().first()
+
+    if server is None:
+        query = (
+            insert(WgServer)
+            .values(
+                name=settings.WG_HOST,
+                host=settings.WG_HOST,
+                endpoint_ip=settings.WG_HOST,
+                endpoint_port=settings.WG_PORT,
+                public_key=settings.WG_SERVER_KEY,
+                capacity=settings.wg_server_capacity,
+            )
+            .returning(WgServer)
+        )
+        server = (await execute_query(query)).scalar_one()
+
+    for model in (WgConfig, WgPeerPool):
+        query = (
+            update(model).where(model.server_id.is_(None)).values(server_id=server.id)
+        )
+        await execute_query(query)
+
+    return server
+
+
+@async_speed_metric
+async def count_server_configs():
+    """Получает количество конфигураций на каждом сервере.
+
+    Returns:
+        dict[int | None, int]: Количество конфигураций по идентификаторам серверов.
+    """
+    query = select(WgConfig.server_id, func.count(WgConfig.id)).group_by(
+        WgConfig.server_id
+    )
+
+    return dict((await execute_query(query, echo=False)).all())
@@ -19,7 +19,7 @@ from db.models import UserData
 from handlers.utils import find_user
 from kb import get_account_keyboard, static_start_button
 from messages import INTRO
-from wg.utils import WgServerTools
+from wg.utils import CLUSTER
 
 logger = logging.getLogger()
 router = Router()
@@ -87,7 +87,7 @@ async def account_actions(
 
     account_kb = get_account_keyboard(user_data)
 
-    server_status = await WgServerTools().get_server_status()
+    server_status = (await utils.get_server_snapshot(CLUSTER.default.id))["status"]
 
     if user_data is None:
         await getattr(trigger, "message", trigger).answer(
@@ -1,6 +1,7 @@
 """Функционал администратора"""
 
 import logging
+from collections import Counter
 
 from aiogram import Bot, F, Router
 from aiogram.filters.command import Command
@@ -16,6 +17,7 @@ from core.err import bot_except
 from core.metric import async_speed_metric
 from db import utils
 from db.models import UserData
+from scheduler.rebalance import plan_rebalance
 from states import AdminService
 
 logger = logging.getLogger()
@@ -42,6 +44,7 @@ async def admin_actions(message: Message):
                 "/send - рассылка сообщения всем зарегистрированным пользователям",
                 "/close - уведомление пользователей о технических работах на сервере",
                 "/open - уведомление пользователей об окончании технических работ на сервере",
+                "/rebalance - план переноса пиров между серверами (без изменений)",
                 marker="~ ",
             )
 
@@ -271,3 +274,34 @@ async def admin_mailing_start_server(message: Message, bot: Bot):
 
     except exc.DatabaseError:
         await message.answer(text.DB_ERROR)
+
+
+@router.message(Command("rebalance"))
+@bot_except
+async def admin_rebalance_plan(message: Message):
+    """Показывает план переноса пиров между серверами (без выполнения переноса).
+
+    Args:
+        message (Message): Сообщение от пользователя.
+    """
+    try:
+        user_data: UserData = await utils.get_user(message.from_user.id)
+        if getattr(user_data, "admin", False):
+            plan = await plan_rebalance()
+            if plan:
+                moves = Counter((move.source, move.target) for move in plan)
+                await message.answer(
+                    f"План переноса ({len(plan)}):\n"
+                    + "\n".join(
+                        f"Сервер {source} → сервер {target}: {count}"
+                        for (source, target), count in moves.items()
+                    )
+                )
+            else:
+                await message.answer("Нагрузка серверов сбалансирована")
+
+        else:
+            await message.answer(text.only_admin)
+
+    except exc.DatabaseError:
+        await message.answer(text.DB_ERROR)
@@ -17,9 +17,10 @@ from core.config import settings
 from core.err import bot_except
 from core.exceptions import BaseBotError, DatabaseError, WireguardError
 from db.models import UserData
-from db.utils import get_user, test_server_speed
+from db.utils import get_server_snapshot, get_user, test_server_speed
+from db.utils.status import UNKNOWN
 from handlers.utils import find_user
-from wg.utils import WgServerTools
+from wg.utils import CLUSTER
 
 logger = logging.getLogger()
 router = Router()
@@ -338,7 +339,8 @@ async def server_status(trigger: Union[Message, CallbackQuery], bot: Bot):
         trigger (Union[Message, CallbackQuery]): Сообщение или событие обратного вызова, инициировавшее команду.
         bot (Bot): Экземпляр бота для выполнения действий.
 
-    Отправляет сообщение с текущим состоянием сервера и его загрузкой.
+    Отправляет сообщение с текущим состоянием сервера и его загрузкой
+    (из кэша, который обновляет `poll_server_status`).
     """
     await bot.send_chat_action(trigger.from_user.id, "typing")
 
@@ -351,23 +353,18 @@ async def server_status(trigger: Union[Message, CallbackQuery], bot: Bot):
         )
         return
 
-    try:
-        wg = WgServerTools()
-
-        server_status = await wg.get_server_status()
-        cpu_usage = await wg.get_server_cpu_usage()
+    snapshot = await get_server_snapshot(CLUSTER.default.id)
+    cpu_usage = snapshot["cpu"]
+    if cpu_usage != UNKNOWN:
+        cpu_usage = f"{cpu_usage}%"
 
-    except WireguardError:
-        await getattr(trigger, "message", trigger).answer(text.WG_ERROR)
-
-    else:
-        server_data = (
-            "Текущие параметры сервера:\n\n"
-            f"🖥 Сервер:        <b>{server_status.capitalize()}</b>\n\n"
-            f"🦾 СPU usage:  <b>{cpu_usage}</b>"
-        )
+    server_data = (
+        "Текущие параметры сервера:\n\n"
+        f"🖥 Сервер:        <b>{snapshot['status'].capitalize()}</b>\n\n"
+        f"🦾 СPU usage:  <b>{cpu_usage}</b>"
+    )
 
-        await getattr(trigger, "message", trigger).answer(server_data)
+    await getattr(trigger, "message", trigger).answer(server_data)
 
 
 @router.message(Command("speed"))
@@ -20,7 +20,8 @@ from db import utils
 from db.models import FreezeSteps, UserActivity, UserData, WgConfig
 from handlers.utils import find_config, find_user
 from kb import get_config_keyboard, static_pay_button, why_freezed_button
-from wg.utils import WgServerTools
+from scheduler.idle import thaw_idle_configs
+from wg.utils import CLUSTER, WgServerTools
 
 logger = logging.getLogger()
 router = Router()
@@ -40,6 +41,7 @@ async def post_user_data(trigger: Union[Message, CallbackQuery]):
         trigger (Union[Message, CallbackQuery]): Сообщение или событие обратного вызова, инициировавшее команду.
 
     Если у пользователя есть конфигурации, отправляет их список. Если конфигурации заморожены, отправляет сообщение об этом.
+    Конфигурации активного пользователя, замороженные из-за простоя, предварительно размораживаются.
     Также информирует пользователя о максимальном количестве конфигураций для его тарифа.
     """
     user_data: UserData = await find_user(trigger, configs=True)
@@ -48,6 +50,17 @@ async def post_user_data(trigger: Union[Message, CallbackQuery]):
     else:
         create_cfg_btn, create_output_cfg_btn = get_config_keyboard()
 
+        if user_data.active == UserActivity.active:
+            try:
+                await thaw_idle_configs(
+                    user_data.configs, settings.acceptable_config[user_data.stage]
+                )
+            except exc.DatabaseError:
+                logger.warning(
+                    "Не разморожены простаивающие конфигурации",
+                    extra={"user_id": trigger.from_user.id},
+                )
+
         if user_data.configs:
             await getattr(trigger, "message", trigger).answer("Ваши конфигурации:")
 
@@ -88,6 +101,24 @@ async def post_user_data(trigger: Union[Message, CallbackQuery]):
             )
 
 
+async def activate_pool_config(config: WgConfig):
+    """Разблокирует на сервере пир, взятый из пула.
+
+    Если сервер недоступен, конфигурация помечается ожидающей разморозки
+    и будет разблокирована задачей `check_freeze_configs`.
+
+    Args:
+        config (WgConfig): Конфигурация, созданная из пира пула.
+    """
+    try:
+        await WgServerTools(config.server_id).move_user(
+            move="unban", user_pubkey=config.server_public_key
+        )
+    except exc.WireguardError:
+        logger.warning(f"Пир пула не разблокирован: {config.address}")
+        await utils.freeze_config([config], freeze=FreezeSteps.wait_no)
+
+
 @router.message(Command("create"))
 @router.callback_query(F.data == "create_configuration")
 @async_speed_metric
@@ -100,7 +131,8 @@ async def create_config_data(trigger: Union[Message, CallbackQuery], bot: Bot):
         bot (Bot): Экземпляр бота для выполнения действий.
 
     Проверяет, может ли пользователь создать новую конфигурацию, и создает ее, если это возможно.
-    В случае ошибок отправляет соответствующие сообщения.
+    Сервер выбирается по нагрузке (`CLUSTER.place`), конфигурация берется из пула
+    заранее созданных пиров этого сервера, а если пул пуст - пир создается на сервере. В случае ошибок отправляет соответствующие сообщения.
     """
     try:
         user_data: UserData = await find_user(trigger, configs=True)
@@ -110,11 +142,19 @@ async def create_config_data(trigger: Union[Message, CallbackQuery], bot: Bot):
             raise exc.PayError
 
         elif len(user_data.configs) < settings.acceptable_config[user_data.stage]:
-            wg = WgServerTools()
-            conf = await wg.move_user(move="add", user_id=trigger.from_user.id)
-            config: WgConfig = await utils.add_wg_config(
-                conf, user_id=trigger.from_user.id
+            node = CLUSTER.place()
+            config: WgConfig = await utils.claim_pool_config(
+                trigger.from_user.id,
+                server_id=node.id,
+                endpoint_ip=node.endpoint_ip,
+                endpoint_port=node.endpoint_port,
             )
+            if config:
+                await activate_pool_config(config)
+            else:
+                wg = WgServerTools(node.id)
+                conf = await wg.move_user(move="add", user_id=trigger.from_user.id)
+                config = await utils.add_wg_config(conf, user_id=trigger.from_user.id)
 
         else:
             raise exc.StagePayError
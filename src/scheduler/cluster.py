@@ -0,0 +1,36 @@
+"""Обновление реестра и нагрузки серверов кластера WireGuard"""
+
+import logging
+
+from core.err import log_cash_error
+from db.utils import count_server_configs, get_wg_servers
+from db.utils.redis import LOCAL_CACHE
+from wg.utils import CLUSTER
+
+logger = logging.getLogger("apscheduler")
+logging.getLogger("apscheduler.executors.default").setLevel(logging.WARNING)
+
+
+async def refresh_cluster():
+    """Обновляет реестр серверов и метрики их нагрузки.
+
+    Новые серверы из БД добавляются в кластер и подключаются, для всех
+    серверов обновляется количество конфигураций (по БД). Загрузку CPU
+    узлов обновляет `poll_server_status`. Метрики очередей операций узлов
+    и кэша процесса (`LOCAL_CACHE`) записываются в лог.
+    """
+    try:
+        CLUSTER.load(await get_wg_servers())
+        await CLUSTER.connect()
+        CLUSTER.set_load(peers=await count_server_configs())
+
+    except Exception as e:
+        if log_cash_error(e):
+            logger.exception("Ошибка обновления реестра серверов wireguard")
+    else:
+        logger.debug(f"Реестр серверов wireguard: {list(CLUSTER)}")
+        logger.debug(
+            "Очереди операций wireguard",
+            extra={"metrics": {node.id: node.ops.metrics for node in CLUSTER}},
+        )
+        logger.debug("Кэш процесса", extra={"metrics": LOCAL_CACHE.metrics})
@@ -1,24 +1,106 @@
 """События связанные с заморозкой"""
 
+import asyncio
 import logging
 
 from core.err import log_cash_error
 from core.exceptions import DatabaseError, WireguardError
-from db.models import FreezeSteps
+from db.models import FreezeSteps, WgConfig
 from db.utils import (delete_unregistered_wg_configs, freeze_config,
-                      get_all_wg_configs)
-from wg.utils import WgServerTools
+                      get_all_wg_configs, get_pool_public_keys,
+                      set_freeze_states)
+from wg.feed import PeerFeed
+from wg.ops import OpClass, op_class
+from wg.reconcile import MismatchKind, ReconcilePlan, plan_reconcile
+from wg.utils import CLUSTER, IPS, WgServerTools
 
 logger = logging.getLogger("apscheduler")
 logging.getLogger("apscheduler.executors.default").setLevel(logging.WARNING)
 
+FEEDS: dict[int | None, PeerFeed] = {}
+"""dict[int | None, PeerFeed]: Копии списков пиров серверов кластера (обновляются по журналу изменений)."""
 
+
+def split_results(configs: list[WgConfig], results: list[dict], mode: str):
+    """Разделяет конфигурации по результату пакетной операции на сервере.
+
+    Args:
+        configs (list[WgConfig]): Конфигурации, для которых выполнялась операция.
+        results (list[dict]): Результаты `WgServerTools.move_users`.
+        mode (str): Режим операции ("ban", "unban", ...).
+
+    Returns:
+        tuple[list[WgConfig], list[WgConfig]]: Примененные (в т.ч. уже находившиеся
+        в нужном состоянии) и не примененные конфигурации.
+    """
+    statuses = {
+        result["pubkey"]: result["status"]
+        for result in results
+        if result["mode"] == mode
+    }
+
+    applied, failed = [], []
+    for config in configs:
+        if statuses.get(config.server_public_key) in ("done", "skip"):
+            applied.append(config)
+        else:
+            failed.append(config)
+    return applied, failed
+
+
+async def move_configs(
+    ban: list[WgConfig] = (), unban: list[WgConfig] = ()
+) -> list[dict]:
+    """Блокирует и разблокирует конфигурации на их серверах.
+
+    Конфигурации группируются по серверам, пакетные операции на разных
+    серверах выполняются параллельно. Ошибка на одном сервере не прерывает
+    операции на остальных: конфигурации этого сервера не попадают в результаты.
+
+    Args:
+        ban (list[WgConfig], optional): Конфигурации для блокировки.
+        unban (list[WgConfig], optional): Конфигурации для разблокировки.
+
+    Returns:
+        list[dict]: Результаты `WgServerTools.move_users` всех серверов.
+    """
+    groups: dict[int | None, dict[str, list[str]]] = {}
+    for mode, configs in (("ban", ban), ("unban", unban)):
+        for config in configs:
+            group = groups.setdefault(config.server_id, {"ban": [], "unban": []})
+            group[mode].append(config.server_public_key)
+
+    async def move_group(server_id, group):
+        return await WgServerTools(server_id).move_users(**group)
+
+    results = []
+    for server_id, result in zip(
+        groups,
+        await asyncio.gather(
+            *(move_group(server_id, group) for server_id, group in groups.items()),
+            return_exceptions=True,
+        ),
+    ):
+        if isinstance(result, Exception):
+            if log_cash_error(result):
+                logger.error(
+                    f"Ошибка пакетной операции на сервере wireguard {server_id}",
+                    exc_info=result,
+                )
+        else:
+            results.extend(result)
+    return results
+
+
+@op_class(OpClass.billing)
 async def check_freeze_configs():
     """Проверяет и обновляет состояние заморозки конфигураций.
 
     Эта функция получает все конфигурации и проверяет их состояние заморозки.
-    Если конфигурация находится в состоянии ожидания разморозки, она будет разморожена.
-    Если конфигурация находится в состоянии ожидания заморозки, она будет заморожена.
+    Конфигурации в состоянии ожидания разморозки разблокируются, в состоянии
+    ожидания заморозки - блокируются. Все изменения отправляются на сервер
+    одной пакетной операцией, состояние в БД обновляется только для тех
+    конфигураций, изменение которых было применено на сервере.
     Логи записываются для отслеживания изменений состояний конфигураций.
 
     Raises:
@@ -29,18 +111,17 @@ async def check_freeze_configs():
         configs = await get_all_wg_configs()
 
         wait_no_cfg = [cfg for cfg in configs if cfg.freeze == FreezeSteps.wait_no]
-        for config in wait_no_cfg:
-            await WgServerTools().move_user(
-                move="unban", user_pubkey=config.server_public_key
-            )
+        wait_yes_cfg = [cfg for cfg in configs if cfg.freeze == FreezeSteps.wait_yes]
+        if not (wait_no_cfg or wait_yes_cfg):
+            return
+
+        results = await move_configs(ban=wait_yes_cfg, unban=wait_no_cfg)
+
+        wait_no_cfg, unban_failed = split_results(wait_no_cfg, results, "unban")
         if wait_no_cfg:
             await freeze_config(wait_no_cfg, freeze=FreezeSteps.no)
 
-        wait_yes_cfg = [cfg for cfg in configs if cfg.freeze == FreezeSteps.wait_yes]
-        for config in wait_yes_cfg:
-            await WgServerTools().move_user(
-                move="ban", user_pubkey=config.server_public_key
-            )
+        wait_yes_cfg, ban_failed = split_results(wait_yes_cfg, results, "ban")
         if wait_yes_cfg:
             await freeze_config(wait_yes_cfg, freeze=FreezeSteps.yes)
 
@@ -69,60 +150,100 @@ async def check_freeze_configs():
                 "Заморожены конфигурации",
                 extra={"configs.ids": [config.id for config in wait_yes_cfg]},
             )
+        if unban_failed or ban_failed:
+            logger.warning(
+                "Не удалось изменить состояние заморозки конфигураций на сервере",
+                extra={
+                    "configs.ids": [config.id for config in unban_failed + ban_failed]
+                },
+            )
+
+
+def report_mismatches(plan: ReconcilePlan):
+    """Записывает в лог каждое расхождение плана сверки отдельной записью."""
+    for mismatch in plan.mismatches:
+        extra = {
+            "mismatch": mismatch.kind.value,
+            "server_id": mismatch.server_id,
+            "pubkey": mismatch.public_key,
+        }
+        if mismatch.config is not None:
+            extra["configs.ids"] = [mismatch.config.id]
+
+        if mismatch.kind == MismatchKind.missing_on_server:
+            logger.warning(
+                f"Найдена незарегистрированная конфигурация: {mismatch.config.address}",
+                extra=extra,
+            )
+        elif mismatch.kind == MismatchKind.missing_in_db:
+            logger.warning(
+                f"Пир сервера отсутствует в БД: {mismatch.peer['allowedips']}",
+                extra=extra,
+            )
+        elif mismatch.kind == MismatchKind.address:
+            logger.error(
+                f"Адрес пира {mismatch.peer['allowedips']} не соответствует "
+                f"адресу конфигурации {mismatch.config.address}",
+                extra=extra,
+            )
+        else:
+            logger.warning(
+                "Состояние блокировки пира не соответствует заморозке конфигурации",
+                extra=extra,
+            )
 
 
+@op_class(OpClass.reconciliation)
 async def validate_configs():
     """Проверяет соответствие локальных конфигураций и конфигураций на сервере.
 
-    Эта функция получает список пиров с сервера и локальные конфигурации.
-    Она проверяет, соответствуют ли адреса пиров конфигурациям в базе данных.
-    Если пир заблокирован, конфигурация будет заморожена. Если пир разблокирован, конфигурация будет разморожена.
+    Эта функция обновляет копии списков пиров серверов кластера (`FEEDS`: с серверов
+    передаются только изменения после прошлой проверки) и получает локальные конфигурации.
+    Конфигурации серверов, список пиров которых получить не удалось, пропускаются.
+    План сверки составляется за один проход (`plan_reconcile`), каждое расхождение
+    записывается в лог отдельно и не прерывает сверку остальных конфигураций.
+    Ожидающие заморозки (разморозки) конфигурации, которые еще не применены на сервере,
+    применяются одной пакетной операцией на каждом сервере, состояния заморозки
+    обновляются в БД одним запросом.
 
-    Raises:
-        DatabaseError: Если произошла ошибка при взаимодействии с базой данных.
-        WireguardError: Если произошла ошибка при взаимодействии с сервером Wireguard.
-        AssertionError: Если адрес полученного пира не соответствует имеющемуся в базе данных.
+    Returns:
+        ReconcilePlan | None: План сверки (None, если сверка не выполнена).
     """
     try:
-        server_peers = await WgServerTools().get_peer_list()
-        server_peers = {peer["publickey"]: peer for peer in server_peers}
-
-        local_configs = await get_all_wg_configs()
-
-        to_freeze = []
-        to_unfreeze = []
-        to_delete = []
-
-        for config in local_configs:
-            peer = server_peers.get(config.server_public_key, None)
+        async def sync_node(node):
+            feed = FEEDS.setdefault(node.id, PeerFeed(node.id))
+            await feed.sync()
+            return feed.peers
 
-            if peer:
-                assert str(config.address) == peer["allowedips"]
+        servers_peers = {}
+        for server_id, peers in (await CLUSTER.fan_out(sync_node)).items():
+            if isinstance(peers, Exception):
+                if log_cash_error(peers):
+                    logger.error(
+                        f"Не удалось получить пиры сервера wireguard {server_id}",
+                        exc_info=peers,
+                    )
+            else:
+                servers_peers[server_id] = peers
 
-                if peer["ban"] and config.freeze in (
-                    FreezeSteps.no,
-                    FreezeSteps.wait_yes,
-                ):
-                    to_freeze.append(config)
+        plan = plan_reconcile(
+            await get_all_wg_configs(), servers_peers, await get_pool_public_keys()
+        )
+        report_mismatches(plan)
 
-                elif not peer["ban"] and config.freeze in (
-                    FreezeSteps.yes,
-                    FreezeSteps.wait_no,
-                ):
-                    to_unfreeze.append(config)
-            else:
-                logger.warning(
-                    f"Найдена незарегистрированная конфигурация: {config.address}"
-                )
-                
-                to_delete.append(config)
+        to_freeze, to_unfreeze = list(plan.freeze), list(plan.unfreeze)
+        if plan.ban or plan.unban:
+            results = await move_configs(ban=plan.ban, unban=plan.unban)
+            to_freeze.extend(split_results(plan.ban, results, "ban")[0])
+            to_unfreeze.extend(split_results(plan.unban, results, "unban")[0])
 
-        if to_freeze:
-            await freeze_config(to_freeze, freeze=FreezeSteps.yes)
-        if to_unfreeze:
-            await freeze_config(to_unfreeze, freeze=FreezeSteps.no)
-        if to_delete:
-            await delete_unregistered_wg_configs(to_delete)
+        await set_freeze_states(
+            {FreezeSteps.yes: to_freeze, FreezeSteps.no: to_unfreeze}
+        )
+        if plan.delete:
+            await delete_unregistered_wg_configs(plan.delete)
+            for config in plan.delete:
+                IPS.release(config.address)
 
     except DatabaseError as e:
         if log_cash_error(e):
@@ -132,9 +253,9 @@ async def validate_configs():
             logger.exception(
                 "Ошибка связи с wireguard сервером при заморозке конфигураций"
             )
-    except AssertionError as e:
-        if log_cash_error(e):
-            logger.error("Адрес полученного пира не соответствует имеющемуся в БД")
     except Exception as e:
         if log_cash_error(e):
             logger.exception("Ошибка валидации состояния заморозки")
+    else:
+        logger.info("Сверка конфигураций", extra=plan.summary())
+        return plan
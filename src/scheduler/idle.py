@@ -0,0 +1,102 @@
+"""Заморозка простаивающих конфигураций"""
+
+import logging
+
+from core.config import settings
+from core.err import log_cash_error
+from db.models import FreezeSteps, WgConfig
+from db.utils import get_idle_configs, set_freeze_states
+from scheduler.config_freezer import move_configs, split_results
+from wg.ops import OpClass, op_class
+from wg.reconcile import plan_thaw
+
+logger = logging.getLogger("apscheduler")
+logging.getLogger("apscheduler.executors.default").setLevel(logging.WARNING)
+
+
+@op_class(OpClass.reconciliation)
+async def freeze_idle_configs():
+    """Замораживает конфигурации, пиры которых не выполняли рукопожатий дольше срока тарифа.
+
+    Простаивающие конфигурации (`get_idle_configs`, не более `settings.idle_batch`
+    за запуск) блокируются на серверах одной пакетной операцией на каждом сервере,
+    шаг заморозки `FreezeSteps.idle` устанавливается в БД одним запросом только
+    тем конфигурациям, пиры которых заблокированы. Конфигурации размораживаются
+    при запросе пользователем списка конфигураций (`thaw_idle_configs`).
+
+    Returns:
+        list[WgConfig]: Замороженные конфигурации.
+    """
+    frozen = []
+    try:
+        configs = await get_idle_configs(settings.idle_days, limit=settings.idle_batch)
+        if not configs:
+            return frozen
+
+        results = await move_configs(ban=configs)
+        frozen, failed = split_results(configs, results, "ban")
+        await set_freeze_states({FreezeSteps.idle: frozen})
+
+    except Exception as e:
+        if log_cash_error(e):
+            logger.exception("Ошибка заморозки простаивающих конфигураций")
+        return []
+    else:
+        if frozen:
+            logger.info(
+                "Заморожены простаивающие конфигурации",
+                extra={"configs.ids": [config.id for config in frozen]},
+            )
+        if failed:
+            logger.warning(
+                "Не удалось заморозить простаивающие конфигурации на сервере",
+                extra={"configs.ids": [config.id for config in failed]},
+            )
+    return frozen
+
+
+async def thaw_idle_configs(configs: list[WgConfig], limit: int):
+    """Размораживает простаивающие конфигурации пользователя в пределах лимита тарифа.
+
+    Лимит занимают первые по id конфигурации пользователя (`plan_thaw`), как
+    при смене тарифа в БД (`unfreeze_configs`). Пиры конфигураций в пределах
+    лимита разблокируются на серверах одной пакетной операцией на каждом сервере;
+    конфигурации, пиры которых разблокировать не удалось, помечаются ожидающими
+    разморозки и будут разблокированы задачей `check_freeze_configs`.
+    Конфигурации сверх лимита уже заблокированы на сервере и помечаются
+    замороженными. Состояние заморозки переданных конфигураций обновляется на месте.
+
+    Args:
+        configs (list[WgConfig]): Конфигурации пользователя.
+        limit (int): Допустимое количество конфигураций (`settings.acceptable_config`).
+
+    Raises:
+        DatabaseError: Если состояние заморозки не удалось обновить в БД.
+    """
+    idle, overflow = plan_thaw(configs, limit)
+    if not (idle or overflow):
+        return
+
+    thawed, pending = [], []
+    if idle:
+        thawed, pending = split_results(idle, await move_configs(unban=idle), "unban")
+    await set_freeze_states(
+        {FreezeSteps.no: thawed, FreezeSteps.wait_no: pending, FreezeSteps.yes: overflow}
+    )
+
+    for config in thawed:
+        config.freeze = FreezeSteps.no
+    for config in pending:
+        config.freeze = FreezeSteps.wait_no
+    for config in overflow:
+        config.freeze = FreezeSteps.yes
+    if idle:
+        logger.info(
+            "Разморожены простаивающие конфигурации",
+            extra={"configs.ids": [config.id for config in idle]},
+        )
+    if overflow:
+        logger.info(
+            "Простаивающие конфигурации сверх лимита тарифа заморожены",
+            extra={"configs.ids": [config.id for config in overflow]},
+        )
@@ -0,0 +1,53 @@
+"""Пополнение пула заранее созданных пиров"""
+
+import logging
+
+from core.config import settings
+from core.err import log_cash_error
+from db.utils import add_pool_peers, count_pool_peers
+from wg.cluster import WgNode
+from wg.ops import OpClass, op_class
+from wg.utils import CLUSTER, WgServerTools
+
+logger = logging.getLogger("apscheduler")
+logging.getLogger("apscheduler.executors.default").setLevel(logging.WARNING)
+
+
+async def refill_node_pool(node: WgNode):
+    """Пополняет пул пиров сервера до `settings.peer_pool_size`.
+
+    За один запуск создается не более `settings.peer_pool_batch` пиров
+    (одна пакетная операция на сервере и одна вставка в БД). Пиры пула
+    занимают емкость сервера наравне с конфигурациями: пул пополняется,
+    только пока конфигураций (`WgNode.peers`) и пиров пула меньше `WgNode.capacity`.
+
+    Returns:
+        int: Количество созданных пиров.
+    """
+    if not node.active:
+        return 0
+
+    pool = await count_pool_peers(node.id)
+    missing = min(settings.peer_pool_size - pool, node.capacity - node.peers - pool)
+    if missing <= 0:
+        return 0
+
+    peers = await WgServerTools(node.id).create_pool_peers(
+        min(missing, settings.peer_pool_batch)
+    )
+    await add_pool_peers(peers)
+    return len(peers)
+
+
+@op_class(OpClass.reconciliation)
+async def refill_peer_pool():
+    """Пополняет пулы пиров всех активных серверов кластера параллельно."""
+    for server_id, result in (await CLUSTER.fan_out(refill_node_pool)).items():
+        if isinstance(result, Exception):
+            if log_cash_error(result):
+                logger.error(
+                    f"Ошибка пополнения пула пиров сервера {server_id}",
+                    exc_info=result,
+                )
+        elif result:
+            logger.info(f"Пул пиров сервера {server_id} пополнен на {result}")
@@ -0,0 +1,220 @@
+"""Перенос пиров между серверами кластера WireGuard"""
+
+import asyncio
+import logging
+from collections import defaultdict
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError
+
+import text
+from core.config import settings
+from core.err import log_cash_error
+from db.models import FreezeSteps, WgConfig
+from db.utils import (count_pool_peers, get_all_wg_configs, get_configs_traffic,
+                      move_wg_configs)
+from wg.ops import OpClass, op_class
+from wg.rebalance import plan_moves
+from wg.utils import CLUSTER, WgServerTools
+
+logger = logging.getLogger("apscheduler")
+logging.getLogger("apscheduler.executors.default").setLevel(logging.WARNING)
+
+
+async def plan_rebalance(max_moves: int = None):
+    """Составляет план переноса пиров по текущей заполненности серверов.
+
+    Переносятся только конфигурации в устойчивом состоянии заморозки
+    (конфигурации, ожидающие заморозки или разморозки, пропускаются).
+    Пиры пула учитываются в заполненности серверов.
+
+    Args:
+        max_moves (int, optional): Максимальное количество переносов
+            (по умолчанию `settings.rebalance_max_moves`).
+
+    Returns:
+        list[Move]: План переноса.
+    """
+    nodes = [node for node in CLUSTER if node.alive]
+    if len(nodes) < 2:
+        return []
+
+    return plan_moves(
+        nodes,
+        await get_all_wg_configs(),
+        traffic=await get_configs_traffic(),
+        max_moves=settings.rebalance_max_moves if max_moves is None else max_moves,
+        threshold=settings.rebalance_threshold,
+        movable=lambda config: config.freeze in (FreezeSteps.no, FreezeSteps.yes),
+        pool={node.id: await count_pool_peers(node.id) for node in nodes},
+    )
+
+
+async def migrate_configs(source_id, target_id, configs: list[WgConfig]):
+    """Переносит конфигурации с одного сервера на другой.
+
+    Пиры регистрируются на сервере назначения (замороженные - сразу в
+    заблокированном состоянии) одной пакетной операцией, затем конфигурации
+    обновляются в БД одним запросом, и только после этого пиры удаляются
+    с исходного сервера. Пиры, которые не удалось перенести в БД, удаляются
+    с сервера назначения, поэтому пир всегда остается на сервере из БД.
+
+    Returns:
+        list[WgConfig]: Перенесенные конфигурации.
+
+    Raises:
+        WireguardError: Если возникла ошибка при регистрации пиров на сервере назначения.
+        DatabaseError: Если конфигурации не удалось обновить в БД.
+    """
+    target = WgServerTools(target_id)
+    results = await target.move_users(
+        add=[(config.server_public_key, str(config.address)) for config in configs],
+        ban=[
+            config.server_public_key
+            for config in configs
+            if config.freeze == FreezeSteps.yes
+        ],
+    )
+    statuses = {(result["mode"], result["pubkey"]): result["status"] for result in results}
+
+    added, stale = [], []
+    for config in configs:
+        if statuses.get(("new", config.server_public_key)) != "done":
+            continue
+        if config.freeze == FreezeSteps.yes and statuses.get(
+            ("ban", config.server_public_key)
+        ) not in ("done", "skip"):
+            stale.append(config.server_public_key)
+        else:
+            added.append(config)
+
+    moved = []
+    try:
+        if added:
+            moved = await move_wg_configs(
+                added,
+                source_id,
+                target.node.id,
+                target.node.endpoint_ip,
+                target.node.endpoint_port,
+            )
+    finally:
+        moved_keys = {config.server_public_key for config in moved}
+        stale.extend(
+            config.server_public_key
+            for config in added
+            if config.server_public_key not in moved_keys
+        )
+        if stale:
+            await target.move_users(delete=stale)
+
+    if moved:
+        try:
+            await WgServerTools(source_id).move_users(delete=list(moved_keys))
+        except Exception as e:
+            if log_cash_error(e):
+                logger.error(
+                    f"Перенесенные пиры не удалены с сервера wireguard {source_id}",
+                    exc_info=e,
+                )
+    return moved
+
+
+async def notify_moved(bot: Bot, configs: list[WgConfig]):
+    """Отправляет пользователям новые конфигурации после переноса.
+
+    Каждый пользователь получает одно сообщение со всеми своими перенесенными
+    конфигурациями; между сообщениями выдерживается пауза
+    `settings.rebalance_notice_delay`, чтобы не превысить ограничения Telegram.
+    """
+    by_user: dict[int, list[WgConfig]] = defaultdict(list)
+    for config in configs:
+        by_user[config.user_id].append(config)
+
+    for user_id, user_configs in by_user.items():
+        message = "\n\n".join(
+            [text.CONFIG_MOVED]
+            + [
+                f"Конфигурация: {config.name}\n<pre>{text.get_config_data(config)}</pre>"
+                for config in user_configs
+            ]
+        )
+        try:
+            await bot.send_message(user_id, message)
+        except (TelegramForbiddenError, TelegramBadRequest):
+            logger.warning(
+                "Не отправлено уведомление о переносе конфигурации",
+                extra={"user_id": user_id},
+            )
+        await asyncio.sleep(settings.rebalance_notice_delay)
+
+
+@op_class(OpClass.reconciliation)
+async def rebalance_cluster(bot: Bot, dry_run: bool = None):
+    """Переносит пиры с перегруженных серверов на менее заполненные.
+
+    План составляется `plan_rebalance` (не более `settings.rebalance_max_moves`
+    переносов за запуск). Переносы между разными парами серверов выполняются
+    параллельно, затем пользователям отправляются новые конфигурации.
+
+    Args:
+        bot (Bot): Экземпляр бота для уведомления пользователей.
+        dry_run (bool, optional): Только записать план в лог
+            (по умолчанию `settings.rebalance_dry_run`).
+
+    Returns:
+        list[Move]: План переноса.
+    """
+    dry_run = settings.rebalance_dry_run if dry_run is None else dry_run
+    plan = []
+    try:
+        plan = await plan_rebalance()
+        if not plan:
+            return plan
+
+        if dry_run:
+            logger.info(
+                f"План переноса {len(plan)} пиров",
+                extra={
+                    "moves": [
+                        (move.config.id, move.source, move.target) for move in plan
+                    ]
+                },
+            )
+            return plan
+
+        groups: dict[tuple, list[WgConfig]] = defaultdict(list)
+        for move in plan:
+            groups[move.source, move.target].append(move.config)
+
+        results = await asyncio.gather(
+            *(
+                migrate_configs(source, target, configs)
+                for (source, target), configs in groups.items()
+            ),
+            return_exceptions=True,
+        )
+
+        moved = []
+        for (source, target), result in zip(groups, results):
+            if isinstance(result, Exception):
+                if log_cash_error(result):
+                    logger.error(
+                        f"Ошибка переноса пиров с сервера {source} на сервер {target}",
+                        exc_info=result,
+                    )
+            else:
+                moved.extend(result)
+
+        if moved:
+            logger.info(
+                f"Перенесено {len(moved)} пиров из {len(plan)}",
+                extra={"configs.ids": [config.id for config in moved]},
+            )
+            await notify_moved(bot, moved)
+
+    except Exception as e:
+        if log_cash_error(e):
+            logger.exception("Ошибка переноса пиров между серверами")
+
+    return plan
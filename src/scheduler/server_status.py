@@ -0,0 +1,60 @@
+"""Фоновый опрос состояния серверов WireGuard"""
+
+import logging
+
+from core.config import settings
+from core.err import log_cash_error
+from db.utils import set_server_snapshots
+from wg.cluster import WgNode
+from wg.ops import OpClass, op_class
+from wg.utils import CLUSTER, WgServerTools, cpu_percent
+
+logger = logging.getLogger("apscheduler")
+logging.getLogger("apscheduler.executors.default").setLevel(logging.WARNING)
+
+CPU_TIMES: dict[int | None, tuple[int, ...]] = {}
+"""dict[int | None, tuple[int, ...]]: Счетчики `/proc/stat` серверов на момент предыдущего опроса."""
+
+
+async def probe_node(node: WgNode):
+    """Опрашивает сервер и обновляет загрузку CPU узла кластера.
+
+    Загрузка CPU считается по разнице счетчиков с предыдущим опросом,
+    поэтому после первого опроса сервера она еще не известна.
+
+    Returns:
+        dict: Состояние сервера ("status", "cpu", "peers").
+    """
+    probe = await WgServerTools(node.id).get_server_probe()
+
+    previous = CPU_TIMES.get(node.id)
+    CPU_TIMES[node.id] = probe["cpu_times"]
+    cpu = cpu_percent(previous, probe["cpu_times"]) if previous else None
+    if cpu is not None:
+        node.cpu = cpu
+
+    return dict(status=probe["status"], cpu=cpu, peers=probe["peers"])
+
+
+@op_class(OpClass.reconciliation)
+async def poll_server_status():
+    """Опрашивает все серверы кластера параллельно и сохраняет их состояние в кэше.
+
+    Обработчики читают только кэш (`get_server_snapshot`), поэтому время
+    ответа пользователю не зависит от SSH. Недоступный сервер сохраняется
+    в состоянии "inactive".
+    """
+    try:
+        snapshots = {}
+        for server_id, result in (await CLUSTER.fan_out(probe_node)).items():
+            if isinstance(result, Exception):
+                CPU_TIMES.pop(server_id, None)
+                snapshots[server_id] = dict(status="inactive")
+            else:
+                snapshots[server_id] = result
+
+        await set_server_snapshots(snapshots, ttl=settings.status_ttl)
+
+    except Exception as e:
+        if log_cash_error(e):
+            logger.exception("Ошибка опроса состояния серверов wireguard")
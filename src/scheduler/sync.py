@@ -0,0 +1,136 @@
+"""Синхронизация серверов WireGuard с желаемым состоянием из БД"""
+
+import logging
+from collections import defaultdict
+
+from core.err import log_cash_error
+from db.models import FreezeSteps, WgConfig, WgPeerPool
+from db.utils import get_all_wg_configs, get_pool_peers, set_freeze_states
+from wg.cluster import WgNode
+from wg.ops import OpClass, op_class
+from wg.pywg import desired_hash
+from wg.reconcile import PEER_BANNED
+from wg.utils import CLUSTER, WgServerTools
+
+logger = logging.getLogger("apscheduler")
+logging.getLogger("apscheduler.executors.default").setLevel(logging.WARNING)
+
+SYNCED: dict[int | None, str] = {}
+"""dict[int | None, str]: Хэши наборов пиров, последними примененных на серверах кластера."""
+
+
+def desired_peers(configs: list[WgConfig], pool: list[WgPeerPool]):
+    """Составляет желаемые наборы пиров серверов по БД.
+
+    Пир конфигурации заблокирован, если конфигурация заморожена или ожидает
+    заморозки (`PEER_BANNED`); пиры пула всегда заблокированы.
+
+    Returns:
+        dict[int | None, list[dict]]: Пиры вида {"pubkey", "allowed_ips", "ban"} по серверам.
+    """
+    servers: dict[int | None, list[dict]] = defaultdict(list)
+    for config in configs:
+        servers[config.server_id].append(
+            {
+                "pubkey": config.server_public_key,
+                "allowed_ips": str(config.address),
+                "ban": PEER_BANNED[config.freeze.value][0],
+            }
+        )
+    for peer in pool:
+        servers[peer.server_id].append(
+            {"pubkey": peer.server_public_key, "allowed_ips": str(peer.address), "ban": True}
+        )
+    return servers
+
+
+async def sync_node(node: WgNode, peers: list[dict]):
+    """Приводит сервер к желаемому набору пиров.
+
+    Если набор не менялся с прошлой синхронизации, на сервер передается только
+    его хэш: сервер отвечает "unchanged", если конфигурацию с тех пор никто
+    не менял, иначе набор передается целиком.
+
+    Returns:
+        dict: Результат `WgServerTools.sync_peers`.
+    """
+    tools = WgServerTools(node.id)
+    digest = desired_hash(peers)
+    if SYNCED.get(node.id) == digest:
+        result = await tools.sync_peers(digest=digest)
+        if result["status"] == "unchanged":
+            return result
+
+    SYNCED.pop(node.id, None)
+    result = await tools.sync_peers(peers)
+    if not result["failed"]:
+        SYNCED[node.id] = digest
+    return result
+
+
+@op_class(OpClass.reconciliation)
+async def sync_servers():
+    """Синхронизирует все доступные серверы кластера с БД.
+
+    Желаемые наборы пиров составляются по всем конфигурациям и пулу пиров
+    (`desired_peers`), серверы синхронизируются параллельно. Неизменившийся
+    набор проверяется только по хэшу, поэтому в устойчивом состоянии запуск
+    не меняет конфигурацию и не перезагружает интерфейс. После синхронизации
+    сервера ожидающие заморозки (разморозки) его конфигурации подтверждаются
+    в БД одним запросом.
+
+    Пир, созданный на сервере, но еще не записанный в БД (создание конфигурации,
+    пополнение пула, перенос), может быть удален синхронизацией, прочитавшей БД
+    раньше. После записи в БД набор меняется, и следующий запуск возвращает пира.
+
+    Returns:
+        dict[int | None, dict | Exception] | None: Результаты по серверам
+        (None, если синхронизация не выполнена).
+    """
+    try:
+        configs = await get_all_wg_configs()
+        servers = desired_peers(configs, await get_pool_peers())
+
+        async def sync_alive(node: WgNode):
+            if not node.alive:
+                return None
+            return await sync_node(node, servers.get(node.id, []))
+
+        results = await CLUSTER.fan_out(sync_alive)
+
+        synced = set()
+        for server_id, result in results.items():
+            if isinstance(result, Exception):
+                if log_cash_error(result):
+                    logger.error(
+                        f"Ошибка синхронизации сервера wireguard {server_id}",
+                        exc_info=result,
+                    )
+            elif result is not None:
+                synced.add(server_id)
+                if result["status"] == "synced":
+                    logger.info(
+                        f"Сервер wireguard {server_id} синхронизирован",
+                        extra={"changes": result["changes"], "failed": len(result["failed"])},
+                    )
+
+        failed = {
+            item["pubkey"]
+            for result in results.values()
+            if isinstance(result, dict)
+            for item in result.get("failed", [])
+        }
+        confirmed = defaultdict(list)
+        for config in configs:
+            if config.server_id in synced and config.server_public_key not in failed:
+                if config.freeze == FreezeSteps.wait_yes:
+                    confirmed[FreezeSteps.yes].append(config)
+                elif config.freeze == FreezeSteps.wait_no:
+                    confirmed[FreezeSteps.no].append(config)
+        await set_freeze_states(confirmed)
+
+    except Exception as e:
+        if log_cash_error(e):
+            logger.exception("Ошибка синхронизации серверов wireguard")
+    else:
+        return results
@@ -0,0 +1,106 @@
+"""Сбор статистики трафика пиров"""
+
+import logging
+from datetime import date, datetime, timezone
+
+from core.config import settings
+from core.err import log_cash_error
+from db.utils import delete_old_peer_stats, get_config_ids, insert_peer_stats
+from wg.ops import OpClass, op_class
+from wg.utils import CLUSTER, WgServerTools
+
+logger = logging.getLogger("apscheduler")
+logging.getLogger("apscheduler.executors.default").setLevel(logging.WARNING)
+
+COUNTERS: dict[str, tuple[int, int]] = {}
+"""dict[str, tuple[int, int]]: Счетчики rx/tx пиров на момент предыдущего замера."""
+
+PRUNED: date = None
+"""date: Дата последнего удаления устаревших замеров."""
+
+
+def traffic_delta(public_key: str, rx: int, tx: int):
+    """Трафик пира с предыдущего замера.
+
+    Счетчики интерфейса сбрасываются при перезапуске wireguard и при
+    удалении пира с интерфейса (блокировке) - тогда трафиком считается
+    текущее значение счетчика. Для первого замера пира после запуска
+    бота трафик не известен и принимается равным нулю.
+
+    Returns:
+        tuple[int, int]: Получено и отправлено сервером (байт).
+    """
+    previous = COUNTERS.get(public_key)
+    COUNTERS[public_key] = rx, tx
+    if previous is None:
+        return 0, 0
+
+    prev_rx, prev_tx = previous
+    return (
+        rx - prev_rx if rx >= prev_rx else rx,
+        tx - prev_tx if tx >= prev_tx else tx,
+    )
+
+
+@op_class(OpClass.reconciliation)
+async def collect_peer_stats():
+    """Снимает статистику пиров с сервера и записывает ее в БД.
+
+    По одному запросу к каждому серверу кластера (`wg show wg1 dump`, параллельно)
+    и одна пакетная вставка замеров с обновлением суточной статистики. Пиры без
+    конфигурации в БД (например, из пула) и недоступные серверы пропускаются.
+    Счетчики `COUNTERS` хранятся только для пиров конфигураций из БД.
+    """
+
+    async def node_stats(node):
+        return await WgServerTools(node.id).get_peer_stats()
+
+    try:
+        stats = []
+        for server_id, result in (await CLUSTER.fan_out(node_stats)).items():
+            if isinstance(result, Exception):
+                if log_cash_error(result):
+                    logger.error(
+                        f"Не удалось получить статистику сервера wireguard {server_id}",
+                        exc_info=result,
+                    )
+            else:
+                stats.extend(result)
+        config_ids = await get_config_ids()
+
+        ts = datetime.now(timezone.utc)
+        rows = []
+        for peer in stats:
+            config_id = config_ids.get(peer["publickey"])
+            if config_id is None:
+                continue
+            rx, tx = traffic_delta(peer["publickey"], peer["rx"], peer["tx"])
+
+            rows.append(
+                dict(
+                    config_id=config_id,
+                    ts=ts,
+                    handshake=datetime.fromtimestamp(peer["handshake"], timezone.utc)
+                    if peer["handshake"]
+                    else None,
+                    rx=rx,
+                    tx=tx,
+                )
+            )
+
+        await insert_peer_stats(rows)
+
+        # Счетчики удаленных конфигураций больше не понадобятся
+        for public_key in COUNTERS.keys() - config_ids.keys():
+            del COUNTERS[public_key]
+
+        global PRUNED
+        if PRUNED != ts.date():
+            await delete_old_peer_stats(settings.stats_retention)
+            PRUNED = ts.date()
+
+    except Exception as e:
+        if log_cash_error(e):
+            logger.exception("Ошибка сбора статистики пиров")
+    else:
+        logger.debug(f"Записана статистика {len(rows)} пиров")
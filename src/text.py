@@ -13,8 +13,10 @@ import pyqrcode
 from pytils.numeral import get_plural
 
 from core.config import settings
+from core.exceptions import WireguardError
 from core.path import PATH
 from db.models import UserActivity, UserData, WgConfig
+from wg.utils import CLUSTER
 
 me = {"я", "мои данные", "данные", "конфиги", "мои конфиги", "config", "подключения"}
 """Триггерные сообщения для вызова списка конфигураций"""
@@ -62,6 +64,12 @@ SERVER_STARTED = (
 )
 """Сообщение об окончании технических работ на сервере"""
 
+CONFIG_MOVED = (
+    "Уважаемый пользователь, для равномерной нагрузки ваша конфигурация перенесена на другой сервер. "
+    "Ключи и адрес не изменились, но в приложении WireGuard необходимо заменить конфигурацию на новую:"
+)
+"""Сообщение о переносе конфигурации на другой сервер"""
+
 rates = {0.3: "Пробный", 1: "Базовый", 2.5: "Расширенный", 5: "Люкс"}
 """Карта тарифов"""
 
@@ -355,6 +363,21 @@ def get_sub_status(user_data: UserData) -> tuple:
         return "", ""
 
 
+def get_server_key(server_id: int | None) -> str:
+    """Получить публичный ключ сервера конфигурации из реестра кластера.
+
+    Args:
+        server_id (int | None): Идентификатор сервера конфигурации.
+
+    Returns:
+        str: Публичный ключ сервера (из настроек, если сервер не найден в реестре).
+    """
+    try:
+        return CLUSTER.get(server_id).public_key
+    except WireguardError:
+        return settings.WG_SERVER_KEY
+
+
 def get_config_data(user_config: WgConfig) -> str:
     """Получить конфигурационные данные для WireGuard.
 
@@ -369,7 +392,7 @@ PrivateKey = {user_config.user_private_key}
 Address = {user_config.address}
 DNS = {user_config.dns}
 [Peer]
-PublicKey = {settings.WG_SERVER_KEY}
+PublicKey = {get_server_key(user_config.server_id)}
 AllowedIPs = {user_config.allowed_ips}
 Endpoint = {user_config.endpoint_ip}:{user_config.endpoint_port}
 PersistentKeepalive = 25
@@ -0,0 +1,244 @@
+"""Клиент агента pywg на сервере WireGuard"""
+
+import asyncio
+import itertools
+import json
+import logging
+
+import asyncssh
+
+from core.config import settings
+from core.exceptions import WireguardError
+from wg.connect import WgConnection, WgConnectionPool
+
+logger = logging.getLogger("asyncssh")
+
+AGENT_CMD = f"~/Scripts/pywg.py --agent --coalesce {settings.wg_agent_coalesce}"
+"""Команда запуска агента через SSH"""
+
+
+class WgAgentClient:
+    """Клиент долгоживущего агента `pywg.py --agent`.
+
+    Агент запускается один раз (через `sudo` в SSH-канале либо заранее через
+    systemd с unix-сокетом - `settings.wg_agent_socket`) и обслуживает запросы
+    в формате JSON lines по одному постоянному каналу. Запросы мультиплексируются
+    по идентификатору, поэтому их можно отправлять конкурентно.
+
+    Args:
+        pool (WgConnectionPool): Пул SSH-соединений с сервером.
+    """
+
+    def __init__(self, pool: WgConnectionPool) -> None:
+        self.pool = pool
+        self.process: asyncssh.SSHClientProcess = None
+        self.reader: asyncssh.SSHReader = None
+        self.writer: asyncssh.SSHWriter = None
+
+        self.__ids = itertools.count(1)
+        self.__futures: dict[int, asyncio.Future] = {}
+        self.__tasks: list[asyncio.Task] = []
+        self.__starting = None
+        self.__channel: WgConnection = None
+
+    @property
+    def running(self):
+        """bool: Запущен ли агент и читаются ли его ответы."""
+        return bool(self.__tasks) and not self.__tasks[0].done()
+
+    async def open(self):
+        """Открывает канал агента.
+
+        Канал занимает место в пуле (`WgConnectionPool.reserve`) до остановки
+        агента, чтобы не превышать лимит каналов соединения.
+
+        Returns:
+            tuple: Потоки чтения ответов, записи запросов и журнала агента
+            (None, если журнал не передается).
+
+        Raises:
+            OSError, asyncssh.Error: Если канал не удалось открыть.
+            WireguardError: Если в пуле нет свободного канала.
+        """
+        self.__channel = await self.pool.reserve()
+        conn = self.__channel.connection
+        try:
+            if settings.wg_agent_socket:
+                reader, writer = await conn.open_unix_connection(
+                    settings.wg_agent_socket, encoding="utf-8"
+                )
+                return reader, writer, None
+
+            self.process = await conn.create_process(
+                f"sudo -k -S -p '' {AGENT_CMD}", encoding="utf-8"
+            )
+        except BaseException:
+            await self.release()
+            raise
+        self.process.stdin.write(settings.WG_PASS.get_secret_value() + "\n")
+        return self.process.stdout, self.process.stdin, self.process.stderr
+
+    async def release(self):
+        """Возвращает в пул канал остановленного агента."""
+        channel, self.__channel = self.__channel, None
+        if channel is not None:
+            await self.pool.release(channel)
+
+    async def start(self):
+        """Запускает агент (или подключается к сокету агента).
+
+        Raises:
+            WireguardError: Если не удалось запустить агент.
+        """
+        try:
+            self.reader, self.writer, stderr = await self.open()
+
+        except (OSError, asyncssh.Error, AttributeError) as e:
+            logger.exception("Сбой запуска агента wireguard")
+            raise WireguardError from e
+
+        self.__tasks = [asyncio.create_task(self.__read_responses())]
+        if stderr is not None:
+            self.__tasks.append(asyncio.create_task(self.__read_stderr(stderr)))
+
+        logger.info("Агент wireguard запущен")
+
+    async def close(self):
+        """Останавливает агент."""
+        if self.writer is not None:
+            self.writer.close()
+        for task in self.__tasks:
+            task.cancel()
+        self.__fail_pending()
+        await self.release()
+
+    def __fail_pending(self):
+        for future in self.__futures.values():
+            if not future.done():
+                future.set_exception(WireguardError("Агент wireguard недоступен"))
+        self.__futures.clear()
+
+    async def __read_responses(self):
+        """Читает ответы агента и передает их ожидающим запросам."""
+        try:
+            while line := await self.reader.readline():
+                try:
+                    response: dict = json.loads(line)
+                except ValueError:
+                    logger.warning(f"Некорректный ответ агента wireguard: {line!r}")
+                    continue
+
+                future = self.__futures.get(response.get("id"))
+                if future is not None and not future.done():
+                    future.set_result(response)
+
+        except (OSError, asyncssh.Error):
+            logger.exception("Сбой чтения ответа агента wireguard")
+        finally:
+            logger.warning("Агент wireguard остановлен")
+            self.__fail_pending()
+            await self.release()
+
+    async def __read_stderr(self, stderr):
+        """Перенаправляет журнал агента в лог (не давая переполниться каналу)."""
+        try:
+            while line := await stderr.readline():
+                logger.debug(f"pywg agent: {line.strip()}")
+        except (OSError, asyncssh.Error):
+            pass
+
+    async def request(self, op: str, timeout: float = None, **params):
+        """Отправляет запрос агенту и ждет ответ.
+
+        Args:
+            op (str): Операция ("add", "ban", "unban", "del", "batch", "list", "status", "stats", "ping").
+            timeout (float, optional): Время ожидания ответа (по умолчанию - из настроек).
+            **params: Параметры операции.
+
+        Returns:
+            Any: Результат операции.
+
+        Raises:
+            WireguardError: Если агент недоступен, не ответил вовремя или вернул ошибку.
+        """
+        if not self.running:
+            if self.__starting is None or self.__starting.done():
+                self.__starting = asyncio.create_task(self.start())
+            await asyncio.shield(self.__starting)
+
+        request_id = next(self.__ids)
+        future = asyncio.get_running_loop().create_future()
+        self.__futures[request_id] = future
+
+        try:
+            self.writer.write(json.dumps({"id": request_id, "op": op, **params}) + "\n")
+            response: dict = await asyncio.wait_for(
+                future, timeout or settings.wg_agent_timeout
+            )
+        except (OSError, asyncssh.Error) as e:
+            logger.exception("Сбой отправки запроса агенту wireguard")
+            raise WireguardError from e
+        except asyncio.TimeoutError as e:
+            logger.error(f"Агент wireguard не ответил на запрос {op}")
+            raise WireguardError from e
+        finally:
+            self.__futures.pop(request_id, None)
+
+        if not response.get("ok"):
+            logger.error(f"Ошибка агента wireguard: {response.get('error')}")
+            raise WireguardError
+
+        return response.get("result")
+
+
+class TextStream:
+    """Текстовая обертка потоков asyncio (как потоки asyncssh с `encoding`)."""
+
+    def __init__(self, stream) -> None:
+        self.stream = stream
+
+    async def readline(self):
+        return (await self.stream.readline()).decode()
+
+    def write(self, data: str):
+        self.stream.write(data.encode())
+
+    def close(self):
+        self.stream.close()
+
+
+class LocalAgentClient(WgAgentClient):
+    """Клиент агента pywg на том же хосте, что и бот (без SSH).
+
+    Агент запускается подпроцессом asyncio либо используется его unix-сокет
+    (`settings.wg_agent_socket`).
+
+    Args:
+        command (list[str]): Команда запуска `pywg.py` (с `sudo -n`, если нужно).
+    """
+
+    def __init__(self, command: list[str]) -> None:
+        super().__init__(None)
+        self.command = command
+
+    async def open(self):
+        if settings.wg_agent_socket:
+            reader, writer = await asyncio.open_unix_connection(
+                settings.wg_agent_socket
+            )
+            return TextStream(reader), TextStream(writer), None
+
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            "--agent",
+            "--coalesce",
+            str(settings.wg_agent_coalesce),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        return (
+            TextStream(self.process.stdout),
+            TextStream(self.process.stdin),
+            TextStream(self.process.stderr),
+        )
@@ -0,0 +1,643 @@
+"""Драйверы доступа к серверу WireGuard: SSH, локальный и в памяти"""
+
+import asyncio
+import json
+import logging
+import os
+import shlex
+from abc import ABC, abstractmethod
+from asyncio.subprocess import DEVNULL, PIPE
+from ipaddress import IPv4Interface
+from itertools import count
+from re import escape
+from time import time
+
+import asyncssh
+
+from core.config import settings
+from core.exceptions import WireguardError
+from wg.agent import LocalAgentClient, WgAgentClient
+from wg.connect import WgConnectionPool
+from wg.pywg import desired_hash
+
+logger = logging.getLogger("asyncssh")
+
+
+class WgBackend(ABC):
+    """Интерфейс драйвера сервера WireGuard.
+
+    Драйвер выполняет операции над пирами и снимает состояние сервера;
+    `WgServerTools` работает с сервером только через драйвер узла.
+    Ошибки доступа к серверу драйвер записывает в лог и превращает в `WireguardError`.
+    """
+
+    name = "base"
+
+    @property
+    @abstractmethod
+    def alive(self):
+        """bool: Доступен ли сервер."""
+
+    @property
+    def metrics(self):
+        """dict: Метрики драйвера."""
+        return {"backend": self.name, "alive": int(self.alive)}
+
+    async def connect(self):
+        """Подключается к серверу.
+
+        Raises:
+            WireguardError: Если сервер недоступен.
+        """
+
+    async def close(self):
+        """Закрывает подключение к серверу."""
+
+    @abstractmethod
+    async def add(self, public_key: str, allowed_ips: str):
+        """Добавляет пира.
+
+        Raises:
+            WireguardError: Если пира не удалось добавить.
+        """
+
+    @abstractmethod
+    async def ban(self, public_key: str, ban: bool = True):
+        """Блокирует (ban=False - разблокирует) пира.
+
+        Raises:
+            WireguardError: Если состояние пира не удалось изменить.
+        """
+
+    @abstractmethod
+    async def batch(self, operations: list[dict]):
+        """Выполняет пакет операций под одной блокировкой конфигурации.
+
+        Args:
+            operations (list[dict]): Операции вида {"mode", "pubkey", "allowed_ips"}.
+
+        Returns:
+            list[dict]: Результаты операций (см. `WgServerTools.move_users`).
+
+        Raises:
+            WireguardError: Если пакет не удалось выполнить.
+        """
+
+    @abstractmethod
+    async def sync(self, peers: list[dict] = None, digest: str = None, force=False):
+        """Приводит конфигурацию сервера к желаемому набору пиров (`pywg.DesiredStateSync`).
+
+        Args:
+            peers (list[dict], optional): Пиры вида {"pubkey", "allowed_ips", "ban"};
+                None - только проверить, применен ли набор с хэшем `digest`.
+            digest (str, optional): Хэш набора (`pywg.desired_hash`).
+            force (bool, optional): Синхронизировать, даже если набор не изменился.
+
+        Returns:
+            dict: {"status": "unchanged" | "stale" | "synced", "hash": ...}.
+
+        Raises:
+            WireguardError: Если синхронизацию не удалось выполнить.
+        """
+
+    @abstractmethod
+    async def peers(self):
+        """Получает список пиров конфигурации.
+
+        Returns:
+            list[dict]: Пиры вида {"publickey": ..., "allowedips": ..., "ban": bool}.
+
+        Raises:
+            WireguardError: Если список не удалось получить.
+        """
+
+    @abstractmethod
+    async def changes(self, revision: int = None, epoch: str = None):
+        """Получает изменения пиров после ревизии журнала (см. `WgServerTools.get_peer_changes`).
+
+        Raises:
+            WireguardError: Если изменения не удалось получить.
+        """
+
+    @abstractmethod
+    async def dump(self):
+        """Получает вывод `wg show wg1 dump`.
+
+        Raises:
+            WireguardError: Если статистику не удалось получить.
+        """
+
+    @abstractmethod
+    async def probe(self):
+        """Снимает состояние сервера (см. `WgServerTools.get_server_probe`).
+
+        Raises:
+            WireguardError: Если состояние не удалось получить.
+        """
+
+
+class PywgBackend(WgBackend):
+    """Общая часть драйверов, работающих через `pywg.py` на сервере.
+
+    Если включен агент (`settings.wg_agent`), операции передаются ему,
+    иначе на каждую операцию запускается `pywg.py`. Наследники реализуют
+    запуск команд (`pywg`, `pywg_input`, `dump`, `probe`) и создают клиента агента (`agent`).
+    """
+
+    agent: WgAgentClient
+
+    @abstractmethod
+    async def pywg(self, *args: str, error: str):
+        """Запускает `pywg.py` с аргументами и возвращает stdout.
+
+        Args:
+            *args (str): Аргументы командной строки.
+            error (str): Сообщение для лога при сбое.
+
+        Raises:
+            WireguardError: Если команда завершилась с ошибкой.
+        """
+
+    @abstractmethod
+    async def pywg_input(self, *args: str, input: str, error: str):
+        """Запускает `pywg.py` с аргументами и файлом данных и возвращает stdout.
+
+        Args:
+            *args (str): Аргументы командной строки; последний - ключ, значением
+                которого станет файл с данными `input` (например, "--batch").
+            input (str): Данные файла.
+            error (str): Сообщение для лога при сбое.
+
+        Raises:
+            WireguardError: Если команда завершилась с ошибкой.
+        """
+
+    async def add(self, public_key, allowed_ips):
+        if settings.wg_agent:
+            result = await self.agent.request(
+                "add", pubkey=public_key, allowed_ips=allowed_ips
+            )
+            if result["status"] != "done":
+                logger.error(f"Сбой при добавлении пира: {result['error']}")
+                raise WireguardError
+            return
+
+        await self.pywg(
+            public_key,
+            f"-ips={allowed_ips}",
+            "--raises",
+            error="Сбой при добавлении пира в конфигурацию сервера wireguard",
+        )
+
+    async def ban(self, public_key, ban=True):
+        mode = "ban" if ban else "unban"
+        if settings.wg_agent:
+            result = await self.agent.request(mode, pubkey=public_key)
+            if result["status"] == "fail":
+                logger.error(f"Сбой при изменении пира: {result['error']}")
+                raise WireguardError
+            return
+
+        await self.pywg(
+            "-m",
+            mode,
+            public_key,
+            "--raises",
+            error="Сбой при изменении пира в конфигурации сервера wireguard",
+        )
+
+    async def batch(self, operations):
+        if settings.wg_agent:
+            return await self.agent.request("batch", operations=operations)
+
+        error = "Сбой при пакетном изменении пиров wireguard"
+        stdout = await self.pywg_input(
+            "--raises",
+            "--batch",
+            input="\n".join(json.dumps(operation) for operation in operations),
+            error=error,
+        )
+        return self.parse(stdout, error)
+
+    async def sync(self, peers=None, digest=None, force=False):
+        if settings.wg_agent:
+            return await self.agent.request("sync", peers=peers, hash=digest, force=force)
+
+        error = "Сбой при синхронизации пиров wireguard"
+        if peers is None:
+            stdout = await self.pywg("--sync-hash", digest, "--raises", error=error)
+        else:
+            stdout = await self.pywg_input(
+                "--raises",
+                *(["--force"] if force else []),
+                "--sync",
+                input="\n".join(json.dumps(peer) for peer in peers),
+                error=error,
+            )
+        return self.parse(stdout, error)
+
+    async def peers(self):
+        if settings.wg_agent:
+            return await self.agent.request("list")
+
+        error = "Сбой при получении списка пиров wireguard"
+        return self.parse(await self.pywg("-l", "--json", "--raises", error=error), error)
+
+    async def changes(self, revision=None, epoch=None):
+        if settings.wg_agent:
+            return await self.agent.request("changes", since=revision, epoch=epoch)
+
+        error = "Сбой при получении изменений пиров wireguard"
+        stdout = await self.pywg(
+            "--changes-since",
+            str(-1 if revision is None else revision),
+            "--epoch",
+            epoch or "",
+            "--raises",
+            error=error,
+        )
+        return self.parse(stdout, error)
+
+    @staticmethod
+    def parse(stdout: str, error: str):
+        """Разбирает JSON-вывод `pywg.py`.
+
+        Raises:
+            WireguardError: Если вывод не является JSON.
+        """
+        try:
+            return json.loads(stdout)
+        except ValueError as e:
+            logger.exception(error)
+            raise WireguardError from e
+
+
+class SshBackend(PywgBackend):
+    """Драйвер сервера WireGuard через пул SSH-соединений.
+
+    Args:
+        pool (WgConnectionPool): Пул SSH-соединений с сервером.
+    """
+
+    name = "ssh"
+
+    def __init__(self, pool: WgConnectionPool) -> None:
+        self.pool = pool
+        self.agent = WgAgentClient(pool)
+
+    @property
+    def alive(self):
+        return bool(self.pool.metrics["alive"])
+
+    @property
+    def metrics(self):
+        return {"backend": self.name, **self.pool.metrics}
+
+    async def connect(self):
+        await self.pool.connect()
+
+    async def close(self):
+        await self.agent.close()
+        await self.pool.close()
+
+    @staticmethod
+    def sudo(cmd: str):
+        """Команда с вводом пароля sudo."""
+        return f"echo {escape(settings.WG_PASS.get_secret_value())} | sudo -S {cmd}"
+
+    async def run(self, cmd: str, error: str, input: str = None, check=True):
+        """Выполняет команду в SSH-канале пула и возвращает результат.
+
+        Raises:
+            WireguardError: Если команда завершилась с ошибкой.
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                completed_proc = await conn.run(f"\n{cmd}", input=input, check=check)
+        except (OSError, asyncssh.Error) as e:
+            logger.exception(error)
+            raise WireguardError from e
+
+        if completed_proc.stderr:
+            logger.info(completed_proc.stderr)
+        return completed_proc.stdout
+
+    async def pywg(self, *args, error):
+        args = " ".join(shlex.quote(arg) for arg in args)
+        return await self.run(self.sudo(f"~/Scripts/pywg.py {args}"), error)
+
+    async def pywg_input(self, *args, input, error):
+        # stdin sudo занят паролем, данные передаются через временный файл
+        args = " ".join(shlex.quote(arg) for arg in args)
+        cmd = (
+            "tmp_input=$(mktemp)",
+            "trap 'rm -f $tmp_input' EXIT",
+            "cat > $tmp_input",
+            self.sudo(f"~/Scripts/pywg.py {args} $tmp_input"),
+        )
+        return await self.run("\n".join(cmd), error, input=input)
+
+    async def dump(self):
+        if settings.wg_agent:
+            return await self.agent.request("dump")
+        return await self.run(
+            self.sudo("wg show wg1 dump"),
+            "Сбой при получении статистики пиров wireguard",
+        )
+
+    async def probe(self):
+        cmd = (
+            "head -1 /proc/stat",
+            "systemctl is-active wg-quick@wg1.service",
+            self.sudo("wg show wg1 peers | wc -l"),
+        )
+        error = "Сбой при получении состояния сервера wireguard"
+        stdout = await self.run("\n".join(cmd), error, check=False)
+        try:
+            cpu, status, peers = stdout.strip("\n ").splitlines()[-3:]
+            return dict(
+                cpu_times=tuple(int(value) for value in cpu.split()[1:]),
+                status=status.strip(),
+                peers=int(peers),
+            )
+        except ValueError as e:
+            logger.exception(error)
+            raise WireguardError from e
+
+
+class LocalBackend(PywgBackend):
+    """Драйвер сервера WireGuard на том же хосте, что и бот (без SSH).
+
+    Команды запускаются подпроцессами asyncio через `sudo -n` (нужно правило
+    sudoers без пароля; от root - напрямую), агент - подпроцессом или через
+    его unix-сокет (`settings.wg_agent_socket`).
+
+    Args:
+        pywg (str, optional): Путь к `pywg.py` (по умолчанию `settings.wg_local_pywg`).
+    """
+
+    name = "local"
+
+    def __init__(self, pywg: str = None) -> None:
+        self.script = os.path.expanduser(pywg or settings.wg_local_pywg)
+        self.sudo = [] if os.geteuid() == 0 else ["sudo", "-n"]
+        self.agent = LocalAgentClient(self.sudo + [self.script])
+        self.connected = False
+
+    @property
+    def alive(self):
+        return self.connected
+
+    async def connect(self):
+        if not os.path.isfile(self.script):
+            logger.error(f"Скрипт pywg не найден: {self.script}")
+            raise WireguardError
+        self.connected = True
+
+    async def close(self):
+        await self.agent.close()
+        self.connected = False
+
+    async def exec(self, *cmd: str, error: str, input: str = None, check=True):
+        """Запускает подпроцесс и возвращает его stdout.
+
+        Raises:
+            WireguardError: Если процесс не запустился или завершился с ошибкой.
+        """
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdin=DEVNULL if input is None else PIPE, stdout=PIPE, stderr=PIPE
+            )
+            stdout, stderr = await process.communicate(
+                None if input is None else input.encode()
+            )
+        except OSError as e:
+            logger.exception(error)
+            raise WireguardError from e
+
+        if stderr:
+            logger.info(stderr.decode(errors="replace"))
+        if check and process.returncode:
+            logger.error(f"{error}: код завершения {process.returncode}")
+            raise WireguardError
+        return stdout.decode()
+
+    async def pywg(self, *args, error):
+        return await self.exec(*self.sudo, self.script, *args, error=error)
+
+    async def pywg_input(self, *args, input, error):
+        return await self.exec(*self.sudo, self.script, *args, "-", error=error, input=input)
+
+    async def dump(self):
+        if settings.wg_agent:
+            return await self.agent.request("dump")
+        return await self.exec(
+            *self.sudo,
+            "wg",
+            "show",
+            "wg1",
+            "dump",
+            error="Сбой при получении статистики пиров wireguard",
+        )
+
+    async def probe(self):
+        error = "Сбой при получении состояния сервера wireguard"
+        status, peers = await asyncio.gather(
+            self.exec(
+                "systemctl", "is-active", "wg-quick@wg1.service", error=error, check=False
+            ),
+            self.exec(*self.sudo, "wg", "show", "wg1", "peers", error=error, check=False),
+        )
+        try:
+            with open("/proc/stat") as file:
+                cpu = file.readline()
+        except OSError as e:
+            logger.exception(error)
+            raise WireguardError from e
+
+        return dict(
+            cpu_times=tuple(int(value) for value in cpu.split()[1:]),
+            status=status.strip() or "unknown",
+            peers=len(peers.split()),
+        )
+
+
+class FakeBackend(WgBackend):
+    """Сервер WireGuard в памяти - для тестов и бенчмарков без сервера.
+
+    Повторяет семантику `pywg.py`: результаты пакетов "done" / "skip" / "fail",
+    уникальность ключей и адресов, журнал изменений (всегда полный список).
+
+    Args:
+        peers (list[dict], optional): Начальные пиры вида {"publickey", "allowedips", "ban"}.
+        latency (float, optional): Задержка каждой операции (сек).
+    """
+
+    name = "fake"
+
+    def __init__(self, peers: list[dict] = None, latency: float = 0) -> None:
+        self.latency = latency
+        self.connected = False
+        self.peers_by_key: dict[str, dict] = {
+            peer["publickey"]: dict(peer) for peer in peers or []
+        }
+        self.revision = count(1)
+        self.synced: str | None = None
+        """str | None: Хэш примененного набора пиров (сбрасывается любым изменением)."""
+        self.calls: dict[str, int] = {}
+        """dict[str, int]: Количество вызовов операций драйвера."""
+        self.__started = time()
+
+    @property
+    def alive(self):
+        return self.connected
+
+    async def connect(self):
+        self.connected = True
+
+    async def close(self):
+        self.connected = False
+
+    async def __call(self, op):
+        if not self.connected:
+            raise WireguardError("Сервер wireguard недоступен")
+        self.calls[op] = self.calls.get(op, 0) + 1
+        await asyncio.sleep(self.latency)
+
+    def apply(self, operation: dict):
+        """Применяет одну операцию пакета.
+
+        Returns:
+            dict: Результат операции.
+        """
+        mode, public_key = operation["mode"], operation.get("pubkey")
+        result = {"mode": mode, "pubkey": public_key, "status": "done", "error": None}
+        peer = self.peers_by_key.get(public_key)
+
+        if not public_key:
+            result.update(status="fail", error="Argument PUBKEY: empty value")
+        elif mode == "new":
+            address = str(IPv4Interface(operation["allowed_ips"]))
+            if peer is not None:
+                result.update(status="fail", error=f"Peer {public_key} already exists")
+            elif any(item["allowedips"] == address for item in self.peers_by_key.values()):
+                result.update(status="fail", error=f"Address {address} already used")
+            else:
+                self.peers_by_key[public_key] = dict(
+                    publickey=public_key, allowedips=address, ban=False
+                )
+        elif peer is None:
+            result.update(status="fail", error=f"Peer {public_key} not found")
+        elif mode == "del":
+            del self.peers_by_key[public_key]
+        elif peer["ban"] == (mode == "ban"):
+            result["status"] = "skip"
+        else:
+            peer["ban"] = mode == "ban"
+        if result["status"] == "done":
+            self.synced = None
+        return result
+
+    async def add(self, public_key, allowed_ips):
+        await self.__call("add")
+        result = self.apply({"mode": "new", "pubkey": public_key, "allowed_ips": allowed_ips})
+        if result["status"] != "done":
+            logger.error(f"Сбой при добавлении пира: {result['error']}")
+            raise WireguardError
+
+    async def ban(self, public_key, ban=True):
+        await self.__call("ban")
+        result = self.apply({"mode": "ban" if ban else "unban", "pubkey": public_key})
+        if result["status"] == "fail":
+            logger.error(f"Сбой при изменении пира: {result['error']}")
+            raise WireguardError
+
+    async def batch(self, operations):
+        await self.__call("batch")
+        return [self.apply(operation) for operation in operations]
+
+    async def sync(self, peers=None, digest=None, force=False):
+        await self.__call("sync")
+        if peers is not None:
+            digest = desired_hash(peers)
+        if not force and digest == self.synced:
+            return {"status": "unchanged", "hash": digest}
+        if peers is None:
+            return {"status": "stale", "hash": self.synced}
+
+        desired = {
+            peer["pubkey"]: (str(IPv4Interface(peer["allowed_ips"])), bool(peer.get("ban")))
+            for peer in peers
+        }
+        changes = {}
+        for public_key, peer in list(self.peers_by_key.items()):
+            wanted = desired.get(public_key)
+            if wanted is None or wanted[0] != peer["allowedips"]:
+                del self.peers_by_key[public_key]
+                changes["del"] = changes.get("del", 0) + 1
+        for public_key, (address, banned) in desired.items():
+            peer = self.peers_by_key.get(public_key)
+            if peer is None:
+                self.peers_by_key[public_key] = dict(
+                    publickey=public_key, allowedips=address, ban=banned
+                )
+                changes["new"] = changes.get("new", 0) + 1
+                if banned:
+                    changes["ban"] = changes.get("ban", 0) + 1
+            elif peer["ban"] != banned:
+                peer["ban"] = banned
+                mode = "ban" if banned else "unban"
+                changes[mode] = changes.get(mode, 0) + 1
+
+        self.synced = digest
+        return {"status": "synced", "hash": digest, "changes": changes, "failed": []}
+
+    async def peers(self):
+        await self.__call("peers")
+        return [dict(peer) for peer in self.peers_by_key.values()]
+
+    async def changes(self, revision=None, epoch=None):
+        await self.__call("changes")
+        return {
+            "epoch": "fake",
+            "revision": next(self.revision),
+            "full": True,
+            "peers": [dict(peer) for peer in self.peers_by_key.values()],
+            "removed": [],
+        }
+
+    async def dump(self):
+        await self.__call("dump")
+        lines = ["private\tpublic\t51820\toff"]
+        lines.extend(
+            f"{key}\t(none)\t(none)\t{peer['allowedips']}\t0\t0\t0\t25"
+            for key, peer in self.peers_by_key.items()
+            if not peer["ban"]
+        )
+        return "\n".join(lines) + "\n"
+
+    async def probe(self):
+        await self.__call("probe")
+        ticks = int((time() - self.__started) * 100)
+        return dict(
+            cpu_times=(ticks, 0, 0, ticks, 0, 0, 0, 0),
+            status="active",
+            peers=sum(not peer["ban"] for peer in self.peers_by_key.values()),
+        )
+
+
+def make_backend(host: str, pool: WgConnectionPool = None) -> WgBackend:
+    """Создает драйвер узла по настройке `settings.wg_backend`.
+
+    Локальный драйвер используется только для сервера из настроек
+    (`settings.WG_HOST`), остальные серверы кластера доступны по SSH.
+
+    Args:
+        host (str): Хост сервера.
+        pool (WgConnectionPool, optional): Пул SSH-соединений (по умолчанию создается новый).
+    """
+    if settings.wg_backend == "fake":
+        return FakeBackend()
+    if settings.wg_backend == "local" and host == settings.WG_HOST:
+        return LocalBackend()
+    return SshBackend(pool or WgConnectionPool(host=host))
@@ -0,0 +1,248 @@
+"""Кластер серверов WireGuard: реестр узлов и размещение конфигураций"""
+
+import asyncio
+import logging
+
+from core.config import settings
+from core.exceptions import WireguardError
+from wg.backend import WgBackend, make_backend
+from wg.connect import WgConnectionPool
+from wg.ops import OpScheduler
+
+logger = logging.getLogger("asyncssh")
+
+
+class WgNode:
+    """Узел кластера - сервер WireGuard с собственным драйвером доступа.
+
+    Args:
+        server_id (int | None): Идентификатор сервера в реестре (None - сервер из настроек).
+        name (str): Название сервера.
+        host (str): Хост сервера (для SSH-подключения).
+        endpoint_ip (str): IP-адрес конечной точки WireGuard для клиентов.
+        endpoint_port (int): Порт конечной точки WireGuard.
+        public_key (str): Публичный ключ интерфейса сервера.
+        capacity (int): Максимальное количество конфигураций.
+        active (bool, optional): Размещаются ли на узле новые конфигурации.
+        pool (WgConnectionPool, optional): Пул SSH-соединений для SSH-драйвера
+            (по умолчанию создается новый).
+        backend (WgBackend, optional): Драйвер сервера (по умолчанию - `make_backend`).
+    """
+
+    def __init__(
+        self,
+        server_id,
+        name,
+        host,
+        endpoint_ip,
+        endpoint_port,
+        public_key,
+        capacity,
+        active=True,
+        pool: WgConnectionPool = None,
+        backend: WgBackend = None,
+    ) -> None:
+        self.id: int | None = server_id
+        self.name: str = name
+        self.host: str = host
+        self.endpoint_ip: str = str(endpoint_ip)
+        self.endpoint_port: int = endpoint_port
+        self.public_key: str = public_key
+        self.capacity: int = capacity
+        self.active: bool = active
+
+        self.backend = backend or make_backend(host, pool)
+        self.ops = OpScheduler(
+            settings.wg_ops_concurrency, settings.wg_ops_limits, settings.wg_ops_timeout
+        )
+        """OpScheduler: Очередь операций с сервером (`WgServerTools`)."""
+
+        self.peers: int = 0
+        """int: Количество конфигураций на узле (обновляется `WgCluster.set_load`)."""
+        self.cpu: float = 0
+        """float: Загрузка CPU узла, % (обновляется `WgCluster.set_load`)."""
+
+    def __repr__(self):
+        return f"<WgNode {self.name} ({self.host}) {self.peers}/{self.capacity} cpu={self.cpu}%>"
+
+    @property
+    def alive(self):
+        """bool: Доступен ли сервер узла."""
+        return self.backend.alive
+
+    @property
+    def load(self):
+        """tuple[float, float]: Заполненность узла и загрузка CPU (для сравнения узлов)."""
+        return self.peers / self.capacity if self.capacity else 1, self.cpu
+
+    def update(self, server):
+        """Обновляет параметры узла из записи реестра (`WgServer`)."""
+        self.name = server.name
+        self.endpoint_ip = str(server.endpoint_ip)
+        self.endpoint_port = server.endpoint_port
+        self.public_key = server.public_key
+        self.capacity = server.capacity
+        self.active = server.active
+
+
+class WgCluster:
+    """Реестр узлов кластера WireGuard.
+
+    До загрузки реестра из БД кластер состоит из одного узла - сервера
+    из настроек (`settings.WG_HOST`), который остается узлом по умолчанию
+    для конфигураций без `server_id`.
+
+    Args:
+        default (WgNode): Узел сервера из настроек.
+    """
+
+    def __init__(self, default: WgNode) -> None:
+        self.default = default
+        self.nodes: dict[int, WgNode] = {}
+
+    def __iter__(self):
+        return iter(self.nodes.values() if self.nodes else [self.default])
+
+    def __len__(self):
+        return len(self.nodes) or 1
+
+    def get(self, server_id: int | None = None):
+        """Возвращает узел по идентификатору сервера.
+
+        Args:
+            server_id (int | None, optional): Идентификатор сервера (None - узел по умолчанию).
+
+        Raises:
+            WireguardError: Если сервер отсутствует в реестре.
+        """
+        if server_id is None:
+            return self.default
+        try:
+            return self.nodes[server_id]
+        except KeyError:
+            raise WireguardError(f"Сервер wireguard {server_id} не найден в реестре")
+
+    def load(self, servers: list):
+        """Загружает (обновляет) реестр узлов.
+
+        Узел с хостом из настроек переиспользует пул соединений узла по умолчанию
+        и становится узлом по умолчанию.
+
+        Args:
+            servers (list[WgServer]): Записи реестра серверов.
+        """
+        for server in servers:
+            node = self.nodes.get(server.id)
+            if node is not None:
+                node.update(server)
+                continue
+
+            if server.host == self.default.host and self.default.id is None:
+                node = self.default
+                node.id = server.id
+                node.update(server)
+            else:
+                node = WgNode(
+                    server.id,
+                    server.name,
+                    server.host,
+                    server.endpoint_ip,
+                    server.endpoint_port,
+                    server.public_key,
+                    server.capacity,
+                    server.active,
+                )
+            self.nodes[server.id] = node
+
+        logger.info(f"Реестр серверов wireguard: {list(self)}")
+
+    async def connect(self):
+        """Подключается ко всем узлам параллельно.
+
+        Raises:
+            WireguardError: Если не удалось подключиться ни к одному узлу.
+        """
+        results = await asyncio.gather(
+            *(node.backend.connect() for node in self if not node.alive),
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Сбой подключения к узлу wireguard: {result!r}")
+
+        if not any(node.alive for node in self):
+            raise WireguardError
+
+    def set_load(self, peers: dict = None, cpu: dict = None):
+        """Обновляет метрики нагрузки узлов.
+
+        Args:
+            peers (dict[int | None, int], optional): Количество конфигураций по серверам.
+            cpu (dict[int | None, float], optional): Загрузка CPU по серверам.
+        """
+        for node in self:
+            if peers is not None:
+                node.peers = peers.get(node.id, 0)
+            if cpu is not None and node.id in cpu:
+                node.cpu = cpu[node.id]
+
+    def place(self):
+        """Выбирает узел для новой конфигурации.
+
+        Выбирается активный доступный узел со свободной емкостью,
+        наименее заполненный, при равной заполненности - с меньшей загрузкой CPU.
+        Счетчик конфигураций выбранного узла сразу увеличивается, чтобы
+        параллельные размещения распределялись по узлам.
+
+        Returns:
+            WgNode: Выбранный узел.
+
+        Raises:
+            WireguardError: Если нет узла со свободной емкостью.
+        """
+        candidates = [
+            node
+            for node in self
+            if node.active
+            and node.peers < node.capacity
+            and node.alive
+        ]
+        if not candidates:
+            raise WireguardError("Нет доступных серверов wireguard со свободными местами")
+
+        node = min(candidates, key=lambda node: node.load)
+        node.peers += 1
+        return node
+
+    async def fan_out(self, func, *args, **kwargs):
+        """Выполняет корутину для всех узлов параллельно.
+
+        Args:
+            func: Корутинная функция, первым аргументом принимающая узел.
+
+        Returns:
+            dict[int | None, Any]: Результаты (или исключения) по идентификаторам серверов.
+        """
+        nodes = list(self)
+        results = await asyncio.gather(
+            *(func(node, *args, **kwargs) for node in nodes), return_exceptions=True
+        )
+        return {node.id: result for node, result in zip(nodes, results)}
+
+
+def default_node(pool: WgConnectionPool):
+    """Узел сервера из настроек (до загрузки реестра).
+
+    Args:
+        pool (WgConnectionPool): Пул SSH-соединений (используется SSH-драйвером).
+    """
+    return WgNode(
+        None,
+        "default",
+        settings.WG_HOST,
+        settings.WG_HOST,
+        settings.WG_PORT,
+        settings.WG_SERVER_KEY,
+        settings.wg_server_capacity,
+        pool=pool,
+    )
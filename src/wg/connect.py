@@ -1,11 +1,14 @@
 import asyncio
 import logging
 import logging.config
+from contextlib import asynccontextmanager, suppress
+from time import time
 
 import asyncssh
 from asyncssh import SSHClientConnection
 
 from core.config import settings
+from core.exceptions import WireguardError
 
 logger = logging.getLogger("asyncssh")
 
@@ -19,6 +22,23 @@ class WgConnection:
 
     connection: SSHClientConnection
 
+    def __init__(self, host: str = settings.WG_HOST) -> None:
+        """Инициализирует соединение (без подключения к серверу).
+
+        Args:
+            host (str, optional): Хост сервера WireGuard.
+        """
+        self.host = host
+        self.connection = None
+        self.in_use: int = 0
+        """int: Количество открытых через соединение каналов."""
+        self.reconnecting = asyncio.Lock()
+
+    @property
+    def alive(self):
+        """bool: Установлено ли соединение и не закрыто ли оно."""
+        return self.connection is not None and not self.connection.is_closed()
+
     async def connect(self):
         """Устанавливает соединение с сервером.
 
@@ -28,7 +48,7 @@ class WgConnection:
         Raises:
             asyncssh.Error: Если возникла ошибка при установлении соединения.
         """
-        await asyncio.wait([asyncio.create_task(self.__create_connection())])
+        await self.__create_connection()
 
         self.connection.set_keepalive(interval=120)
 
@@ -42,7 +62,248 @@ class WgConnection:
             asyncssh.Error: Если возникла ошибка при создании соединения.
         """
         self.connection = await asyncssh.connect(
-            settings.WG_HOST,
+            self.host,
             username=settings.WG_USER,
             client_keys=settings.WG_KEY.get_secret_value(),
         )
+
+
+class WgConnectionPool:
+    """Пул SSH-соединений с сервером WireGuard.
+
+    Каждое соединение обслуживает ограниченное число одновременных каналов.
+    Запрос получает наименее загруженное живое соединение; если свободных
+    каналов нет, он ждет не дольше `timeout`. Упавшие соединения
+    переподключаются в фоне, не блокируя запросы к остальным соединениям.
+
+    Args:
+        host (str, optional): Хост сервера WireGuard.
+        size (int, optional): Количество соединений.
+        channels (int, optional): Максимум одновременных каналов на соединение.
+        timeout (float, optional): Максимальное время ожидания свободного канала (сек).
+        check_interval (float, optional): Период фоновой проверки соединений (сек).
+    """
+
+    def __init__(
+        self,
+        host: str = settings.WG_HOST,
+        size: int = settings.ssh_pool_size,
+        channels: int = settings.ssh_pool_channels,
+        timeout: float = settings.ssh_pool_timeout,
+        check_interval: float = settings.ssh_pool_check,
+        connection_factory=WgConnection,
+    ) -> None:
+        self.host = host
+        self.connections = [connection_factory(host) for _ in range(size)]
+        self.channels = channels
+        self.timeout = timeout
+        self.check_interval = check_interval
+
+        self.__available = None
+        self.__health_task: asyncio.Task = None
+
+        self.waiting: int = 0
+        """int: Количество запросов, ожидающих свободный канал."""
+        self.acquired: int = 0
+        """int: Количество выданных каналов."""
+        self.wait_time: float = 0
+        """float: Суммарное время ожидания каналов (сек)."""
+        self.max_wait_time: float = 0
+        """float: Максимальное время ожидания канала (сек)."""
+        self.timeouts: int = 0
+        """int: Количество запросов, не дождавшихся канала."""
+        self.reconnects: int = 0
+        """int: Количество переподключений."""
+
+    @property
+    def available(self):
+        """asyncio.Condition: Условие освобождения канала (создается в работающем цикле)."""
+        if self.__available is None:
+            self.__available = asyncio.Condition()
+        return self.__available
+
+    @property
+    def connection(self):
+        """SSHClientConnection: Первое живое соединение (для обратной совместимости)."""
+        for conn in self.connections:
+            if conn.alive:
+                return conn.connection
+        return self.connections[0].connection
+
+    @property
+    def metrics(self):
+        """dict: Метрики пула."""
+        return {
+            "size": len(self.connections),
+            "alive": sum(conn.alive for conn in self.connections),
+            "in_use": sum(conn.in_use for conn in self.connections),
+            "waiting": self.waiting,
+            "acquired": self.acquired,
+            "avg_wait_ms": int(self.wait_time / self.acquired * 1000)
+            if self.acquired
+            else 0,
+            "max_wait_ms": int(self.max_wait_time * 1000),
+            "timeouts": self.timeouts,
+            "reconnects": self.reconnects,
+        }
+
+    async def connect(self):
+        """Устанавливает все соединения пула и запускает фоновую проверку.
+
+        Raises:
+            WireguardError: Если не удалось установить ни одного соединения.
+        """
+        results = await asyncio.gather(
+            *(conn.connect() for conn in self.connections), return_exceptions=True
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Сбой подключения к серверу wireguard: {result!r}")
+
+        if not any(conn.alive for conn in self.connections):
+            raise WireguardError
+
+        if self.__health_task is None or self.__health_task.done():
+            self.__health_task = asyncio.create_task(self.__health_check())
+
+    async def close(self):
+        """Останавливает фоновую проверку и закрывает соединения."""
+        if self.__health_task is not None:
+            self.__health_task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self.__health_task
+
+        for conn in self.connections:
+            if conn.alive:
+                conn.connection.close()
+
+    async def reconnect(self, conn: WgConnection):
+        """Переподключает соединение (одновременно - не более одного раза).
+
+        Returns:
+            bool: Живо ли соединение после попытки.
+        """
+        async with conn.reconnecting:
+            if conn.alive:
+                return True
+            try:
+                await conn.connect()
+            except (OSError, asyncssh.Error) as e:
+                logger.warning(f"Сбой переподключения к серверу wireguard: {e!r}")
+                return False
+            if not conn.alive:
+                logger.warning("Соединение с сервером wireguard закрыто сразу после подключения")
+                return False
+
+            self.reconnects += 1
+            logger.info("Соединение с сервером wireguard восстановлено")
+
+        async with self.available:
+            self.available.notify_all()
+        return True
+
+    async def __health_check(self):
+        """Фоновая проверка соединений с переподключением упавших."""
+        while True:
+            await asyncio.sleep(self.check_interval)
+
+            dead = [
+                conn
+                for conn in self.connections
+                if not conn.alive and not conn.reconnecting.locked()
+            ]
+            if dead:
+                results = await asyncio.gather(
+                    *(self.reconnect(conn) for conn in dead), return_exceptions=True
+                )
+                for result in results:
+                    if isinstance(result, Exception):
+                        logger.error(
+                            f"Сбой переподключения к серверу wireguard: {result!r}"
+                        )
+
+            logger.debug(f"SSH pool metrics: {self.metrics}")
+
+    def __pick(self):
+        """Возвращает наименее загруженное живое соединение со свободным каналом."""
+        candidates = [
+            conn
+            for conn in self.connections
+            if conn.alive and conn.in_use < self.channels
+        ]
+        if candidates:
+            return min(candidates, key=lambda conn: conn.in_use)
+
+    async def reserve(self, timeout: float = None):
+        """Занимает канал пула до вызова `release`.
+
+        Используется напрямую для долгоживущих каналов (агент wireguard),
+        которые должны учитываться в лимите каналов соединения.
+
+        Args:
+            timeout (float, optional): Время ожидания (по умолчанию - настройка пула).
+
+        Returns:
+            WgConnection: Соединение с занятым каналом.
+
+        Raises:
+            WireguardError: Если свободный канал не появился за отведенное время.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time()
+
+        async with self.available:
+            conn = self.__pick()
+            if conn is None:
+                for dead in self.connections:
+                    if not dead.alive and not dead.reconnecting.locked():
+                        asyncio.create_task(self.reconnect(dead))
+
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(
+                        self.available.wait_for(self.__pick), timeout=timeout
+                    )
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    logger.error(
+                        "Превышено время ожидания SSH-соединения",
+                        extra={"metrics": self.metrics},
+                    )
+                    raise WireguardError
+                finally:
+                    self.waiting -= 1
+                conn = self.__pick()
+
+            conn.in_use += 1
+
+        waited = time() - start
+        self.acquired += 1
+        self.wait_time += waited
+        self.max_wait_time = max(self.max_wait_time, waited)
+        return conn
+
+    async def release(self, conn: WgConnection):
+        """Освобождает канал, занятый `reserve`."""
+        conn.in_use -= 1
+        async with self.available:
+            self.available.notify()
+
+    @asynccontextmanager
+    async def acquire(self, timeout: float = None):
+        """Выдает канал пула.
+
+        Args:
+            timeout (float, optional): Время ожидания (по умолчанию - настройка пула).
+
+        Yields:
+            SSHClientConnection: Соединение для выполнения команды.
+
+        Raises:
+            WireguardError: Если свободный канал не появился за отведенное время.
+        """
+        conn = await self.reserve(timeout)
+        try:
+            yield conn.connection
+        finally:
+            await self.release(conn)
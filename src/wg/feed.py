@@ -0,0 +1,54 @@
+"""Локальная копия списка пиров сервера, обновляемая по журналу изменений"""
+
+import logging
+
+from wg.utils import WgServerTools
+
+logger = logging.getLogger("asyncssh")
+
+
+class PeerFeed:
+    """Копия списка пиров сервера WireGuard.
+
+    При первом обновлении (и при смене эпохи журнала на сервере) передается
+    полный список пиров, далее - только пиры, измененные после последней
+    полученной ревизии.
+
+    Args:
+        server_id (int | None, optional): Сервер кластера (None - сервер по умолчанию).
+    """
+
+    def __init__(self, server_id: int | None = None) -> None:
+        self.server_id = server_id
+        self.epoch: str = None
+        self.revision: int = None
+        self.peers: dict[str, dict] = {}
+        """dict[str, dict]: Пиры по публичному ключу."""
+
+    async def sync(self):
+        """Обновляет копию списка пиров.
+
+        Returns:
+            tuple[bool, set[str]]: Был ли получен полный список и ключи
+            измененных (в т.ч. удаленных) пиров.
+
+        Raises:
+            WireguardError: Если возникла ошибка при получении изменений.
+        """
+        feed = await WgServerTools(self.server_id).get_peer_changes(
+            self.revision, self.epoch
+        )
+
+        if feed["full"]:
+            self.peers = {peer["publickey"]: peer for peer in feed["peers"]}
+            changed = set(self.peers)
+        else:
+            changed = set(feed["removed"])
+            for public_key in feed["removed"]:
+                self.peers.pop(public_key, None)
+            for peer in feed["peers"]:
+                self.peers[peer["publickey"]] = peer
+                changed.add(peer["publickey"])
+
+        self.epoch, self.revision = feed["epoch"], feed["revision"]
+        return feed["full"], changed
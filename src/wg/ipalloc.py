@@ -0,0 +1,203 @@
+"""Распределение адресов пиров в подсети WireGuard"""
+
+from ipaddress import IPv4Address, IPv4Interface, IPv4Network
+from typing import Iterable
+
+from core.exceptions import AddressPoolError
+
+class IPAllocator:
+    """Распределитель адресов подсети на битовой карте.
+
+    Каждому адресу подсети соответствует один бит (для /16 - 8 КБ). Освобожденные
+    адреса складываются в стек и выдаются повторно в первую очередь, новые адреса
+    выдаются курсором, который движется только вперед, поэтому выделение и
+    освобождение выполняются за O(1). Полный просмотр карты происходит только
+    когда курсор дошел до конца подсети, а стек освобожденных адресов пуст.
+
+    Адрес сети, широковещательный адрес и зарезервированные диапазоны
+    никогда не выдаются и не освобождаются. Карта не сохраняется на диск:
+    при запуске она строится заново по адресам из БД и с серверов (`update`).
+
+    Args:
+        network (str | IPv4Network): Подсеть адресов.
+        reserved (Iterable[str], optional): Зарезервированные адреса, подсети
+            ("10.1.255.0/24") или диапазоны ("10.1.0.1-10.1.0.9").
+    """
+
+    def __init__(self, network: str | IPv4Network, reserved: Iterable[str] = ()):
+        self.network = IPv4Network(network)
+        self.size = self.network.num_addresses
+        self.base = int(self.network.network_address)
+        self.bitmap = bytearray((self.size + 7) // 8)
+
+        self.released: list[int] = []
+        """list[int]: Стек освобожденных индексов."""
+        self.cursor = 0
+        """int: Индекс, с которого продолжается выдача новых адресов."""
+        self.used = 0
+        """int: Количество занятых адресов (включая зарезервированные)."""
+
+        self.reserved: list[tuple[int, int]] = [(0, 0), (self.size - 1, self.size - 1)]
+        for item in reserved:
+            self.reserved.append(self.__range(item))
+        for start, end in self.reserved:
+            for index in range(start, end + 1):
+                self.__set(index)
+
+    def __range(self, item: str):
+        """Переводит адрес, подсеть или диапазон в пару индексов."""
+        item = str(item)
+        if "-" in item:
+            start, end = item.split("-")
+            return self.index(start), self.index(end)
+        if "/" in item:
+            network = IPv4Network(item, strict=False)
+            return self.index(network[0]), self.index(network[-1])
+        index = self.index(item)
+        return index, index
+
+    def index(self, address: str | IPv4Address | IPv4Interface):
+        """Индекс адреса в подсети.
+
+        Raises:
+            ValueError: Если адрес не принадлежит подсети.
+        """
+        if isinstance(address, IPv4Interface):
+            address = address.ip
+        address = IPv4Address(str(address).split("/")[0])
+        if address not in self.network:
+            raise ValueError(f"{address} is not in {self.network}")
+        return int(address) - self.base
+
+    def address(self, index: int):
+        """Адрес пира (/32) по индексу."""
+        return IPv4Interface((self.base + index, 32))
+
+    def __test(self, index: int):
+        return self.bitmap[index >> 3] & (1 << (index & 7))
+
+    def __set(self, index: int):
+        if not self.__test(index):
+            self.bitmap[index >> 3] |= 1 << (index & 7)
+            self.used += 1
+
+    def __clear(self, index: int):
+        if self.__test(index):
+            self.bitmap[index >> 3] &= ~(1 << (index & 7))
+            self.used -= 1
+
+    def __reserved(self, index: int):
+        return any(start <= index <= end for start, end in self.reserved)
+
+    def __contains__(self, address):
+        return bool(self.__test(self.index(address)))
+
+    def __len__(self):
+        return self.used
+
+    @property
+    def free(self):
+        """int: Количество свободных адресов."""
+        return self.size - self.used
+
+    def __scan(self):
+        """Ищет свободный индекс полным просмотром карты."""
+        for byte_index, byte in enumerate(self.bitmap):
+            if byte != 0xFF:
+                for bit in range(8):
+                    index = (byte_index << 3) + bit
+                    if index < self.size and not self.__test(index):
+                        return index
+        return None
+
+    def allocate(self):
+        """Выделяет свободный адрес.
+
+        Returns:
+            IPv4Interface: Адрес пира (/32).
+
+        Raises:
+            AddressPoolError: Если свободных адресов не осталось.
+        """
+        while self.released:
+            index = self.released.pop()
+            if not self.__test(index):
+                break
+        else:
+            while self.cursor < self.size and self.__test(self.cursor):
+                self.cursor += 1
+
+            if self.cursor < self.size:
+                index = self.cursor
+                self.cursor += 1
+            else:
+                index = self.__scan()
+                if index is None:
+                    raise AddressPoolError
+
+        self.__set(index)
+        return self.address(index)
+
+    def reserve(self, address):
+        """Помечает адрес занятым (например, адрес существующей конфигурации).
+
+        Returns:
+            bool: Был ли адрес свободен.
+        """
+        index = self.index(address)
+        if self.__test(index):
+            return False
+        self.__set(index)
+        return True
+
+    def release(self, address):
+        """Освобождает адрес для повторной выдачи.
+
+        Returns:
+            bool: Был ли адрес занят (зарезервированные адреса не освобождаются).
+        """
+        index = self.index(address)
+        if not self.__test(index) or self.__reserved(index):
+            return False
+        self.__clear(index)
+        self.released.append(index)
+        return True
+
+    def update(self, addresses: Iterable):
+        """Заново заполняет карту занятыми адресами (например, из БД).
+
+        Адреса вне подсети пропускаются.
+
+        Returns:
+            list: Адреса, не принадлежащие подсети.
+        """
+        self.bitmap = bytearray(len(self.bitmap))
+        self.used = 0
+        for start, end in self.reserved:
+            for index in range(start, end + 1):
+                self.__set(index)
+
+        foreign = []
+        for address in addresses:
+            try:
+                self.__set(self.index(address))
+            except ValueError:
+                foreign.append(address)
+
+        self.__rebuild()
+        return foreign
+
+    def __rebuild(self):
+        """Восстанавливает курсор и стек освобожденных адресов по карте.
+
+        Курсор ставится за последним выданным (не зарезервированным) адресом,
+        а все свободные адреса до него попадают в стек (младшие выдаются первыми).
+        """
+        last = self.size - 1
+        while last >= 0 and (not self.__test(last) or self.__reserved(last)):
+            last -= 1
+        self.cursor = last + 1
+
+        self.released = [
+            index for index in range(self.cursor - 1, -1, -1) if not self.__test(index)
+        ]
@@ -0,0 +1,102 @@
+"""Генерация ключей WireGuard в процессе бота"""
+
+import asyncio
+import logging
+from base64 import b64decode, b64encode
+
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+from cryptography.hazmat.primitives.serialization import (Encoding,
+                                                          NoEncryption,
+                                                          PrivateFormat,
+                                                          PublicFormat)
+
+from core.config import settings
+
+logger = logging.getLogger("asyncssh")
+
+
+def clamp(private: bytes):
+    """Приводит приватный ключ Curve25519 к каноническому виду (как `wg genkey`)."""
+    private = bytearray(private)
+    private[0] &= 248
+    private[31] = (private[31] & 127) | 64
+    return bytes(private)
+
+
+def public_key(private_key: str):
+    """Вычисляет публичный ключ по приватному (аналог `wg pubkey`).
+
+    Args:
+        private_key (str): Приватный ключ в base64.
+
+    Returns:
+        str: Публичный ключ в base64.
+    """
+    private = X25519PrivateKey.from_private_bytes(b64decode(private_key))
+    return b64encode(
+        private.public_key().public_bytes(Encoding.Raw, PublicFormat.Raw)
+    ).decode()
+
+
+def generate_keypair():
+    """Генерирует пару ключей WireGuard (аналог `wg genkey | wg pubkey`).
+
+    Returns:
+        tuple[str, str]: Приватный и публичный ключи в base64.
+    """
+    raw = X25519PrivateKey.generate().private_bytes(
+        Encoding.Raw, PrivateFormat.Raw, NoEncryption()
+    )
+    private_key = b64encode(clamp(raw)).decode()
+    return private_key, public_key(private_key)
+
+
+class KeyPool:
+    """Пул заранее сгенерированных пар ключей.
+
+    Фоновая задача поддерживает очередь заполненной, поэтому создание
+    конфигурации не ждет генерации ключей. Если пул пуст, пара генерируется
+    на месте.
+
+    Args:
+        size (int, optional): Размер пула.
+    """
+
+    def __init__(self, size: int = settings.wg_key_pool) -> None:
+        self.size = size
+        self.__queue: asyncio.Queue = None
+        self.__task: asyncio.Task = None
+
+    @property
+    def ready(self):
+        """int: Количество готовых пар ключей."""
+        return self.__queue.qsize() if self.__queue is not None else 0
+
+    def start(self):
+        """Запускает фоновое заполнение пула (в работающем цикле событий)."""
+        if self.__queue is None:
+            self.__queue = asyncio.Queue(maxsize=self.size)
+        if self.__task is None or self.__task.done():
+            self.__task = asyncio.create_task(self.__fill())
+
+    async def close(self):
+        """Останавливает фоновое заполнение пула."""
+        if self.__task is not None:
+            self.__task.cancel()
+
+    async def __fill(self):
+        while True:
+            await self.__queue.put(generate_keypair())
+
+    async def get(self):
+        """Выдает пару ключей из пула.
+
+        Returns:
+            tuple[str, str]: Приватный и публичный ключи в base64.
+        """
+        self.start()
+        try:
+            return self.__queue.get_nowait()
+        except asyncio.QueueEmpty:
+            logger.debug("Пул ключей wireguard пуст")
+            return generate_keypair()
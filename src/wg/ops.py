@@ -0,0 +1,183 @@
+"""Очередь операций сервера WireGuard с классами приоритета"""
+
+import asyncio
+import enum
+import functools
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from time import time
+
+from core.exceptions import WireguardError
+
+logger = logging.getLogger("asyncssh")
+
+
+class OpClass(enum.IntEnum):
+    """Класс приоритета операций WireGuard (меньшее значение - выше приоритет)"""
+
+    interactive = 0
+    """Запросы пользователей (создание, разморозка конфигураций)"""
+    billing = 1
+    """Заморозка и разморозка по состоянию баланса"""
+    reconciliation = 2
+    """Фоновые задачи: сверка, синхронизация, статистика, опрос состояния"""
+
+
+OP_CLASS: ContextVar[OpClass] = ContextVar("wg_op_class", default=OpClass.interactive)
+"""ContextVar[OpClass]: Класс операций текущей задачи (наследуется дочерними задачами asyncio)."""
+
+
+def op_class(cls: OpClass):
+    """Декоратор корутины: операции WireGuard внутри нее выполняются с классом `cls`.
+
+    Args:
+        cls (OpClass): Класс приоритета операций.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            token = OP_CLASS.set(cls)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                OP_CLASS.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+class OpScheduler:
+    """Очередь операций одного сервера WireGuard.
+
+    Одновременно выполняется не более `concurrency` операций, операций одного
+    класса - не более его лимита (`limits`). Освободившийся слот получает
+    ожидающая операция самого приоритетного класса, для которого не достигнут
+    лимит, поэтому интерактивные операции всегда выполняются первыми, а лимиты
+    фоновых классов оставляют им свободные слоты. Внутри класса операции
+    выполняются в порядке поступления.
+
+    Args:
+        concurrency (int): Максимум одновременных операций.
+        limits (dict[str, int], optional): Максимум одновременных операций по
+            классам (`OpClass.name`); по умолчанию - `concurrency`.
+        timeout (float, optional): Максимальное время ожидания слота (сек).
+    """
+
+    def __init__(
+        self, concurrency: int, limits: dict[str, int] = None, timeout: float = 30
+    ) -> None:
+        self.concurrency = concurrency
+        self.limits = {
+            cls: min(concurrency, (limits or {}).get(cls.name, concurrency))
+            for cls in OpClass
+        }
+        self.timeout = timeout
+
+        self.queues: dict[OpClass, deque[asyncio.Future]] = {
+            cls: deque() for cls in OpClass
+        }
+        """dict[OpClass, deque[asyncio.Future]]: Ожидающие слота операции по классам."""
+        self.running: dict[OpClass, int] = dict.fromkeys(OpClass, 0)
+        """dict[OpClass, int]: Количество выполняющихся операций."""
+        self.dispatched: dict[OpClass, int] = dict.fromkeys(OpClass, 0)
+        """dict[OpClass, int]: Количество выданных слотов."""
+        self.max_queued: dict[OpClass, int] = dict.fromkeys(OpClass, 0)
+        """dict[OpClass, int]: Максимальная длина очереди."""
+        self.wait_time: dict[OpClass, float] = dict.fromkeys(OpClass, 0)
+        """dict[OpClass, float]: Суммарное время ожидания слотов (сек)."""
+        self.max_wait_time: dict[OpClass, float] = dict.fromkeys(OpClass, 0)
+        """dict[OpClass, float]: Максимальное время ожидания слота (сек)."""
+        self.timeouts: dict[OpClass, int] = dict.fromkeys(OpClass, 0)
+        """dict[OpClass, int]: Количество операций, не дождавшихся слота."""
+
+    @property
+    def metrics(self):
+        """dict[str, dict]: Метрики очереди по классам."""
+        return {
+            cls.name: {
+                "queued": len(self.queues[cls]),
+                "running": self.running[cls],
+                "limit": self.limits[cls],
+                "dispatched": self.dispatched[cls],
+                "max_queued": self.max_queued[cls],
+                "avg_wait_ms": int(self.wait_time[cls] / self.dispatched[cls] * 1000)
+                if self.dispatched[cls]
+                else 0,
+                "max_wait_ms": int(self.max_wait_time[cls] * 1000),
+                "timeouts": self.timeouts[cls],
+            }
+            for cls in OpClass
+        }
+
+    def __free(self, cls: OpClass):
+        """Есть ли свободный слот для операции класса `cls`."""
+        return (
+            sum(self.running.values()) < self.concurrency
+            and self.running[cls] < self.limits[cls]
+        )
+
+    def __dispatch(self):
+        """Выдает освободившиеся слоты ожидающим операциям в порядке приоритета."""
+        for cls in OpClass:
+            queue = self.queues[cls]
+            while queue and self.__free(cls):
+                waiter = queue.popleft()
+                if not waiter.done():
+                    self.running[cls] += 1
+                    waiter.set_result(None)
+
+    def __release(self, cls: OpClass):
+        self.running[cls] -= 1
+        self.__dispatch()
+
+    @asynccontextmanager
+    async def acquire(self, cls: OpClass = None):
+        """Выдает слот для операции.
+
+        Args:
+            cls (OpClass, optional): Класс операции (по умолчанию - `OP_CLASS` текущей задачи).
+
+        Raises:
+            WireguardError: Если слот не освободился за `timeout`.
+        """
+        cls = OP_CLASS.get() if cls is None else cls
+        start = time()
+
+        waiter = asyncio.get_running_loop().create_future()
+        queue = self.queues[cls]
+        queue.append(waiter)
+        self.__dispatch()
+        self.max_queued[cls] = max(self.max_queued[cls], len(queue))
+
+        if not waiter.done():
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+            except BaseException as e:
+                if waiter.done() and not waiter.cancelled():
+                    # Слот выдан одновременно с отменой - он передается следующей операции
+                    self.__release(cls)
+                else:
+                    waiter.cancel()
+                    queue.remove(waiter)
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeouts[cls] += 1
+                    logger.error(
+                        f"Превышено время ожидания операции wireguard ({cls.name})",
+                        extra={"metrics": self.metrics[cls.name]},
+                    )
+                    raise WireguardError from e
+                raise
+
+        waited = time() - start
+        self.dispatched[cls] += 1
+        self.wait_time[cls] += waited
+        self.max_wait_time[cls] = max(self.max_wait_time[cls], waited)
+
+        try:
+            yield
+        finally:
+            self.__release(cls)
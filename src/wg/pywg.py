@@ -2,15 +2,27 @@
 
 import argparse
 import functools
+import hashlib
+import io
+import json
 import logging
+import os
 import pathlib
 import platform
+import socketserver
+import sqlite3
+import sys
+import tempfile
+import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext, suppress
 from ipaddress import IPv4Interface
-from subprocess import Popen
+from subprocess import run
 from time import time
 
 if platform.system() == "Linux":
     import fcntl
+    import grp
 
 logger = logging.getLogger()
 
@@ -18,44 +30,930 @@ logger = logging.getLogger()
 WIREGUARD_CONF = "/etc/wireguard/wg1.conf"
 # WIREGUARD_CONF = "C:\\code\\vpn_dan_bot\\src\\wg\\wg1.conf"
 WIREGUARD_LOG = "/home/zadira/Scripts/ErrorsPyWG"
+WIREGUARD_INTERFACE = "wg1"
+WIREGUARD_BIN = "wg"
+SYNC_THRESHOLD = 32
+"""Число изменений, начиная с которого вместо `wg set` выполняется `wg syncconf`"""
 
+STRIP_INTERFACE = {"privatekey", "listenport", "fwmark"}
+"""Параметры [Interface], которые понимает `wg` (остальные - расширения wg-quick)"""
 
-class ConfigChanger:
-    def __init__(self, public_key, allowed_ips=None, raises=False) -> None:
-        self.public_key = public_key
-        self.allowed_ips = allowed_ips
-        self.raises = raises
+FEED_LIMIT = 4 * 1024 * 1024
+"""Размер журнала изменений (байт), после которого он сжимается"""
+
+COALESCE_MAX_BATCH = 1000
+"""Число операций, при котором пакет применяется, не дожидаясь конца окна"""
+
+
+class PeerNotFoundError(Exception):
+    """Пир с указанным ключом отсутствует в конфигурации."""
+
+    def __init__(self, text="PEER NOT FOUND") -> None:
+        super().__init__(text)
+
+
+class PeerStateError(Exception):
+    """Пир уже находится в запрошенном состоянии (добавлен, заблокирован ...)."""
+
+
+class Peer:
+    """Секция [Peer] конфигурации wireguard.
+
+    Args:
+        public_key (str): Публичный ключ пира.
+        allowed_ips (str): Адрес пира (AllowedIPs).
+        options (list[tuple[str | None, str]], optional): Остальные строки секции
+            в исходном порядке. Строки без "=" хранятся с ключом None.
+        banned (bool, optional): Закомментирована ли секция (пир заблокирован).
+    """
+
+    __slots__ = ("public_key", "allowed_ips", "options", "banned")
+
+    def __init__(self, public_key, allowed_ips, options=None, banned=False) -> None:
+        self.public_key: str = public_key
+        self.allowed_ips: str = allowed_ips
+        self.options: list[tuple[str | None, str]] = options or []
+        self.banned: bool = banned
+
+    @property
+    def keepalive(self):
+        """Значение PersistentKeepalive или None."""
+        for key, value in self.options:
+            if key is not None and key.lower() == "persistentkeepalive":
+                return value
+
+    def info(self):
+        """Описание пира для JSON-вывода.
+
+        Returns:
+            dict: {"publickey": ..., "allowedips": ..., "ban": bool}.
+        """
+        return {
+            "publickey": self.public_key,
+            "allowedips": self.allowed_ips,
+            "ban": self.banned,
+        }
+
+    def lines(self):
+        """Возвращает строки секции в формате wg-quick.
+
+        Returns:
+            list[str]: Строки секции (закомментированные, если пир заблокирован).
+        """
+        lines = [
+            "[Peer]",
+            f"PublicKey = {self.public_key}",
+            f"AllowedIPs = {self.allowed_ips}",
+        ]
+        lines.extend(
+            value if key is None else f"{key} = {value}" for key, value in self.options
+        )
+        if self.banned:
+            return [f"# {line}" for line in lines]
+        return lines
+
+
+class PeerTable:
+    """Конфигурация wireguard в виде таблицы пиров.
+
+    Файл разбирается один раз: секция [Interface] (и все строки до первого пира)
+    сохраняется как есть, пиры индексируются по публичному ключу и по AllowedIPs,
+    поэтому поиск, добавление, блокировка и удаление выполняются за O(1).
+    """
+
+    def __init__(self, head=None) -> None:
+        self.head: list[str] = head or []
+        self.peers: dict[str, Peer] = {}
+        self.addresses: dict[str, str] = {}
+
+    def __len__(self):
+        return len(self.peers)
+
+    def __contains__(self, public_key):
+        return public_key in self.peers
+
+    def __iter__(self):
+        return iter(self.peers.values())
+
+    @staticmethod
+    def _header(line: str):
+        """Возвращает имя секции, если строка является заголовком (в т.ч. закомментированным)."""
+        clean = line.lstrip("# ").strip()
+        if clean.startswith("[") and clean.endswith("]"):
+            return clean[1:-1].lower()
+
+    @classmethod
+    def parse(cls, text: str):
+        """Разбирает текст конфигурации.
+
+        Args:
+            text (str): Содержимое файла wg.conf.
+
+        Returns:
+            PeerTable: Таблица пиров.
+        """
+        table = cls()
+        block = None
+
+        for line in text.split("\n"):
+            section = cls._header(line)
+            if section == "peer":
+                if block is not None:
+                    table._add_block(*block)
+                block = (line.lstrip().startswith("#"), [])
+            elif block is None:
+                table.head.append(line)
+            elif section is not None:
+                # Любая другая секция после пиров сохраняется в заголовке
+                table._add_block(*block)
+                block = None
+                table.head.append(line)
+            elif line.strip():
+                block[1].append(line)
+
+        if block is not None:
+            table._add_block(*block)
+
+        while table.head and not table.head[-1].strip():
+            table.head.pop()
+
+        return table
+
+    def _add_block(self, banned, lines):
+        public_key = allowed_ips = None
+        options = []
+        for line in lines:
+            raw = line.lstrip("# ").strip() if banned else line.strip()
+            key, sep, value = raw.partition("=")
+            key, value = key.strip(), value.strip()
+
+            if not sep:
+                options.append((None, raw))
+            elif key.lower() == "publickey":
+                public_key = value
+            elif key.lower() == "allowedips":
+                allowed_ips = value
+            else:
+                options.append((key, value))
+
+        if public_key is None:
+            logger.warning("Peer section without PublicKey skipped")
+            return
+
+        self._insert(Peer(public_key, allowed_ips, options, banned))
+
+    def _insert(self, peer: Peer):
+        self.peers[peer.public_key] = peer
+        if peer.allowed_ips:
+            self.addresses[peer.allowed_ips] = peer.public_key
+
+    def get(self, public_key) -> Peer:
+        """Возвращает пира по публичному ключу.
+
+        Raises:
+            PeerNotFoundError: Если пир не найден.
+        """
+        try:
+            return self.peers[public_key]
+        except KeyError:
+            raise PeerNotFoundError
+
+    def find(self, allowed_ips) -> Peer | None:
+        """Возвращает пира по адресу (AllowedIPs) или None."""
+        public_key = self.addresses.get(str(allowed_ips))
+        if public_key is not None:
+            return self.peers[public_key]
 
-    def __find_key(self):
+    def add(self, public_key, allowed_ips, keepalive=25, banned=False):
+        """Добавляет нового пира.
+
+        Raises:
+            PeerStateError: Если пир с таким ключом или адресом уже существует.
+        """
+        allowed_ips = str(allowed_ips)
+        if public_key in self.peers:
+            logger.warning("Peer already added")
+            raise PeerStateError(f"Peer {public_key} already exists")
+        if allowed_ips in self.addresses:
+            logger.warning(f"Address {allowed_ips} already used")
+            raise PeerStateError(f"Address {allowed_ips} already used")
+
+        peer = Peer(
+            public_key, allowed_ips, [("PersistentKeepalive", str(keepalive))], banned
+        )
+        self._insert(peer)
+        return peer
+
+    def remove(self, public_key):
+        """Удаляет пира.
+
+        Raises:
+            PeerNotFoundError: Если пир не найден.
+        """
+        peer = self.get(public_key)
+        del self.peers[public_key]
+        if self.addresses.get(peer.allowed_ips) == public_key:
+            del self.addresses[peer.allowed_ips]
+        return peer
+
+    def ban(self, public_key):
+        """Блокирует пира.
+
+        Raises:
+            PeerNotFoundError: Если пир не найден.
+            PeerStateError: Если пир уже заблокирован.
+        """
+        peer = self.get(public_key)
+        if peer.banned:
+            logger.warning("Peer already banned")
+            raise PeerStateError("BAN USER ERROR")
+        peer.banned = True
+        return peer
+
+    def unban(self, public_key):
+        """Разблокирует пира.
+
+        Raises:
+            PeerNotFoundError: Если пир не найден.
+            PeerStateError: Если пир не заблокирован.
+        """
+        peer = self.get(public_key)
+        if not peer.banned:
+            logger.warning("Peer already unbanned")
+            raise PeerStateError("UNBAN USER ERROR")
+        peer.banned = False
+        return peer
+
+    def render(self):
+        """Собирает текст конфигурации.
+
+        Returns:
+            str: Содержимое файла wg.conf.
+        """
+        lines = list(self.head)
+        for peer in self.peers.values():
+            lines.append("")
+            lines.extend(peer.lines())
+        lines.append("")
+        return "\n".join(lines)
+
+    def strip(self):
+        """Собирает конфигурацию для `wg syncconf` (аналог `wg-quick strip`).
+
+        Из [Interface] остаются только параметры `wg`, заблокированные пиры
+        не попадают в конфигурацию.
+
+        Returns:
+            str: Конфигурация работающего интерфейса.
+        """
         lines = []
-        for i, line in enumerate(self.config):
-            if self.public_key in line:
-                lines.append(i)
+        for line in self.head:
+            if line.lstrip().startswith("#"):
+                continue
+            key = line.partition("=")[0].strip().lower()
+            if self._header(line) == "interface" or key in STRIP_INTERFACE:
+                lines.append(line.strip())
 
-        if not len(lines):
-            raise Exception("PEER NOT FOUND")
+        for peer in self.peers.values():
+            if not peer.banned:
+                lines.append("")
+                lines.extend(peer.lines())
+        lines.append("")
+        return "\n".join(lines)
 
-        validated_lines = []
-        for i in lines:
-            assert "peer" in self.config[i - 1].lower()
-            validated_lines.extend((i - 1, i))
+    @classmethod
+    def load(cls, path):
+        """Читает и разбирает файл конфигурации."""
+        with open(path) as file:
+            return cls.parse(file.read())
 
-            extra = 1
-            while extra:
-                try:
-                    if (
-                        "peer" in self.config[i + extra].lower()
-                        or not self.config[i + extra]
-                    ):
-                        break
-                except IndexError:
-                    break
+    def dump(self, path):
+        """Атомарно записывает конфигурацию (временный файл + rename).
+
+        Права исходного файла сохраняются.
+        """
+        path = pathlib.Path(path)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=path.parent, prefix=f".{path.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as file:
+                file.write(self.render())
+                file.flush()
+                os.fsync(file.fileno())
+            if path.exists():
+                os.chmod(tmp_path, path.stat().st_mode)
+            os.replace(tmp_path, path)
+        except BaseException:
+            with suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+
+class PeerRegistry:
+    """Реестр пиров в SQLite - источник истины на сервере.
+
+    Реестр хранится рядом с конфигурацией (`wg1.db` для `wg1.conf`) и создается
+    импортом существующей конфигурации (`--import`). Если реестр существует,
+    все изменения выполняются в нем (поиск по ключу и адресу - по индексам,
+    блокировка - флаг `banned`), а `wg1.conf` генерируется из реестра и
+    атомарно перезаписывается. Правки `wg1.conf` в обход реестра будут
+    перезаписаны при следующем изменении.
+
+    Реестр реализует интерфейс `PeerTable` (get, find, add, remove, ban, unban,
+    render, strip, dump), поэтому применяется теми же операциями.
+
+    Args:
+        path (str): Путь к файлу реестра.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS interface (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            head TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS peers (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            public_key TEXT NOT NULL UNIQUE,
+            allowed_ips TEXT,
+            options TEXT NOT NULL DEFAULT '[]',
+            banned INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS peers_allowed_ips ON peers (allowed_ips);
+        CREATE INDEX IF NOT EXISTS peers_banned ON peers (banned);
+    """
+    """Схема реестра (порядок пиров в конфигурации - по id)"""
+
+    COLUMNS = "public_key, allowed_ips, options, banned"
+
+    def __init__(self, path) -> None:
+        self.path = str(path)
+        self.db = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False
+        )
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(self.SCHEMA)
+
+    @staticmethod
+    def path_for(wgpath):
+        """Путь к реестру конфигурации `wgpath`."""
+        return pathlib.Path(wgpath).with_suffix(".db")
+
+    @classmethod
+    def open(cls, wgpath):
+        """Открывает реестр конфигурации, если он создан.
+
+        Returns:
+            PeerRegistry: Реестр или None.
+        """
+        path = cls.path_for(wgpath)
+        if path.exists():
+            return cls(path)
+
+    @contextmanager
+    def transaction(self):
+        """Транзакция: изменения фиксируются только при выходе без исключения."""
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            yield self
+        except BaseException:
+            self.rollback()
+            raise
+        else:
+            if self.db.in_transaction:
+                self.db.execute("COMMIT")
+
+    def rollback(self):
+        """Откатывает текущую транзакцию (если она есть)."""
+        if self.db.in_transaction:
+            self.db.execute("ROLLBACK")
+
+    def close(self):
+        self.db.close()
+
+    @staticmethod
+    def _peer(row) -> Peer:
+        public_key, allowed_ips, options, banned = row
+        return Peer(
+            public_key,
+            allowed_ips,
+            [tuple(option) for option in json.loads(options)],
+            bool(banned),
+        )
+
+    def __len__(self):
+        return self.db.execute("SELECT count(*) FROM peers").fetchone()[0]
+
+    def __contains__(self, public_key):
+        return (
+            self.db.execute(
+                "SELECT 1 FROM peers WHERE public_key = ?", (public_key,)
+            ).fetchone()
+            is not None
+        )
+
+    def __iter__(self):
+        return self.peers()
+
+    def peers(self, banned: bool = None):
+        """Пиры в порядке добавления.
+
+        Args:
+            banned (bool, optional): Только заблокированные (True) или только
+                активные (False) пиры.
+        """
+        query = f"SELECT {self.COLUMNS} FROM peers"
+        params = ()
+        if banned is not None:
+            query += " WHERE banned = ?"
+            params = (int(banned),)
+        return map(self._peer, self.db.execute(query + " ORDER BY id", params).fetchall())
+
+    def count(self, banned: bool = None):
+        """Количество пиров (всех, заблокированных или активных)."""
+        if banned is None:
+            return len(self)
+        return self.db.execute(
+            "SELECT count(*) FROM peers WHERE banned = ?", (int(banned),)
+        ).fetchone()[0]
+
+    @property
+    def head(self) -> list[str]:
+        """list[str]: Строки конфигурации до первого пира ([Interface])."""
+        row = self.db.execute("SELECT head FROM interface WHERE id = 1").fetchone()
+        return row[0].split("\n") if row and row[0] else []
+
+    def get(self, public_key) -> Peer:
+        """Возвращает пира по публичному ключу.
+
+        Raises:
+            PeerNotFoundError: Если пир не найден.
+        """
+        row = self.db.execute(
+            f"SELECT {self.COLUMNS} FROM peers WHERE public_key = ?", (public_key,)
+        ).fetchone()
+        if row is None:
+            raise PeerNotFoundError
+        return self._peer(row)
+
+    def find(self, allowed_ips) -> Peer | None:
+        """Возвращает пира по адресу (AllowedIPs) или None."""
+        row = self.db.execute(
+            f"SELECT {self.COLUMNS} FROM peers WHERE allowed_ips = ? ORDER BY id DESC",
+            (str(allowed_ips),),
+        ).fetchone()
+        if row is not None:
+            return self._peer(row)
+
+    def _insert(self, peer: Peer):
+        self.db.execute(
+            f"INSERT INTO peers ({self.COLUMNS}) VALUES (?, ?, ?, ?)",
+            (
+                peer.public_key,
+                peer.allowed_ips,
+                json.dumps(peer.options),
+                int(peer.banned),
+            ),
+        )
+
+    def add(self, public_key, allowed_ips, keepalive=25, banned=False):
+        """Добавляет нового пира.
+
+        Raises:
+            PeerStateError: Если пир с таким ключом или адресом уже существует.
+        """
+        allowed_ips = str(allowed_ips)
+        if public_key in self:
+            logger.warning("Peer already added")
+            raise PeerStateError(f"Peer {public_key} already exists")
+        if self.find(allowed_ips) is not None:
+            logger.warning(f"Address {allowed_ips} already used")
+            raise PeerStateError(f"Address {allowed_ips} already used")
+
+        peer = Peer(
+            public_key, allowed_ips, [("PersistentKeepalive", str(keepalive))], banned
+        )
+        self._insert(peer)
+        return peer
+
+    def remove(self, public_key):
+        """Удаляет пира.
+
+        Raises:
+            PeerNotFoundError: Если пир не найден.
+        """
+        peer = self.get(public_key)
+        self.db.execute("DELETE FROM peers WHERE public_key = ?", (public_key,))
+        return peer
+
+    def _set_banned(self, public_key, banned: bool, error: str):
+        cursor = self.db.execute(
+            "UPDATE peers SET banned = ? WHERE public_key = ? AND banned = ?",
+            (int(banned), public_key, int(not banned)),
+        )
+        if not cursor.rowcount:
+            self.get(public_key)
+            logger.warning(f"Peer already {'banned' if banned else 'unbanned'}")
+            raise PeerStateError(error)
+        return self.get(public_key)
+
+    def ban(self, public_key):
+        """Блокирует пира.
+
+        Raises:
+            PeerNotFoundError: Если пир не найден.
+            PeerStateError: Если пир уже заблокирован.
+        """
+        return self._set_banned(public_key, True, "BAN USER ERROR")
+
+    def unban(self, public_key):
+        """Разблокирует пира.
+
+        Raises:
+            PeerNotFoundError: Если пир не найден.
+            PeerStateError: Если пир не заблокирован.
+        """
+        return self._set_banned(public_key, False, "UNBAN USER ERROR")
+
+    def table(self) -> PeerTable:
+        """Снимок реестра в виде `PeerTable`."""
+        table = PeerTable(self.head)
+        for peer in self.peers():
+            table._insert(peer)
+        return table
+
+    def render(self):
+        """Собирает текст конфигурации (см. `PeerTable.render`)."""
+        return self.table().render()
+
+    def strip(self):
+        """Собирает конфигурацию для `wg syncconf` (см. `PeerTable.strip`)."""
+        return self.table().strip()
+
+    def dump(self, path):
+        """Атомарно записывает сгенерированную конфигурацию и фиксирует транзакцию.
+
+        Если записать конфигурацию не удалось, транзакция откатывается, поэтому
+        реестр не расходится с файлом.
+        """
+        try:
+            self.table().dump(path)
+        except BaseException:
+            self.rollback()
+            raise
+        if self.db.in_transaction:
+            self.db.execute("COMMIT")
+
+    def import_table(self, table: PeerTable):
+        """Заменяет содержимое реестра таблицей пиров (в т.ч. заблокированных).
+
+        Returns:
+            int: Количество импортированных пиров.
+        """
+        with self.transaction():
+            self.db.execute("DELETE FROM peers")
+            self.db.execute(
+                "INSERT OR REPLACE INTO interface (id, head) VALUES (1, ?)",
+                ("\n".join(table.head),),
+            )
+            for peer in table:
+                self._insert(peer)
+        return len(table)
+
+    @classmethod
+    def import_conf(cls, wgpath):
+        """Создает (пересоздает) реестр из файла конфигурации.
+
+        Returns:
+            PeerRegistry: Реестр конфигурации.
+        """
+        registry = cls(cls.path_for(wgpath))
+        count = registry.import_table(PeerTable.load(wgpath))
+        logger.info(f"Imported {count} peers into {registry.path}")
+        return registry
+
+
+def load_table(wgpath):
+    """Таблица пиров для чтения: реестр (если создан) или файл конфигурации."""
+    return PeerRegistry.open(wgpath) or PeerTable.load(wgpath)
+
+
+@contextmanager
+def edit_table(wgpath):
+    """Таблица пиров для изменения.
+
+    Если реестр создан, изменения выполняются в его транзакции (откатываются
+    при исключении), иначе разбирается файл конфигурации.
+    """
+    registry = PeerRegistry.open(wgpath)
+    if registry is None:
+        yield PeerTable.load(wgpath)
+        return
+
+    try:
+        with registry.transaction():
+            yield registry
+    finally:
+        registry.close()
+
+
+@contextmanager
+def config_lock(path):
+    """Эксклюзивная блокировка конфигурации.
+
+    Блокируется отдельный файл `<conf>.lock`: сам конфиг заменяется при записи
+    (rename), и блокировка на его старом inode не защищала бы от гонок.
+    """
+    with open(f"{path}.lock", "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class ChangeFeed:
+    """Журнал изменений пиров с монотонной ревизией.
+
+    Журнал хранится рядом с конфигурацией (`<conf>.feed`): первая строка -
+    заголовок {"epoch": ..., "floor": ...}, далее по строке на каждую запись
+    конфигурации: `ревизия<TAB>отпечаток файла<TAB>ключи измененных пиров`.
+    Запись - дозапись одной строки, поэтому не зависит от числа пиров.
+
+    Клиент запрашивает изменения после известной ему ревизии (`since`).
+    Полный список пиров отдается, если эпоха клиента не совпадает, ревизия
+    старше сжатого журнала или конфигурация изменялась в обход журнала
+    (отпечаток файла не совпадает с последней записью).
+
+    Все методы вызываются под `config_lock`.
+
+    Args:
+        wgpath (str): Путь к конфигурации wireguard.
+        limit (int, optional): Размер журнала, после которого он сжимается.
+    """
+
+    def __init__(self, wgpath=WIREGUARD_CONF, limit=FEED_LIMIT) -> None:
+        self.wgpath = wgpath
+        self.path = pathlib.Path(f"{wgpath}.feed")
+        self.limit = limit
+        self.before = None
+
+    def begin(self):
+        """Запоминает отпечаток конфигурации до ее изменения.
+
+        Если конфигурация к этому моменту уже менялась в обход журнала,
+        `record` начнет новую эпоху, а не скроет это изменение.
+        """
+        with suppress(OSError):
+            self.before = self._stamp()
+        return self
+
+    def _stamp(self):
+        stat = os.stat(self.wgpath)
+        return f"{stat.st_ino}:{stat.st_mtime_ns}:{stat.st_size}"
+
+    def _read(self):
+        """Читает журнал.
+
+        Returns:
+            tuple[dict, list[tuple[int, str, list[str]]]]: Заголовок и записи.
+        """
+        try:
+            with open(self.path) as file:
+                header = json.loads(file.readline())
+                records = []
+                for line in file:
+                    revision, stamp, keys = line.rstrip("\n").split("\t")
+                    records.append((int(revision), stamp, keys.split()))
+        except (OSError, ValueError):
+            return None, []
+        return header, records
+
+    def _write(self, header, records):
+        """Атомарно перезаписывает журнал."""
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as file:
+                file.write(json.dumps(header) + "\n")
+                for revision, stamp, keys in records:
+                    file.write(f"{revision}\t{stamp}\t{' '.join(keys)}\n")
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            with suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+    def reset(self, revision=0):
+        """Начинает новую эпоху журнала (клиенты получат полный список).
+
+        Returns:
+            tuple[dict, int]: Заголовок и текущая ревизия.
+        """
+        revision += 1
+        header = {"epoch": os.urandom(8).hex(), "floor": revision}
+        self._write(header, [(revision, self._stamp(), [])])
+        return header, revision
+
+    def record(self, public_keys):
+        """Записывает изменение пиров (после записи конфигурации).
+
+        Returns:
+            int: Новая ревизия.
+        """
+        header, records = self._read()
+        if header is None or not records:
+            return self.reset()[1]
+        if self.before is not None and records[-1][1] != self.before:
+            return self.reset(records[-1][0])[1]
+
+        revision = records[-1][0] + 1
+        if self.path.stat().st_size > self.limit:
+            header["floor"] = revision - 1
+            self._write(header, [])
+
+        with open(self.path, "a") as file:
+            file.write(f"{revision}\t{self._stamp()}\t{' '.join(public_keys)}\n")
+        return revision
+
+    def since(self, table: "PeerTable | PeerRegistry", revision=None, epoch=None):
+        """Изменения пиров после ревизии `revision`.
+
+        Args:
+            table (PeerTable | PeerRegistry): Текущая таблица пиров.
+            revision (int, optional): Последняя известная клиенту ревизия.
+            epoch (str, optional): Эпоха журнала, известная клиенту.
+
+        Returns:
+            dict: {"epoch", "revision", "full", "peers", "removed"}. При full=True
+            в peers - все пиры, иначе только измененные; removed - ключи удаленных пиров.
+        """
+        header, records = self._read()
+        if header is None or not records or records[-1][1] != self._stamp():
+            header, current = self.reset(records[-1][0] if records else 0)
+            records = []
+        else:
+            current = records[-1][0]
+
+        full = (
+            revision is None
+            or epoch != header["epoch"]
+            or not header["floor"] <= revision <= current
+        )
+        feed = {
+            "epoch": header["epoch"],
+            "revision": current,
+            "full": full,
+            "peers": [],
+            "removed": [],
+        }
+
+        if full:
+            feed["peers"] = [peer.info() for peer in table]
+            return feed
+
+        changed = set()
+        for record_revision, _, keys in records:
+            if record_revision > revision:
+                changed.update(keys)
+
+        for public_key in changed:
+            if public_key in table:
+                feed["peers"].append(table.get(public_key).info())
+            else:
+                feed["removed"].append(public_key)
+        return feed
+
+
+def reload_wireguard(label):
+    """Перезагружает интерфейс wireguard и пишет результат в WIREGUARD_LOG.
+
+    Args:
+        label (str): Описание изменения для журнала.
+
+    Raises:
+        Exception: Если перезагрузка завершилась с ошибкой.
+    """
+    reload_cmd = " && ".join(
+        (
+            f'echo -n "$(date) :: {label} ::" >> {WIREGUARD_LOG}',
+            f"sudo systemctl reload wg-quick@wg1.service 2>> {WIREGUARD_LOG}",
+            f'echo " " >> {WIREGUARD_LOG}',
+        )
+    )
+
+    error_code = run(
+        f"flock {WIREGUARD_LOG} --command '{reload_cmd}'", shell=True
+    ).returncode
+    if error_code:
+        raise Exception(f"execute wireguard reload error. Exit code {error_code}")
+
+
+class WgApplier:
+    """Применение изменений к работающему интерфейсу без перезагрузки службы.
+
+    Одиночные изменения передаются через `wg set` (добавление/удаление пира),
+    массовые - через `wg syncconf` с очищенной конфигурацией. Режим "reload"
+    сохраняет прежнее поведение (`systemctl reload wg-quick@wg1`).
+
+    Args:
+        mode (str, optional): "set" или "reload". Defaults to "set".
+        interface (str, optional): Имя интерфейса wireguard.
+        wg (str, optional): Путь к утилите `wg`.
+        threshold (int, optional): Число изменений для перехода на `wg syncconf`.
+    """
+
+    def __init__(
+        self,
+        mode="set",
+        interface=WIREGUARD_INTERFACE,
+        wg=WIREGUARD_BIN,
+        threshold=SYNC_THRESHOLD,
+    ) -> None:
+        self.mode = mode
+        self.interface = interface
+        self.wg = wg
+        self.threshold = threshold
+
+    def _wg(self, *args, input=None):
+        proc = run(
+            (self.wg, *args), input=input, capture_output=True, text=True
+        )
+        if proc.returncode:
+            raise Exception(
+                f"wg {args[0]} error. Exit code {proc.returncode}: {proc.stderr.strip()}"
+            )
+        return proc.stdout
+
+    def set_peer(self, peer: Peer):
+        """Добавляет (обновляет) пира на интерфейсе."""
+        args = ["set", self.interface, "peer", peer.public_key]
+        args.extend(("allowed-ips", peer.allowed_ips))
+        if peer.keepalive:
+            args.extend(("persistent-keepalive", peer.keepalive))
+        self._wg(*args)
+
+    def remove_peer(self, peer: Peer):
+        """Удаляет пира с интерфейса."""
+        self._wg("set", self.interface, "peer", peer.public_key, "remove")
+
+    def syncconf(self, table: PeerTable):
+        """Синхронизирует интерфейс с таблицей пиров одной командой."""
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{self.interface}.", suffix=".conf")
+        try:
+            with os.fdopen(fd, "w") as file:
+                file.write(table.strip())
+            self._wg("syncconf", self.interface, tmp_path)
+        finally:
+            with suppress(OSError):
+                os.unlink(tmp_path)
+
+    def sync(self, table: PeerTable, label=""):
+        """Приводит интерфейс к таблице пиров одной операцией (`wg syncconf` или перезагрузка)."""
+        if self.mode == "reload":
+            reload_wireguard(label)
+        else:
+            self.syncconf(table)
+
+    def apply(self, changes: list[tuple[str, Peer]], table: PeerTable, label=""):
+        """Применяет изменения к интерфейсу.
+
+        Args:
+            changes (list[tuple[str, Peer]]): Пары ("set" | "remove", пир).
+            table (PeerTable): Итоговая таблица пиров (для `wg syncconf`).
+            label (str, optional): Описание изменения для журнала.
+        """
+        if not changes:
+            return
+
+        if self.mode == "reload":
+            reload_wireguard(label)
+        elif len(changes) >= self.threshold:
+            self.syncconf(table)
+        else:
+            for action, peer in changes:
+                if action == "set":
+                    self.set_peer(peer)
                 else:
-                    validated_lines.append(i + extra)
-                    extra += 1
+                    self.remove_peer(peer)
+
 
-        for i in validated_lines:
-            yield i
+class ConfigChanger:
+    def __init__(
+        self,
+        public_key,
+        allowed_ips=None,
+        raises=False,
+        wgpath=WIREGUARD_CONF,
+        applier: WgApplier = None,
+    ) -> None:
+        self.public_key = public_key
+        self.allowed_ips = allowed_ips
+        self.raises = raises
+        self.wgpath = wgpath
+        self.applier = applier or WgApplier()
 
     def process(mode):
         def decorator(func):
@@ -64,35 +962,21 @@ class ConfigChanger:
                 try:
                     start = time()
 
-                    with open(WIREGUARD_CONF, "r+") as file:
-                        fcntl.flock(file, fcntl.LOCK_EX)
-                        self.config = file.read().split("\n")
-                        func(self, *args, **kwargs)
-
-                        file.seek(0)
-                        file.truncate(0)
-                        file.write("\n".join(self.config))
-                        fcntl.flock(file, fcntl.LOCK_UN)
-
-                    proc = time() - start
+                    with config_lock(self.wgpath), edit_table(self.wgpath) as table:
+                        feed = ChangeFeed(self.wgpath).begin()
+                        self.table = table
+                        change = func(self, *args, **kwargs)
+                        self.table.dump(self.wgpath)
+                        feed.record([change[1].public_key])
 
-                    reload_cmd = " && ".join(
-                        (
-                            f'echo -n "$(date) :: {func.__name__} :: {self.public_key[:4]}... ::" >> {WIREGUARD_LOG}',
-                            f"sudo systemctl reload wg-quick@wg1.service 2>> {WIREGUARD_LOG}",
-                            f'echo " " >> {WIREGUARD_LOG}',
-                        )
-                    )
+                        proc = time() - start
 
-                    error_code = Popen(
-                        f"flock {WIREGUARD_LOG} --command '{reload_cmd}'", shell=True
-                    ).returncode
-                    if not error_code:
-                        logger.info(f'Peer "{self.public_key[:4]}..." {mode}ed')
-                    else:
-                        raise Exception(
-                            f"execute wireguard reload error. Exit code {error_code}"
+                        self.applier.apply(
+                            [change],
+                            self.table,
+                            f"{func.__name__} :: {self.public_key[:4]}...",
                         )
+                    logger.info(f'Peer "{self.public_key[:4]}..." {mode}ed')
 
                 except Exception as e:
                     logger.error(e.args[0])
@@ -100,7 +984,7 @@ class ConfigChanger:
                         raise e
                 else:
                     logger.debug(
-                        f"METRIC::{func.__name__}::proc::[  {int(proc)*1000}  ]msec"
+                        f"METRIC::{func.__name__}::proc::[  {int(proc*1000)}  ]msec"
                     )
                 finally:
                     logger.debug(
@@ -113,44 +997,754 @@ class ConfigChanger:
 
     @process("add")
     def register(self):
-        new_user = (
-            "[Peer]",
-            f"PublicKey = {self.public_key}",
-            f"AllowedIPs = {self.allowed_ips}",
-            "PersistentKeepalive = 25",
-        )
-        config = "\n".join(self.config)
-        if self.public_key in config:
-            logger.warning("Peer already added")
-            raise Exception("NEW USER ERROR")
-
-        self.config.extend(new_user)
+        return "set", self.table.add(self.public_key, self.allowed_ips)
 
     @process("delet")
     def delete(self):
-        lines = self.__find_key()
-        for n in sorted(lines, reverse=True):
-            self.config.pop(n)
+        return "remove", self.table.remove(self.public_key)
 
     @process("bann")
     def ban(self):
-        lines = self.__find_key()
-        for n in lines:
-            if self.config[n].startswith("#"):
-                logger.warning("Peer already banned")
-                raise Exception("BAN USER ERROR")
-            else:
-                self.config[n] = f"# {self.config[n]}"
+        return "remove", self.table.ban(self.public_key)
 
     @process("unbann")
     def unban(self):
-        lines = self.__find_key()
-        for n in lines:
-            if not self.config[n].startswith("#"):
-                logger.warning("Peer already unbanned")
-                raise Exception("UNBAN USER ERROR")
+        return "set", self.table.unban(self.public_key)
+
+
+def apply_operation(table: PeerTable, operation: dict):
+    """Применяет одну операцию к таблице пиров.
+
+    Args:
+        table (PeerTable): Таблица пиров.
+        operation (dict): Операция вида
+            {"mode": "new" | "ban" | "unban" | "del", "pubkey": str, "allowed_ips": str}.
+
+    Returns:
+        tuple[dict, tuple[str, Peer] | None]: Результат операции и изменение для
+        интерфейса (None, если ничего не изменилось). status результата:
+        "done" - изменение применено, "skip" - пир уже в нужном состоянии,
+        "fail" - ошибка (в том числе добавление пира, ключ или адрес которого
+        уже заняты).
+    """
+    mode = operation.get("mode")
+    pubkey = operation.get("pubkey")
+    result = {"mode": mode, "pubkey": pubkey, "status": "done", "error": None}
+
+    try:
+        if not pubkey:
+            raise ValueError("Argument PUBKEY: empty value")
+        match mode:
+            case "new":
+                if not operation.get("allowed_ips"):
+                    raise ValueError("Argument ALLOWED_IPS: empty value")
+                IPv4Interface(operation["allowed_ips"])
+                change = "set", table.add(pubkey, operation["allowed_ips"])
+            case "ban":
+                change = "remove", table.ban(pubkey)
+            case "unban":
+                change = "set", table.unban(pubkey)
+            case "del":
+                change = "remove", table.remove(pubkey)
+            case _:
+                raise ValueError(f"Unknown mode {mode}")
+
+    except PeerStateError as e:
+        # Занятый ключ или адрес нового пира - не нужное состояние, а ошибка
+        result.update(status="fail" if mode == "new" else "skip", error=e.args[0])
+    except (PeerNotFoundError, ValueError) as e:
+        result.update(status="fail", error=e.args[0])
+    else:
+        return result, change
+
+    return result, None
+
+
+class BatchChanger:
+    """Пакетное изменение конфигурации.
+
+    Все операции применяются под одной блокировкой, конфигурация записывается
+    один раз, а интерфейс перезагружается один раз (если что-то изменилось).
+
+    Args:
+        operations (list[dict]): Операции вида
+            {"mode": "new" | "ban" | "unban" | "del", "pubkey": str, "allowed_ips": str}.
+        raises (bool, optional): Прерывать ли выполнение при ошибке записи/перезагрузки.
+        wgpath (str, optional): Путь к конфигурации wireguard.
+    """
+
+    def __init__(
+        self,
+        operations,
+        raises=False,
+        wgpath=WIREGUARD_CONF,
+        applier: WgApplier = None,
+    ) -> None:
+        self.operations = operations
+        self.raises = raises
+        self.wgpath = wgpath
+        self.applier = applier or WgApplier()
+        self.changes: list[tuple[str, Peer]] = []
+
+    def apply(self, operation: dict):
+        """Применяет одну операцию к таблице пиров.
+
+        Returns:
+            dict: Результат операции (см. `apply_operation`).
+        """
+        result, change = apply_operation(self.table, operation)
+        if change is not None:
+            self.changes.append(change)
+        return result
+
+    def process(self):
+        """Применяет все операции.
+
+        Returns:
+            list[dict]: Результаты операций в исходном порядке.
+        """
+        start = time()
+        results = []
+        try:
+            with config_lock(self.wgpath), edit_table(self.wgpath) as table:
+                feed = ChangeFeed(self.wgpath).begin()
+                self.table = table
+                results = [self.apply(operation) for operation in self.operations]
+                changed = len(self.changes)
+                if changed:
+                    self.table.dump(self.wgpath)
+                    feed.record(
+                        [peer.public_key for _, peer in self.changes]
+                    )
+                    self.applier.apply(
+                        self.changes,
+                        self.table,
+                        f"batch :: {changed}/{len(results)} ops",
+                    )
+            logger.info(f"Batch applied: {changed}/{len(results)} changed")
+
+        except Exception as e:
+            logger.error(e.args[0])
+            for result in results:
+                if result["status"] == "done":
+                    result.update(status="fail", error=str(e.args[0]))
+            if self.raises:
+                raise e
+        finally:
+            logger.debug(f"METRIC::batch::end::[  {int((time()-start)*1000)}  ]msec")
+
+        return results
+
+
+def desired_hash(peers: list[dict]):
+    """Хэш желаемого набора пиров (не зависит от порядка пиров).
+
+    Args:
+        peers (list[dict]): Пиры вида {"pubkey": str, "allowed_ips": str, "ban": bool}.
+
+    Returns:
+        str: sha256 канонического JSON набора пиров.
+    """
+    canonical = sorted(
+        (peer["pubkey"], str(IPv4Interface(peer["allowed_ips"])), bool(peer.get("ban")))
+        for peer in peers
+    )
+    return hashlib.sha256(
+        json.dumps(canonical, separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+def diff_operations(table: "PeerTable | PeerRegistry", peers: list[dict]):
+    """Операции, приводящие таблицу к желаемому набору пиров.
+
+    Пиры, отсутствующие в наборе или с другим адресом, удаляются (первыми,
+    чтобы освободить адреса), недостающие добавляются, у остальных
+    выравнивается состояние блокировки. Прочие строки секций сохраняются.
+
+    Args:
+        table (PeerTable | PeerRegistry): Текущая таблица пиров.
+        peers (list[dict]): Пиры вида {"pubkey": str, "allowed_ips": str, "ban": bool}.
+
+    Returns:
+        list[dict]: Операции для `apply_operation`.
+    """
+    desired = {
+        peer["pubkey"]: (str(IPv4Interface(peer["allowed_ips"])), bool(peer.get("ban")))
+        for peer in peers
+    }
+
+    operations, current = [], {}
+    for peer in table:
+        wanted = desired.get(peer.public_key)
+        if wanted is None or wanted[0] != peer.allowed_ips:
+            operations.append({"mode": "del", "pubkey": peer.public_key})
+        else:
+            current[peer.public_key] = peer.banned
+
+    for public_key, (allowed_ips, banned) in desired.items():
+        if public_key not in current:
+            operations.append(
+                {"mode": "new", "pubkey": public_key, "allowed_ips": allowed_ips}
+            )
+            if banned:
+                operations.append({"mode": "ban", "pubkey": public_key})
+        elif current[public_key] != banned:
+            operations.append({"mode": "ban" if banned else "unban", "pubkey": public_key})
+
+    return operations
+
+
+class DesiredStateSync:
+    """Синхронизация сервера с желаемым набором пиров (из БД бота).
+
+    Конфигурация приводится к набору пиров под одной блокировкой и записывается
+    один раз, интерфейс обновляется одной командой `wg syncconf`. Хэш
+    примененного набора и отпечаток записанной конфигурации сохраняются
+    в `<conf>.sync`: повторная синхронизация с тем же набором (если конфигурация
+    не менялась) ничего не делает. Без набора пиров (`peers=None`) только
+    проверяется, совпадает ли хэш `digest` с примененным.
+
+    Args:
+        peers (list[dict] | None): Пиры вида {"pubkey": str, "allowed_ips": str, "ban": bool}.
+        digest (str, optional): Хэш набора для проверки без набора пиров
+            (если набор передан, хэш вычисляется по нему - `desired_hash`).
+        force (bool, optional): Синхронизировать, даже если набор не изменился.
+        wgpath (str, optional): Путь к конфигурации wireguard.
+        applier (WgApplier, optional): Способ применения изменений к интерфейсу.
+    """
+
+    def __init__(
+        self,
+        peers: list[dict] | None,
+        digest: str = None,
+        force=False,
+        wgpath=WIREGUARD_CONF,
+        applier: WgApplier = None,
+    ) -> None:
+        self.peers = peers
+        self.digest = desired_hash(peers) if peers is not None else digest
+        self.force = force
+        self.wgpath = wgpath
+        self.path = pathlib.Path(f"{wgpath}.sync")
+        self.applier = applier or WgApplier()
+
+    def _stamp(self):
+        stat = os.stat(self.wgpath)
+        return f"{stat.st_ino}:{stat.st_mtime_ns}:{stat.st_size}"
+
+    def _state(self):
+        try:
+            with open(self.path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self):
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.path.parent, prefix=f".{self.path.name}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump({"hash": self.digest, "stamp": self._stamp()}, file)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            with suppress(OSError):
+                os.unlink(tmp_path)
+            raise
+
+    def process(self):
+        """Выполняет синхронизацию.
+
+        Returns:
+            dict: {"status": "unchanged" | "stale" | "synced", "hash": ...};
+            для "synced" также "changes" (количество операций по режимам)
+            и "failed" (неприменимые операции, например повтор адреса в наборе).
+            "stale" - хэш не совпал, а набор пиров не передан.
+        """
+        start = time()
+        with config_lock(self.wgpath):
+            state = self._state()
+            if (
+                not self.force
+                and state.get("hash") == self.digest
+                and state.get("stamp") == self._stamp()
+            ):
+                return {"status": "unchanged", "hash": self.digest}
+            if self.peers is None:
+                return {"status": "stale", "hash": state.get("hash")}
+
+            with edit_table(self.wgpath) as table:
+                feed = ChangeFeed(self.wgpath).begin()
+                counts, failed, changed = {}, [], []
+                for operation in diff_operations(table, self.peers):
+                    result, change = apply_operation(table, operation)
+                    if result["status"] == "fail":
+                        failed.append(result)
+                    elif change is not None:
+                        counts[result["mode"]] = counts.get(result["mode"], 0) + 1
+                        changed.append(change[1].public_key)
+
+                if changed:
+                    table.dump(self.wgpath)
+                    feed.record(changed)
+                self.applier.sync(table, f"sync :: {len(changed)} changes")
+
+            if not failed:
+                self._save()
+
+        logger.info(
+            f"Synced {len(self.peers)} peers: {counts or 'no changes'}, "
+            f"{len(failed)} failed, {int((time() - start) * 1000)} msec"
+        )
+        return {"status": "synced", "hash": self.digest, "changes": counts, "failed": failed}
+
+
+class ReloadCoalescer:
+    """Объединение изменений конфигурации, пришедших в течение короткого окна.
+
+    Первая операция открывает окно (`window` сек); все операции, пришедшие до
+    его закрытия, применяются одним вызовом `apply` - одна запись конфигурации
+    и одна перезагрузка (`wg syncconf`) интерфейса. Каждый отправитель получает
+    свои результаты через callback только после применения всего пакета.
+
+    Args:
+        apply (Callable[[list[dict]], list[dict]]): Применение списка операций
+            (результаты в том же порядке).
+        window (float, optional): Окно объединения (сек).
+        max_batch (int, optional): Число операций, при котором пакет применяется досрочно.
+    """
+
+    def __init__(self, apply, window=0.2, max_batch=COALESCE_MAX_BATCH) -> None:
+        self.apply = apply
+        self.window = window
+        self.max_batch = max_batch
+
+        self.pending: list[tuple[list[dict], object, float]] = []
+        self.busy = False
+        self.cond = threading.Condition()
+
+        self.batches = 0
+        self.operations = 0
+        self.max_size = 0
+        self.latencies = deque(maxlen=1000)
+        """deque[tuple[float, float]]: Ожидание в очереди и время применения последних пакетов (сек)."""
+
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, operations: list[dict], callback):
+        """Ставит операции в очередь.
+
+        Args:
+            operations (list[dict]): Операции (см. `apply_operation`).
+            callback (Callable[[list[dict] | None, Exception | None], None]):
+                Вызывается с результатами операций (или исключением) после
+                применения пакета.
+        """
+        with self.cond:
+            self.pending.append((operations, callback, time()))
+            self.cond.notify_all()
+
+    def _size(self):
+        return sum(len(operations) for operations, _, _ in self.pending)
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.pending:
+                    self.cond.wait()
+
+                deadline = self.pending[0][2] + self.window
+                while (remaining := deadline - time()) > 0 and self._size() < self.max_batch:
+                    self.cond.wait(remaining)
+
+                batch, self.pending = self.pending, []
+                self.busy = True
+
+            try:
+                self.flush(batch)
+            finally:
+                with self.cond:
+                    self.busy = False
+                    self.cond.notify_all()
+
+    def flush(self, batch: list[tuple[list[dict], object, float]]):
+        """Применяет пакет и передает отправителям их результаты."""
+        operations = [operation for ops, _, _ in batch for operation in ops]
+
+        start = time()
+        results, error = None, None
+        try:
+            results = self.apply(operations)
+        except Exception as e:
+            logger.exception("Coalesced batch error")
+            error = e
+        finish = time()
+
+        with self.cond:
+            self.batches += 1
+            self.operations += len(operations)
+            self.max_size = max(self.max_size, len(operations))
+            self.latencies.append((start - batch[0][2], finish - start))
+
+        logger.debug(
+            f"METRIC::coalesce::{len(batch)} requests/{len(operations)} ops::"
+            f"[  {int((finish - start) * 1000)}  ]msec"
+        )
+
+        offset = 0
+        for ops, callback, _ in batch:
+            try:
+                if error is None:
+                    callback(results[offset : offset + len(ops)], None)
+                else:
+                    callback(None, error)
+            except Exception:
+                logger.exception("Coalesced callback error")
+            offset += len(ops)
+
+    def wait(self):
+        """Ждет применения всех поставленных в очередь операций."""
+        with self.cond:
+            while self.pending or self.busy:
+                self.cond.wait()
+
+    def stats(self):
+        """Метрики объединения.
+
+        Returns:
+            dict: Количество пакетов и операций, размеры пакетов и
+            перцентили ожидания в очереди и времени применения (мсек).
+        """
+        with self.cond:
+            latencies = list(self.latencies)
+            stats = {
+                "window": int(self.window * 1000),
+                "batches": self.batches,
+                "operations": self.operations,
+                "pending": self._size(),
+                "batch_avg": round(self.operations / self.batches, 2)
+                if self.batches
+                else 0,
+                "batch_max": self.max_size,
+            }
+
+        for name, values in (
+            ("wait", sorted(wait for wait, _ in latencies)),
+            ("apply", sorted(apply for _, apply in latencies)),
+        ):
+            for percentile in (50, 99):
+                stats[f"{name}_p{percentile}"] = (
+                    round(values[(len(values) - 1) * percentile // 100] * 1000, 2)
+                    if values
+                    else 0
+                )
+        return stats
+
+
+class WgAgent:
+    """Долгоживущий агент на сервере wireguard.
+
+    Принимает запросы в формате JSON lines (один запрос - одна строка) через
+    stdin/stdout (SSH-канал) или unix-сокет и отвечает на них, держа таблицу
+    пиров в памяти. Конфигурация перечитывается только если файл изменился
+    на диске (например, его изменил pywg.py из командной строки). Если создан
+    реестр пиров (`PeerRegistry`), агент работает с ним вместо файла.
+
+    Запрос: {"id": 1, "op": "add" | "ban" | "unban" | "del" | "batch" | "sync" | "list" | "changes" | "dump" | "status" | "stats" | "ping", ...}
+    Ответ: {"id": 1, "ok": true, "result": ...} или {"id": 1, "ok": false, "error": "..."}
+
+    Если задано окно объединения (`coalesce`), изменения ("add", "ban", "unban",
+    "del", "batch") от всех клиентов, пришедшие в течение окна, применяются
+    одним пакетом (`ReloadCoalescer`), а ответы на них отправляются после
+    применения пакета (порядок ответов может отличаться от порядка запросов).
+
+    Args:
+        wgpath (str, optional): Путь к конфигурации wireguard.
+        applier (WgApplier, optional): Способ применения изменений к интерфейсу.
+        coalesce (float, optional): Окно объединения изменений (сек), 0 - без объединения.
+    """
+
+    MODES = {"add": "new", "ban": "ban", "unban": "unban", "del": "del"}
+    """Соответствие запросов агента режимам операций"""
+
+    def __init__(
+        self, wgpath=WIREGUARD_CONF, applier: WgApplier = None, coalesce=0.0
+    ) -> None:
+        self.wgpath = wgpath
+        self.applier = applier or WgApplier()
+        self.table: PeerTable | PeerRegistry = None
+        self.registry: PeerRegistry = None
+        self.stamp = None
+        self.started = time()
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.coalescer = (
+            ReloadCoalescer(self.locked_change, window=coalesce) if coalesce else None
+        )
+
+    def locked_change(self, operations: list[dict]):
+        """`change` под блокировкой агента (для `ReloadCoalescer`)."""
+        with self.lock:
+            return self.change(operations)
+
+    def _stamp(self):
+        stat = os.stat(self.wgpath)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def refresh(self):
+        """Перечитывает конфигурацию, если она изменилась на диске.
+
+        Если реестр пиров создан (в том числе во время работы агента),
+        таблицей пиров становится реестр.
+        """
+        if self.registry is None:
+            self.registry = PeerRegistry.open(self.wgpath)
+            if self.registry is not None:
+                self.table = self.registry
+                logger.info(f"Peer registry opened: {len(self.registry)} peers")
+        if self.registry is not None:
+            return
+
+        stamp = self._stamp()
+        if stamp != self.stamp:
+            self.table = PeerTable.load(self.wgpath)
+            self.stamp = stamp
+            logger.info(f"Config loaded: {len(self.table)} peers")
+
+    def change(self, operations: list[dict]):
+        """Применяет операции: запись конфигурации и изменение интерфейса.
+
+        Returns:
+            list[dict]: Результаты операций (см. `apply_operation`).
+        """
+        with config_lock(self.wgpath):
+            feed = ChangeFeed(self.wgpath).begin()
+            self.refresh()
+
+            transaction = (
+                self.registry.transaction()
+                if self.registry is not None
+                else nullcontext()
+            )
+            with transaction:
+                results, changes = [], []
+                for operation in operations:
+                    result, change = apply_operation(self.table, operation)
+                    results.append(result)
+                    if change is not None:
+                        changes.append(change)
+
+                if changes:
+                    try:
+                        self.table.dump(self.wgpath)
+                        feed.record([peer.public_key for _, peer in changes])
+                        self.applier.apply(
+                            changes, self.table, f"agent :: {len(changes)} ops"
+                        )
+                    except Exception as e:
+                        # Таблица в памяти могла разойтись с диском - перечитать
+                        self.stamp = None
+                        logger.error(e.args[0])
+                        for result in results:
+                            if result["status"] == "done":
+                                result.update(status="fail", error=str(e.args[0]))
+                    else:
+                        self.stamp = self._stamp()
+
+        return results
+
+    def peers(self):
+        """Список пиров.
+
+        Returns:
+            list[dict]: Пиры вида {"publickey": ..., "allowedips": ..., "ban": bool}.
+        """
+        self.refresh()
+        return [peer.info() for peer in self.table]
+
+    def changes(self, since=None, epoch=None):
+        """Изменения пиров после ревизии `since` (см. `ChangeFeed.since`)."""
+        with config_lock(self.wgpath):
+            self.refresh()
+            return ChangeFeed(self.wgpath).since(self.table, since, epoch)
+
+    def status(self):
+        """Состояние агента."""
+        self.refresh()
+        return {
+            "peers": len(self.table),
+            "banned": self.registry.count(banned=True)
+            if self.registry is not None
+            else sum(peer.banned for peer in self.table),
+            "registry": self.registry is not None,
+            "requests": self.requests,
+            "uptime": int(time() - self.started),
+        }
+
+    def stats(self):
+        """Метрики объединения изменений (см. `ReloadCoalescer.stats`)."""
+        if self.coalescer is None:
+            return {"window": 0}
+        return self.coalescer.stats()
+
+    def submit(self, request: dict, respond):
+        """Ставит изменение в очередь объединения.
+
+        Args:
+            request (dict): Запрос "add", "ban", "unban", "del" или "batch".
+            respond (Callable[[dict], None]): Отправка ответа после применения пакета.
+        """
+        response = {"id": request.get("id"), "ok": True}
+        op = request.get("op")
+        if op == "batch":
+            operations = request.get("operations", [])
+        else:
+            operations = [dict(request, mode=self.MODES[op])]
+
+        def callback(results, error):
+            if error is not None:
+                response.update(ok=False, error=str(error.args[0] if error.args else error))
+            else:
+                response["result"] = results if op == "batch" else results[0]
+            respond(response)
+
+        with self.lock:
+            self.requests += 1
+        self.coalescer.submit(operations, callback)
+
+    def handle(self, request: dict, respond=None):
+        """Обрабатывает один запрос.
+
+        Args:
+            request (dict): Запрос.
+            respond (Callable[[dict], None], optional): Отправка ответа; если задана
+                и включено объединение, изменения ставятся в очередь, а ответ
+                отправляется после применения пакета.
+
+        Returns:
+            dict: Ответ на запрос (None, если ответ будет отправлен через `respond`).
+        """
+        response = {"id": request.get("id"), "ok": True}
+        op = request.get("op")
+
+        if (
+            respond is not None
+            and self.coalescer is not None
+            and (op in self.MODES or op == "batch")
+        ):
+            self.submit(request, respond)
+            return None
+
+        with self.lock:
+            self.requests += 1
+            try:
+                if op in self.MODES:
+                    operation = dict(request, mode=self.MODES[op])
+                    response["result"] = self.change([operation])[0]
+                elif op == "batch":
+                    response["result"] = self.change(request.get("operations", []))
+                elif op == "sync":
+                    response["result"] = DesiredStateSync(
+                        request.get("peers"),
+                        digest=request.get("hash"),
+                        force=request.get("force", False),
+                        wgpath=self.wgpath,
+                        applier=self.applier,
+                    ).process()
+                    # Таблица в памяти перечитывается с диска
+                    self.stamp = None
+                elif op == "list":
+                    response["result"] = self.peers()
+                elif op == "changes":
+                    response["result"] = self.changes(
+                        request.get("since"), request.get("epoch")
+                    )
+                elif op == "dump":
+                    response["result"] = self.applier._wg(
+                        "show", self.applier.interface, "dump"
+                    )
+                elif op == "status":
+                    response["result"] = self.status()
+                elif op == "stats":
+                    response["result"] = self.stats()
+                elif op == "ping":
+                    response["result"] = "pong"
+                else:
+                    raise ValueError(f"Unknown op {op}")
+            except Exception as e:
+                logger.exception("Agent request error")
+                response.update(ok=False, error=str(e.args[0] if e.args else e))
+
+        return response
+
+    def serve(self, rfile, wfile):
+        """Обслуживает поток запросов до закрытия входного потока.
+
+        При закрытии входного потока ожидается применение поставленных
+        в очередь изменений, чтобы ответы на них были отправлены.
+        """
+        write_lock = threading.Lock()
+
+        def respond(response):
+            data = json.dumps(response) + "\n"
+            with write_lock:
+                wfile.write(data if isinstance(wfile, io.TextIOBase) else data.encode())
+                wfile.flush()
+
+        for line in rfile:
+            if isinstance(line, bytes):
+                line = line.decode()
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                assert isinstance(request, dict)
+            except (ValueError, AssertionError):
+                response = {"id": None, "ok": False, "error": "BAD REQUEST"}
             else:
-                self.config[n] = self.config[n].strip("# ")
+                response = self.handle(request, respond)
+
+            if response is not None:
+                respond(response)
+
+        if self.coalescer is not None:
+            self.coalescer.wait()
+
+    def serve_socket(self, path, group=None):
+        """Обслуживает запросы через unix-сокет (запуск через systemd)."""
+        agent = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                agent.serve(self.rfile, self.wfile)
+
+        with suppress(FileNotFoundError):
+            os.unlink(path)
+
+        with socketserver.ThreadingUnixStreamServer(str(path), Handler) as server:
+            os.chmod(path, 0o660)
+            if group:
+                os.chown(path, -1, grp.getgrnam(group).gr_gid)
+            logger.info(f"Agent listening on {path}")
+            server.serve_forever()
+
+
+def read_batch(source):
+    """Читает список операций из файла или stdin ("-").
+
+    Поддерживается JSON-массив или JSON lines (одна операция на строку).
+    """
+    if str(source) == "-":
+        data = sys.stdin.read()
+    else:
+        with open(source) as file:
+            data = file.read()
+
+    data = data.strip()
+    if data.startswith("["):
+        return json.loads(data)
+    return [json.loads(line) for line in data.splitlines() if line.strip()]
 
 
 def parse():
@@ -184,12 +1778,98 @@ def parse():
         action="store_true",
         help="Interruption in case of an error",
     )
+    parser.add_argument(
+        "--apply",
+        choices=["set", "reload"],
+        default="set",
+        help="How to apply changes: 'wg set'/'wg syncconf' or service reload (default 'set')",
+    )
+    parser.add_argument(
+        "--wg",
+        type=str,
+        default=WIREGUARD_BIN,
+        help=f"Path to wg binary (default '{WIREGUARD_BIN}')",
+    )
+    parser.add_argument(
+        "-i",
+        "--interface",
+        type=str,
+        default=WIREGUARD_INTERFACE,
+        help=f"Wireguard interface (default '{WIREGUARD_INTERFACE}')",
+    )
+    parser.add_argument(
+        "-b",
+        "--batch",
+        type=str,
+        help="File with operations (JSON array or JSON lines), '-' for stdin",
+    )
+    parser.add_argument(
+        "--sync",
+        type=str,
+        metavar="FILE",
+        help="Make the config match the desired peers from FILE (JSON array or JSON lines), '-' for stdin",
+    )
+    parser.add_argument(
+        "--sync-hash",
+        type=str,
+        metavar="HASH",
+        help="With --sync: expected hash of peers; without --sync: only check whether HASH is applied",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="With --sync: sync even if the desired peers are unchanged",
+    )
+    parser.add_argument(
+        "--agent",
+        action="store_true",
+        help="Run as long-lived agent speaking JSON lines on stdin/stdout",
+    )
+    parser.add_argument(
+        "--socket",
+        type=pathlib.Path,
+        help="Serve agent requests on unix socket instead of stdin/stdout",
+    )
+    parser.add_argument(
+        "--coalesce",
+        type=int,
+        default=0,
+        metavar="MSEC",
+        help="Agent: apply changes arriving within MSEC as one batch (default 0 - off)",
+    )
+    parser.add_argument(
+        "--socket-group",
+        type=str,
+        help="Group allowed to connect to the agent socket",
+    )
     parser.add_argument(
         "-l",
         "--list",
         action="store_true",
         help="Print list of peers (banned too)",
     )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Print list of peers as JSON (with --list)",
+    )
+    parser.add_argument(
+        "--import",
+        dest="import_conf",
+        action="store_true",
+        help="Create (recreate) the SQLite peer registry from the config file, banned peers included",
+    )
+    parser.add_argument(
+        "--changes-since",
+        type=int,
+        metavar="REVISION",
+        help="Print JSON changes of peers after REVISION (-1 for full list)",
+    )
+    parser.add_argument(
+        "--epoch",
+        type=str,
+        help="Change feed epoch known to the client (with --changes-since)",
+    )
     args = parser.parse_args()
 
     return args
@@ -198,23 +1878,77 @@ def parse():
 def main():
     args = parse()
 
+    if args.import_conf:
+        with config_lock(args.wgpath):
+            registry = PeerRegistry.import_conf(args.wgpath)
+            print(f"{len(registry)} peers ({registry.count(banned=True)} banned) -> {registry.path}")
+        return
+
+    if args.changes_since is not None:
+        with config_lock(args.wgpath):
+            feed = ChangeFeed(args.wgpath).since(
+                load_table(args.wgpath), args.changes_since, args.epoch
+            )
+        print(json.dumps(feed))
+        return
+
+    if args.list and args.json:
+        print(json.dumps([peer.info() for peer in load_table(args.wgpath)]))
+        return
+
     if args.list:
-        with open(WIREGUARD_CONF) as file:
-            peers = file.read().split("[Peer]")[1:]
-            for peer in peers:
-                print("\x1b[33m[Peer]\x1b[0m", end=" ")
+        for peer in load_table(args.wgpath):
+            print("\x1b[33m[Peer]\x1b[0m", end=" ")
 
-                if "\n#" in peer.strip("#\n "):
-                    print("\x1b[31;1m(BAN)\x1b[0m")
-                else:
-                    print("")
+            if peer.banned:
+                print("\x1b[31;1m(BAN)\x1b[0m")
+            else:
+                print("")
+
+            print("\n".join(line.lstrip("# ") for line in peer.lines()[1:]))
+
+        return
+
+    applier = WgApplier(mode=args.apply, interface=args.interface, wg=args.wg)
 
-                print(peer.strip(" #\n").replace("# ", ""))
+    if args.agent:
+        agent = WgAgent(
+            wgpath=args.wgpath, applier=applier, coalesce=args.coalesce / 1000
+        )
+        agent.refresh()
+        if args.socket:
+            agent.serve_socket(args.socket, group=args.socket_group)
+        else:
+            agent.serve(sys.stdin, sys.stdout)
+        return
+
+    if args.sync or args.sync_hash:
+        result = DesiredStateSync(
+            read_batch(args.sync) if args.sync else None,
+            digest=args.sync_hash,
+            force=args.force,
+            wgpath=args.wgpath,
+            applier=applier,
+        ).process()
+        print(json.dumps(result))
+        return
 
+    if args.batch:
+        results = BatchChanger(
+            read_batch(args.batch),
+            raises=args.raises,
+            wgpath=args.wgpath,
+            applier=applier,
+        ).process()
+        print(json.dumps(results))
         return
 
     cc = ConfigChanger(
-        public_key=args.pubkey, allowed_ips=args.allowed_ips, raises=args.raises
+        public_key=args.pubkey,
+        allowed_ips=args.allowed_ips,
+        raises=args.raises,
+        wgpath=args.wgpath,
+        applier=applier,
     )
     if args.mode == "new":
         if not args.pubkey:
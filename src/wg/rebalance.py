@@ -0,0 +1,103 @@
+"""Планирование переноса пиров между серверами кластера WireGuard"""
+
+from collections import deque
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+
+@dataclass
+class Move:
+    """Перенос конфигурации на другой сервер.
+
+    Attributes:
+        config: Конфигурация (`WgConfig`).
+        source (int | None): Сервер, на котором находится пир.
+        target (int | None): Сервер, на который переносится пир.
+    """
+
+    config: object
+    source: int | None
+    target: int | None
+
+
+def plan_moves(
+    nodes: Iterable,
+    configs: Iterable,
+    traffic: dict[int, int] = None,
+    max_moves: int = 20,
+    threshold: float = 0.1,
+    movable: Callable = None,
+    pool: dict[int | None, int] = None,
+) -> list[Move]:
+    """Составляет план переноса пиров с перегруженных серверов (без изменений на серверах).
+
+    На каждом шаге пир переносится с самого заполненного сервера на наименее
+    заполненный активный сервер со свободной емкостью, пока разница их
+    заполненности больше `threshold`, перенос не перегружает сервер назначения
+    и не достигнут лимит `max_moves`. С сервера переносятся в первую очередь
+    пиры с наименьшим трафиком: пользователей, которые сейчас не пользуются
+    VPN, перенос затрагивает меньше всего.
+
+    Args:
+        nodes (Iterable[WgNode]): Доступные узлы кластера.
+        configs (Iterable[WgConfig]): Все конфигурации (заполненность серверов
+            считается по ним).
+        traffic (dict[int, int], optional): Трафик по идентификаторам конфигураций.
+        max_moves (int, optional): Максимальное количество переносов.
+        threshold (float, optional): Допустимая разница заполненности серверов.
+        movable (Callable, optional): Фильтр конфигураций, которые можно переносить.
+        pool (dict[int | None, int], optional): Количество пиров пула по серверам:
+            они занимают емкость сервера наравне с конфигурациями и не переносятся.
+
+    Returns:
+        list[Move]: Переносы в порядке выполнения.
+    """
+    nodes = list(nodes)
+    traffic = traffic or {}
+    pool = pool or {}
+
+    peers = {node.id: pool.get(node.id, 0) for node in nodes}
+    candidates: dict[int | None, list] = {node.id: [] for node in nodes}
+    for config in configs:
+        if config.server_id not in peers:
+            continue
+        peers[config.server_id] += 1
+        if movable is None or movable(config):
+            candidates[config.server_id].append(config)
+
+    queues = {
+        server_id: deque(
+            sorted(items, key=lambda config: (traffic.get(config.id, 0), config.id))
+        )
+        for server_id, items in candidates.items()
+    }
+
+    def fill(node, delta=0):
+        if not node.capacity:
+            return float("inf")
+        return (peers[node.id] + delta) / node.capacity
+
+    moves: list[Move] = []
+    sources = [node for node in nodes if queues[node.id]]
+    while len(moves) < max_moves and sources:
+        source = max(sources, key=fill)
+        targets = [
+            node
+            for node in nodes
+            if node is not source and node.active and peers[node.id] < node.capacity
+        ]
+        if not targets:
+            break
+
+        target = min(targets, key=fill)
+        if fill(source) - fill(target) <= threshold or fill(target, 1) > fill(source, -1):
+            break
+
+        moves.append(Move(queues[source.id].popleft(), source.id, target.id))
+        peers[source.id] -= 1
+        peers[target.id] += 1
+
+        if not queues[source.id]:
+            sources.remove(source)
+
+    return moves
@@ -0,0 +1,193 @@
+"""Сверка конфигураций из БД с пирами серверов кластера WireGuard"""
+
+import enum
+from dataclasses import dataclass, field
+from typing import Iterable
+
+PEER_BANNED: dict[str, tuple[bool, bool]] = {
+    "no": (False, False),
+    "wait_yes": (True, True),
+    "yes": (True, False),
+    "wait_no": (False, True),
+    "idle": (True, False),
+}
+"""dict[str, tuple[bool, bool]]: Ожидаемое состояние пира по шагу заморозки
+(`FreezeSteps.value`): заблокирован ли пир и ожидает ли изменение применения на сервере."""
+
+
+class MismatchKind(enum.Enum):
+    """Вид расхождения БД и сервера"""
+
+    missing_on_server = "missing_on_server"
+    """Конфигурация есть в БД, пира нет на сервере"""
+    missing_in_db = "missing_in_db"
+    """Пир есть на сервере, конфигурации (и пира пула) нет в БД"""
+    ban_state = "ban_state"
+    """Состояние блокировки пира не соответствует подтвержденной заморозке"""
+    address = "address"
+    """Адрес пира не соответствует адресу конфигурации"""
+
+
+@dataclass
+class Mismatch:
+    """Расхождение БД и сервера.
+
+    Attributes:
+        kind (MismatchKind): Вид расхождения.
+        server_id (int | None): Сервер.
+        public_key (str): Публичный ключ пира.
+        config: Конфигурация (`WgConfig`, None для `missing_in_db`).
+        peer (dict | None): Пир сервера (None для `missing_on_server`).
+    """
+
+    kind: MismatchKind
+    server_id: int | None
+    public_key: str
+    config: object = None
+    peer: dict | None = None
+
+
+@dataclass
+class ReconcilePlan:
+    """План сверки: изменения в БД, операции на серверах и расхождения.
+
+    Attributes:
+        freeze (list): Конфигурации, заморозку которых нужно подтвердить в БД.
+        unfreeze (list): Конфигурации, разморозку которых нужно подтвердить в БД.
+        ban (list): Конфигурации, пиры которых нужно заблокировать на сервере.
+        unban (list): Конфигурации, пиры которых нужно разблокировать на сервере.
+        delete (list): Конфигурации, которые нужно удалить из БД.
+        mismatches (list[Mismatch]): Все найденные расхождения.
+        checked (int): Количество сверенных конфигураций.
+    """
+
+    freeze: list = field(default_factory=list)
+    unfreeze: list = field(default_factory=list)
+    ban: list = field(default_factory=list)
+    unban: list = field(default_factory=list)
+    delete: list = field(default_factory=list)
+    mismatches: list[Mismatch] = field(default_factory=list)
+    checked: int = 0
+
+    def __bool__(self):
+        return bool(self.freeze or self.unfreeze or self.ban or self.unban or self.delete)
+
+    def summary(self):
+        """dict[str, int]: Количество изменений и расхождений каждого вида (для логов)."""
+        counts = {
+            "checked": self.checked,
+            "freeze": len(self.freeze),
+            "unfreeze": len(self.unfreeze),
+            "ban": len(self.ban),
+            "unban": len(self.unban),
+            "delete": len(self.delete),
+        }
+        for kind in MismatchKind:
+            counts[kind.value] = 0
+        for mismatch in self.mismatches:
+            counts[mismatch.kind.value] += 1
+        return counts
+
+
+def plan_reconcile(
+    configs: Iterable,
+    servers_peers: dict[int | None, dict[str, dict]],
+    pool_keys: Iterable[str] = (),
+) -> ReconcilePlan:
+    """Сверяет конфигурации с пирами серверов за один проход (без изменений).
+
+    Конфигурации серверов, отсутствующих в `servers_peers` (список пиров не
+    получен), пропускаются. Для остальных:
+
+    - пира нет на сервере - конфигурация удаляется из БД;
+    - адрес пира отличается - расхождение только фиксируется, состояние
+      конфигурации не меняется;
+    - сервер уже применил ожидающую заморозку (разморозку) или состояние пира
+      расходится с подтвержденным - состояние в БД приводится к серверу;
+    - ожидающая заморозка (разморозка) еще не применена - пир блокируется
+      (разблокируется) на сервере.
+
+    Пиры сервера, которым не соответствует ни одна конфигурация и ни один пир
+    пула, фиксируются как расхождения и не удаляются.
+
+    Args:
+        configs (Iterable[WgConfig]): Все конфигурации.
+        servers_peers (dict[int | None, dict[str, dict]]): Пиры серверов по публичному
+            ключу (как `PeerFeed.peers`).
+        pool_keys (Iterable[str], optional): Публичные ключи пиров пула.
+
+    Returns:
+        ReconcilePlan: План сверки.
+    """
+    plan = ReconcilePlan()
+    known: dict[int | None, set[str]] = {server_id: set() for server_id in servers_peers}
+
+    for config in configs:
+        server_peers = servers_peers.get(config.server_id)
+        if server_peers is None:
+            continue
+        plan.checked += 1
+
+        public_key = config.server_public_key
+        known[config.server_id].add(public_key)
+        peer = server_peers.get(public_key)
+
+        if peer is None:
+            plan.mismatches.append(
+                Mismatch(MismatchKind.missing_on_server, config.server_id, public_key, config)
+            )
+            plan.delete.append(config)
+            continue
+
+        if str(config.address) != peer["allowedips"]:
+            plan.mismatches.append(
+                Mismatch(MismatchKind.address, config.server_id, public_key, config, peer)
+            )
+            continue
+
+        banned, pending = PEER_BANNED[config.freeze.value]
+        if peer["ban"] == banned:
+            if pending:
+                (plan.freeze if banned else plan.unfreeze).append(config)
+        elif pending:
+            (plan.ban if banned else plan.unban).append(config)
+        else:
+            plan.mismatches.append(
+                Mismatch(MismatchKind.ban_state, config.server_id, public_key, config, peer)
+            )
+            (plan.freeze if peer["ban"] else plan.unfreeze).append(config)
+
+    pool_keys = set(pool_keys)
+    for server_id, server_peers in servers_peers.items():
+        for public_key in server_peers.keys() - known[server_id] - pool_keys:
+            plan.mismatches.append(
+                Mismatch(
+                    MismatchKind.missing_in_db,
+                    server_id,
+                    public_key,
+                    peer=server_peers[public_key],
+                )
+            )
+
+    return plan
+
+
+def plan_thaw(configs: Iterable, limit: int) -> tuple[list, list]:
+    """Делит простаивающие конфигурации пользователя по лимиту тарифа.
+
+    Лимит занимают первые по id конфигурации пользователя (как в функции БД
+    `unfreeze_configs`), независимо от шага заморозки.
+
+    Args:
+        configs (Iterable[WgConfig]): Все конфигурации пользователя.
+        limit (int): Допустимое количество конфигураций (`settings.acceptable_config`).
+
+    Returns:
+        tuple[list[WgConfig], list[WgConfig]]: Простаивающие конфигурации в пределах
+        лимита (размораживаются) и сверх него (остаются замороженными).
+    """
+    thaw, overflow = [], []
+    for n, config in enumerate(sorted(configs, key=lambda config: config.id)):
+        if config.freeze.value == "idle":
+            (thaw if n < limit else overflow).append(config)
+    return thaw, overflow
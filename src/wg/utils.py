@@ -1,14 +1,10 @@
 import asyncio
 import logging
-import logging.config
 import os
 import sys
-from re import escape
-from time import time
+from ipaddress import IPv4Interface
 from typing import Literal
 
-import asyncssh
-from asyncssh import SSHClientConnection
 from pydantic import validate_call
 
 sys.path.insert(1, os.path.join("C:\\code\\vpn_dan_bot\\src"))
@@ -16,11 +12,17 @@ sys.path.insert(1, os.path.join("C:\\code\\vpn_dan_bot\\src"))
 from core.config import settings
 from core.exceptions import WireguardError
 from core.metric import async_speed_metric
-from wg.connect import WgConnection
+from wg.cluster import WgCluster, default_node
+from wg.connect import WgConnectionPool
+from wg.ipalloc import IPAllocator
+from wg.keys import KeyPool
 
 logger = logging.getLogger("asyncssh")
 
-SSH = WgConnection()
+SSH = WgConnectionPool()
+CLUSTER = WgCluster(default_node(SSH))
+IPS = IPAllocator(settings.wg_network, reserved=settings.wg_reserved)
+KEYS = KeyPool()
 
 
 class WgServerTools:
@@ -28,75 +30,61 @@ class WgServerTools:
 
     Этот класс предоставляет методы для добавления, блокировки и разблокировки пиров,
     а также для получения информации о состоянии сервера WireGuard.
-    """
+    С сервером класс работает через драйвер узла (`WgNode.backend`), операции
+    выполняются в очереди узла с приоритетом класса задачи (`WgNode.ops`).
 
-    peer_counter = "~/Scripts/LastPeerAddress"
+    Args:
+        server_id (int | None, optional): Сервер кластера (None - сервер по умолчанию).
+            Если сервер не указан, для добавления пира (`move_user("add")`) он
+            выбирается `CLUSTER.place`.
+    """
 
-    def __init__(self) -> None:
+    def __init__(self, server_id: int | None = None) -> None:
         """Инициализирует экземпляр WgServerTools.
 
-        Устанавливает значения для приватного и публичного ключей, а также счетчика пиров.
+        Устанавливает узел кластера, значения для приватного и публичного ключей,
+        а также адреса пира.
         """
+        self.server_id = server_id
+        self.node = CLUSTER.get(server_id)
         self.private_key: str = None
         self.public_key: str = None
-        self.countpeers: int = None
+        self.address: IPv4Interface = None
 
-    async def create_peer(self, conn: SSHClientConnection):
-        """Создает нового пира на сервере WireGuard.
+    async def __call(self, op: str, *args, **kwargs):
+        """Выполняет операцию драйвера узла в очереди операций узла (`WgNode.ops`).
 
-        Эта функция генерирует ключи для нового пира и добавляет его в конфигурацию сервера.
+        Приоритет операции определяется классом текущей задачи (`wg.ops.op_class`).
+        """
+        async with self.node.ops.acquire():
+            return await getattr(self.node.backend, op)(*args, **kwargs)
 
-        Args:
-            conn (SSHClientConnection): Установленное SSH-соединение с сервером.
+    async def create_peer(self):
+        """Создает нового пира на сервере WireGuard.
+
+        Эта функция выделяет адрес пира (`IPS`), берет пару ключей из пула (`KEYS`)
+        и добавляет пира в конфигурацию сервера. При ошибке адрес остается занятым
+        до следующей загрузки распределителя (`load_addresses`): он мог попасть на сервер.
 
         Raises:
             WireguardError: Если возникла ошибка при добавлении пира.
+            AddressPoolError: Если в подсети не осталось свободных адресов.
         """
-        try:
-            cmd = (
-                "tmp_private_key=$(wg genkey)",
-                "tmp_public_key=$(echo $tmp_private_key | wg pubkey)",
-                "echo $tmp_private_key",
-                "echo $tmp_public_key",
-                # f'flock {self.peer_counter} --command \'printf "%d" "$(cat {self.peer_counter})"+1 > {self.peer_counter} && cat {self.peer_counter}\'',
-                f"flock {self.peer_counter} --command '~/Scripts/IPgen.py --file={self.peer_counter} && cat {self.peer_counter}' ",
-                f'tmp_allowed_ips="$(cat {self.peer_counter})/32"',
-                f"echo {escape(settings.WG_PASS.get_secret_value())} | sudo -S ~/Scripts/pywg.py $tmp_public_key -ips=$tmp_allowed_ips --raises",
-            )
-            completed_proc = await conn.run("\n" + "\n".join(cmd), check=True)
-            keys = completed_proc.stdout.strip("\n").split("\n")
-            self.private_key, self.public_key, self.countpeers, *_ = keys
-            logger.info(completed_proc.stderr)
-
-        except (OSError, asyncssh.Error) as e:
-            logger.exception(
-                "Сбой при добавлении пира в конфигурацию сервера wireguard"
-            )
-            raise WireguardError from e
+        self.address = IPS.allocate()
+        self.private_key, self.public_key = await KEYS.get()
+
+        await self.__call("add", self.public_key, str(self.address))
 
-    async def ban_peer(self, conn: SSHClientConnection, reverse=False):
+    async def ban_peer(self, reverse=False):
         """Блокирует или разблокирует пира на сервере WireGuard.
 
         Args:
-            conn (SSHClientConnection): Установленное SSH-соединение с сервером.
             reverse (bool): Если True, разблокирует пира, иначе блокирует.
 
         Raises:
             WireguardError: Если возникла ошибка при изменении состояния пира.
         """
-        if reverse:
-            ban = "unban"
-        else:
-            ban = "ban"
-
-        try:
-            cmd = f"echo {escape(settings.WG_PASS.get_secret_value())} | sudo -S ~/Scripts/pywg.py -m {ban} {self.public_key} --raises"
-            completed_proc = await conn.run(f"\n{cmd}", check=True)
-            logger.info(completed_proc.stderr)
-
-        except (OSError, asyncssh.Error) as e:
-            logger.exception("Сбой при изменении пира в конфигурации сервера wireguard")
-            raise WireguardError from e
+        await self.__call("ban", self.public_key, ban=not reverse)
 
     def create_db_wg_model(self, user_id):
         """Создает модель базы данных для нового пира.
@@ -110,34 +98,14 @@ class WgServerTools:
         self.user_config = dict(
             user_id=user_id,
             user_private_key=self.private_key,
-            address=f"{self.countpeers}/32",
+            address=str(self.address),
             server_public_key=self.public_key,
+            server_id=self.node.id,
+            endpoint_ip=self.node.endpoint_ip,
+            endpoint_port=self.node.endpoint_port,
         )
         return self.user_config
 
-    async def check_connection(self):
-        """Проверяет и устанавливает соединение с сервером.
-
-        Если соединение закрыто, то повторно подключается к серверу.
-
-        Returns:
-            SSHClientConnection: Установленное SSH-соединение.
-
-        Raises:
-            WireguardError: Если не удалось установить соединение.
-        """
-        conn = SSH.connection
-
-        if conn.is_closed():
-            await SSH.connect()
-            conn = SSH.connection
-            try:
-                assert conn is SSH.connection
-                assert not conn.is_closed()
-            except AssertionError as e:
-                raise WireguardError from e
-        return conn
-
     @async_speed_metric
     @validate_call
     async def move_user(
@@ -159,134 +127,317 @@ class WgServerTools:
         Raises:
             WireguardError: Если возникла ошибка при выполнении действия.
         """
-        conn = await self.check_connection()
+        if move == "add" and self.server_id is None:
+            self.node = CLUSTER.place()
 
         match move:
             case "add":
-                await self.create_peer(conn)
+                await self.create_peer()
                 usr_cfg = self.create_db_wg_model(user_id)
                 logger.info(f"{usr_cfg['address']=}")
                 return usr_cfg
             case "ban":
                 self.public_key = user_pubkey
-                await self.ban_peer(conn)
+                await self.ban_peer()
             case "unban":
                 self.public_key = user_pubkey
-                await self.ban_peer(conn, reverse=True)
+                await self.ban_peer(reverse=True)
+
+    @async_speed_metric
+    @validate_call
+    async def move_users(
+        self,
+        add: list[tuple[str, str]] = [],
+        ban: list[str] = [],
+        unban: list[str] = [],
+        delete: list[str] = [],
+    ):
+        """Пакетно добавляет, блокирует, разблокирует и удаляет пиров.
+
+        Все операции передаются на сервер одной командой (`pywg.py --batch`)
+        и применяются под одной блокировкой конфигурации.
+
+        Args:
+            add (list[tuple[str, str]], optional): Пары (публичный ключ, адрес) новых пиров.
+            ban (list[str], optional): Публичные ключи пиров для блокировки.
+            unban (list[str], optional): Публичные ключи пиров для разблокировки.
+            delete (list[str], optional): Публичные ключи пиров для удаления.
+
+        Returns:
+            list[dict]: Результаты операций вида
+            {"mode": ..., "pubkey": ..., "status": "done" | "skip" | "fail", "error": ...}.
+            "skip" означает, что пир уже находился в нужном состоянии.
+
+        Raises:
+            WireguardError: Если возникла ошибка при выполнении пакета.
+        """
+        operations = [
+            {"mode": "new", "pubkey": pubkey, "allowed_ips": allowed_ips}
+            for pubkey, allowed_ips in add
+        ]
+        for mode, pubkeys in (("ban", ban), ("unban", unban), ("del", delete)):
+            operations.extend({"mode": mode, "pubkey": pubkey} for pubkey in pubkeys)
+
+        if not operations:
+            return []
+
+        results: list[dict] = await self.__call("batch", operations)
+
+        failed = [result for result in results if result["status"] == "fail"]
+        if failed:
+            logger.warning(
+                f"Не применено {len(failed)} из {len(results)} операций",
+                extra={"failed": failed},
+            )
+        return results
+
+    async def create_pool_peers(self, count: int):
+        """Создает заблокированных пиров для пула одной пакетной операцией.
+
+        Адреса и ключи выделяются локально (`IPS`, `KEYS`). Пир, который
+        добавился, но не заблокировался, удаляется с сервера. Адрес пира,
+        который не добавился, освобождается, если только он не занят на сервере.
+
+        Args:
+            count (int): Количество пиров.
+
+        Returns:
+            list[dict]: Созданные пиры вида
+            {"user_private_key": ..., "server_public_key": ..., "address": ..., "server_id": ...}.
+
+        Raises:
+            WireguardError: Если возникла ошибка при выполнении пакета.
+            AddressPoolError: Если в подсети не осталось свободных адресов.
+        """
+        peers = {}
+        for _ in range(count):
+            private_key, public_key = await KEYS.get()
+            peers[public_key] = dict(
+                user_private_key=private_key,
+                server_public_key=public_key,
+                address=str(IPS.allocate()),
+                server_id=self.node.id,
+            )
+
+        results = await self.move_users(
+            add=[(pubkey, peer["address"]) for pubkey, peer in peers.items()],
+            ban=list(peers),
+        )
+        results = {(result["mode"], result["pubkey"]): result for result in results}
+
+        created, orphans = [], []
+        for pubkey, peer in peers.items():
+            added = results.get(("new", pubkey), {})
+            if added.get("status") != "done":
+                # Адрес, уже занятый на сервере, остается занятым в распределителе
+                if not str(added.get("error")).startswith("Address "):
+                    IPS.release(peer["address"])
+            elif results.get(("ban", pubkey), {}).get("status") != "done":
+                orphans.append(pubkey)
+            else:
+                created.append(peer)
+
+        if orphans:
+            logger.warning(f"Не заблокировано {len(orphans)} пиров пула, удаление")
+            for result in await self.move_users(delete=orphans):
+                if result["status"] == "done":
+                    IPS.release(peers[result["pubkey"]]["address"])
+
+        return created
+
+    async def sync_peers(
+        self, peers: list[dict] = None, digest: str = None, force: bool = False
+    ):
+        """Приводит конфигурацию сервера к желаемому набору пиров.
+
+        Сервер сравнивает хэш набора с последним примененным и ничего не делает,
+        если набор не изменился; иначе выполняет недостающие операции и
+        обновляет интерфейс одной командой `wg syncconf`.
+
+        Args:
+            peers (list[dict], optional): Пиры вида {"pubkey", "allowed_ips", "ban"};
+                None - только проверить, применен ли набор с хэшем `digest`.
+            digest (str, optional): Хэш набора (`pywg.desired_hash`).
+            force (bool, optional): Синхронизировать, даже если набор не изменился.
+
+        Returns:
+            dict: {"status": "unchanged" | "stale" | "synced", "hash": ...}; для
+            "synced" также "changes" (количество операций по режимам) и "failed".
+
+        Raises:
+            WireguardError: Если возникла ошибка при синхронизации.
+        """
+        result: dict = await self.__call("sync", peers, digest, force)
+        if result.get("failed"):
+            logger.warning(
+                f"Не применено {len(result['failed'])} операций синхронизации",
+                extra={"failed": result["failed"]},
+            )
+        return result
 
     async def get_peer_list(self):
         """Получает список пиров на сервере WireGuard.
 
         Returns:
-            list: Список пиров с их конфигурациями.
+            list[dict]: Пиры вида {"publickey": ..., "allowedips": ..., "ban": bool}.
 
         Raises:
             WireguardError: Если возникла ошибка при получении списка пиров.
         """
-        conn = await self.check_connection()
+        peers: list[dict] = await self.__call("peers")
+        logger.info(f"Got {len(peers)} peer's")
+        return peers
+
+    async def get_peer_changes(self, revision: int = None, epoch: str = None):
+        """Получает изменения пиров после известной ревизии журнала сервера.
+
+        Args:
+            revision (int, optional): Последняя полученная ревизия (None - полный список).
+            epoch (str, optional): Эпоха журнала, к которой относится ревизия.
+
+        Returns:
+            dict: {"epoch", "revision", "full", "peers", "removed"}. При full=True
+            в peers - все пиры, иначе только измененные после `revision`;
+            removed - ключи удаленных пиров.
+
+        Raises:
+            WireguardError: Если возникла ошибка при получении изменений.
+        """
+        feed: dict = await self.__call("changes", revision, epoch)
+
+        logger.info(
+            f"Peer feed r{feed['revision']}: {len(feed['peers'])} changed, "
+            f"{len(feed['removed'])} removed, full={feed['full']}"
+        )
+        return feed
+
+    async def get_peer_stats(self):
+        """Получает статистику пиров работающего интерфейса (`wg show wg1 dump`).
+
+        Returns:
+            list[dict]: Пиры вида {"publickey": str, "handshake": int, "rx": int, "tx": int},
+            где handshake - время последнего рукопожатия (unix time, 0 - не было),
+            rx/tx - счетчики трафика интерфейса (байт).
+
+        Raises:
+            WireguardError: Если возникла ошибка при получении статистики.
+        """
+        dump = await self.__call("dump")
         try:
-            cmd = f"echo {escape(settings.WG_PASS.get_secret_value())} | sudo -S ~/Scripts/pywg.py -l --raises"
-            completed_proc = await conn.run(f"\n{cmd}", check=True)
-            peers = completed_proc.stdout.strip("\n").split("[Peer]")
-
-            clean_peers = []
-            for peer in peers:
-                clean_peer = {
-                    line[: line.find("=")].strip(" ").lower(): line[
-                        line.find("=") + 1 :
-                    ].strip(" ")
-                    for line in peer.splitlines()
-                    if "=" in line
-                }
-
-                if clean_peer:
-                    if "ban" in peer.lower():
-                        clean_peer["ban"] = True
-                    else:
-                        clean_peer["ban"] = False
-
-                    clean_peers.append(clean_peer)
-
-        except (OSError, asyncssh.Error) as e:
-            logger.exception("Сбой при получении списка пиров wireguard")
+            stats = []
+            # Первая строка - интерфейс, далее: ключ, psk, endpoint, allowed-ips,
+            # рукопожатие, rx, tx, keepalive
+            for line in dump.strip("\n").split("\n")[1:]:
+                public_key, _, _, _, handshake, rx, tx, *_ = line.split("\t")
+                stats.append(
+                    dict(
+                        publickey=public_key,
+                        handshake=int(handshake),
+                        rx=int(rx),
+                        tx=int(tx),
+                    )
+                )
+
+        except ValueError as e:
+            logger.exception("Сбой при получении статистики пиров wireguard")
             raise WireguardError from e
         else:
-            logger.info(f"Got {len(clean_peers)} peer's")
-
-            return clean_peers
+            return stats
 
     async def get_server_status(self):
         """Получает статус сервера WireGuard.
 
         Returns:
             str: Статус сервера ("active" или "inactive").
-
-        Raises:
-            WireguardError: Если возникла ошибка при получении статуса сервера.
         """
-        conn = await self.check_connection()
         try:
-            cmd = f"echo {escape(settings.WG_PASS.get_secret_value())} | sudo -S systemctl status wg-quick@wg1.service | grep Active:"
-            completed_proc = await conn.run(f"\n{cmd}", check=True)
-            _, status, *_ = completed_proc.stdout.strip("\n ").split()
+            status = (await self.get_server_probe())["status"]
 
-        except (OSError, asyncssh.Error):
-            logger.exception("Сбой при получении статуса сервера wireguard")
+        except WireguardError:
             logger.info("Server status: inactive")
             return "inactive"
         else:
             logger.info(f"Server status: {status}")
             return status
 
-    async def get_server_cpu_usage(self):
+    async def get_server_cpu_usage(self, interval: float = 1):
         """Получает загрузку CPU сервера WireGuard.
 
+        Загрузка считается по двум снимкам счетчиков `/proc/stat` с интервалом `interval`.
+
         Returns:
             str: Процент загрузки CPU.
 
         Raises:
             WireguardError: Если возникла ошибка при получении загрузки CPU.
         """
-        conn = await self.check_connection()
-        try:
-            cmd = "top -bn2 | grep '%Cpu' | tail -1 | grep -P '(....|...) id,'|awk '{print 100-$8 \"%\"}'"
-            completed_proc = await conn.run(f"\n{cmd}", check=True)
-            usage = completed_proc.stdout.strip("\n ")
+        previous = (await self.get_server_probe())["cpu_times"]
+        await asyncio.sleep(interval)
+        current = (await self.get_server_probe())["cpu_times"]
 
-        except (OSError, asyncssh.Error) as e:
-            logger.exception("Сбой при получении загруженности сервера wireguard")
-            logger.info("Server status: inactive")
-            raise WireguardError from e
-        else:
-            logger.info(f"Server cpu usage: {usage}")
-            return usage
+        usage = f"{cpu_percent(previous, current) or 0}%"
+        logger.info(f"Server cpu usage: {usage}")
+        return usage
+
+    async def get_server_probe(self):
+        """Снимает состояние сервера WireGuard одной командой.
+
+        Returns:
+            dict: Счетчики CPU из `/proc/stat` ("cpu_times"), состояние службы
+            wg-quick@wg1 ("status") и количество пиров интерфейса ("peers").
 
+        Raises:
+            WireguardError: Если возникла ошибка при получении состояния сервера.
+        """
+        probe = await self.__call("probe")
+        logger.debug(f"Server probe: {probe['status']}, {probe['peers']} peers")
+        return probe
 
-async def test_100():
-    """Тестирует производительность методов WgServerTools.
 
-    Выполняет несколько асинхронных вызовов для проверки производительности
-    методов получения загрузки CPU сервера.
+def cpu_percent(previous: tuple, current: tuple):
+    """Загрузка CPU (%) между двумя снимками счетчиков `/proc/stat`.
 
-    Raises:
-        Exception: Если возникает ошибка при выполнении теста.
+    Args:
+        previous (tuple[int, ...]): Предыдущий снимок (user nice system idle iowait ...).
+        current (tuple[int, ...]): Текущий снимок.
+
+    Returns:
+        float: Загрузка CPU или None, если счетчики не изменились.
     """
-    wg = WgServerTools()
-    start = time()
+    # guest и guest_nice уже учтены в user и nice
+    previous, current = previous[:8], current[:8]
+    total = sum(current) - sum(previous)
+    if total <= 0:
+        return None
+    idle = sum(current[3:5]) - sum(previous[3:5])
+    return round(100 * (total - idle) / total, 1)
 
-    await SSH.connect()
-    coros = [wg.get_server_cpu_usage() for _ in range(1)]
-    coros_gen = time() - start
 
-    await asyncio.gather(*coros)
+async def load_addresses(addresses: list):
+    """Загружает занятые адреса в распределитель `IPS`.
 
-    end = time() - start - coros_gen
+    К адресам из БД добавляются адреса пиров, уже существующих на серверах
+    кластера (например, выданных до перехода на распределитель).
 
-    print(f"{coros_gen=}  {end=}")
+    Args:
+        addresses (list): Адреса конфигураций из БД.
+    """
+    addresses = list(addresses)
 
+    async def node_peers(node):
+        return await WgServerTools(node.id).get_peer_list()
 
-if __name__ == "__main__":
-    logging.config.fileConfig("log.ini", disable_existing_loggers=False)
+    for server_id, peers in (await CLUSTER.fan_out(node_peers)).items():
+        if isinstance(peers, Exception):
+            logger.warning(
+                f"Не удалось получить адреса пиров с сервера wireguard {server_id}"
+            )
+        else:
+            addresses.extend(
+                peer["allowedips"] for peer in peers if "allowedips" in peer
+            )
 
-    loop = asyncio.get_event_loop()
-    loop.run_until_complete(test_100())
+    foreign = IPS.update(addresses)
+    if foreign:
+        logger.warning(f"Адреса вне подсети {IPS.network}: {foreign}")
+    logger.info(f"IP allocator: {IPS.used} used, {IPS.free} free")
@@ -0,0 +1,151 @@
+"""Бенчмарк кодирования объектов моделей в кэше Redis.
+
+Сравнивает прежний формат (хэш строковых значений колонок `__ustr_dict__`,
+восстановление объекта валидацией модели) с кодированием `ModelCodec`
+(одно значение msgpack, восстановление без валидации) для UserData,
+WgConfig и Transactions: размер значения и время записи и чтения объекта.
+С `--redis` размер измеряется в Redis (`MEMORY USAGE`) по временным ключам.
+
+    python bench_cache.py --objects 20000
+    python bench_cache.py --redis redis://localhost:6379/15
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+from decimal import Decimal
+from ipaddress import IPv4Address, IPv4Interface
+from time import perf_counter
+from uuid import uuid4
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(1, os.path.join(TESTS, "..", "src"))
+
+from db.models import (FreezeSteps, Transactions, UserActivity, UserData,
+                       WgConfig)
+from db.utils.redis import CODECS
+
+
+def samples(n):
+    """Объекты моделей с типичными значениями."""
+    user = UserData()
+    for col, value in dict(
+        id=n,
+        telegram_id=5766455756 + n,
+        telegram_name=f"user_name_{n}",
+        admin=False,
+        active=UserActivity.active,
+        stage=1,
+        balance=Decimal("153.25"),
+        free=False,
+        mute=False,
+        updated=datetime(2024, 11, 2, 10, 30, 15, 123456, tzinfo=timezone.utc),
+    ).items():
+        setattr(user, col, value)
+
+    config = WgConfig()
+    for col, value in dict(
+        id=n,
+        user_id=5766455756 + n,
+        name=f"config{n}",
+        freeze=FreezeSteps.no,
+        user_private_key="GLzrInt9vGguqXi8r+Dli6K5CCzSe/5Zg8OH8wfk4V8=",
+        address=IPv4Interface(f"10.1.{n // 256 % 256}.{n % 256}/32"),
+        dns="10.0.0.1,9.9.9.9",
+        server_public_key="xlaQzDNN/L5VWGVfW2r4pR9ufa0tr0kXwA1U2kilNho=",
+        allowed_ips=IPv4Interface("0.0.0.0/0"),
+        endpoint_ip=IPv4Address("185.242.107.63"),
+        endpoint_port=51830,
+        server_id=None,
+    ).items():
+        setattr(config, col, value)
+
+    transaction = Transactions()
+    for col, value in dict(
+        id=n,
+        user_id=5766455756 + n,
+        date=datetime(2024, 11, 2, 10, 30, 15, 123456, tzinfo=timezone.utc),
+        amount=150.0,
+        label=uuid4(),
+        transaction_id=None,
+        sha1_hash=None,
+        sender=None,
+        withdraw_amount=None,
+        transaction_reference=f"https://yoomoney.ru/transfer/{n}",
+    ).items():
+        setattr(transaction, col, value)
+
+    return {UserData: user, WgConfig: config, Transactions: transaction}
+
+
+def timeit(call, items):
+    start = perf_counter()
+    for item in items:
+        call(item)
+    return (perf_counter() - start) * 1e6 / len(items)
+
+
+async def redis_memory(url, model, obj, fields):
+    """Размер хэша и закодированного значения в Redis (байт)."""
+    from redis.asyncio import Redis
+
+    redis = Redis.from_url(url)
+    prefix = f"bench:{model.__tablename__}:{uuid4().hex}"
+    try:
+        await redis.hset(f"{prefix}:hash", mapping=fields)
+        await redis.set(f"{prefix}:codec", CODECS[model.__tablename__].encode(obj))
+        return (
+            await redis.memory_usage(f"{prefix}:hash"),
+            await redis.memory_usage(f"{prefix}:codec"),
+        )
+    finally:
+        await redis.delete(f"{prefix}:hash", f"{prefix}:codec")
+        await redis.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--objects", type=int, default=20000, help="Объектов каждой модели")
+    parser.add_argument("--redis", help="URL Redis для измерения MEMORY USAGE")
+    args = parser.parse_args()
+
+    objects = [samples(n) for n in range(args.objects)]
+    print(
+        f"{'model':13} {'hash B':>7} {'codec B':>8} {'saved':>6}  "
+        f"{'write us':>9} {'codec':>7}  {'read us':>8} {'codec':>7}"
+    )
+    for model in (UserData, WgConfig, Transactions):
+        codec = CODECS[model.__tablename__]
+        items = [sample[model] for sample in objects]
+        fields = [item.__ustr_dict__ for item in items]
+        encoded = [codec.encode(item) for item in items]
+
+        hash_size = sum(len(col) + len(value.encode()) for col, value in fields[0].items())
+        codec_size = len(encoded[0])
+        if args.redis:
+            hash_size, codec_size = asyncio.run(
+                redis_memory(args.redis, model, items[0], fields[0])
+            )
+
+        write_hash = timeit(lambda item: item.__ustr_dict__, items)
+        write_codec = timeit(codec.encode, items)
+        # Прежний формат: строки "None" заменялись на None перед валидацией
+        read_hash = timeit(
+            lambda values: model(
+                **{k: None if v == "None" else v for k, v in values.items()}
+            ),
+            fields,
+        )
+        read_codec = timeit(codec.build, encoded)
+
+        print(
+            f"{model.__name__:13} {hash_size:>7} {codec_size:>8} "
+            f"{100 * (1 - codec_size / hash_size):>5.0f}%  "
+            f"{write_hash:>9.1f} {write_codec:>7.1f}  {read_hash:>8.1f} {read_codec:>7.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""Бенчмарк операций WireGuard через локальный SSH-сервер.
+
+Поднимает сервер asyncssh на 127.0.0.1 с временным домашним каталогом:
+`~/Scripts/pywg.py` работает с временным wg1.conf, вместо `wg`, `sudo`
+и `systemctl` подставляются заглушки. Операции выполняются SSH-драйвером бота
+(`SshBackend`) - без агента (pywg.py на каждую команду) и через агент.
+
+Для каждого режима, количества пиров и уровня конкурентности измеряются
+пропускная способность и задержки (p50/p99) операций add, ban, unban, list.
+Результаты записываются в JSON; с `--compare` выводится разница с прошлым запуском.
+
+    python bench_wg.py --peers 100,1000 --concurrency 1,8 --output bench.json
+    python bench_wg.py --compare bench.json
+"""
+
+import argparse
+import asyncio
+import getpass
+import json
+import os
+import platform
+import stat
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+from time import perf_counter
+
+import asyncssh
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(TESTS, "..", "src")
+PYWG = os.path.join(SRC, "wg", "pywg.py")
+FAKE_WG = os.path.join(TESTS, "fake_wg.py")
+
+sys.path.insert(1, SRC)
+sys.path.insert(2, os.path.join(SRC, "wg"))
+
+from core.config import settings
+from pywg import PeerTable
+from wg.backend import SshBackend
+from wg.connect import WgConnection, WgConnectionPool
+
+OPS = ("add", "ban", "unban", "list")
+
+CONF = """[Interface]
+Address = 10.1.0.1/16
+ListenPort = 51820
+PrivateKey = cHJpdmF0ZQ==
+"""
+
+STUBS = {
+    "sudo": """#!/bin/sh
+# Заглушка sudo: пропускает ключи, пароль (-S) читает из stdin
+while [ $# -gt 0 ]; do
+    case "$1" in
+        -S) read -r _ ;;
+        -p) shift ;;
+        -*) ;;
+        *) break ;;
+    esac
+    shift
+done
+exec "$@"
+""",
+    "systemctl": """#!/bin/sh
+echo active
+""",
+    "wg": f"""#!/bin/sh
+exec {sys.executable} {FAKE_WG} "$@"
+""",
+}
+
+
+def write_script(path, text):
+    with open(path, "w") as file:
+        file.write(text)
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+
+
+def address(n):
+    host = n + 2
+    return f"10.{1 + host // 65536}.{host // 256 % 256}.{host % 256}/32"
+
+
+class Server:
+    """Локальный SSH-сервер с временным окружением WireGuard на `peers` пиров."""
+
+    def __init__(self, tmp, peers):
+        self.home = tmp
+        self.bin = os.path.join(tmp, "bin")
+        self.conf = os.path.join(tmp, "wg1.conf")
+        self.env = dict(
+            os.environ,
+            HOME=tmp,
+            PATH=f"{self.bin}:{os.environ['PATH']}",
+            FAKE_WG_STATE=os.path.join(tmp, "state.json"),
+            FAKE_WG_LOG=os.devnull,
+        )
+
+        os.makedirs(self.bin)
+        os.makedirs(os.path.join(tmp, "Scripts"))
+        for name, text in STUBS.items():
+            write_script(os.path.join(self.bin, name), text)
+        write_script(
+            os.path.join(tmp, "Scripts", "pywg.py"),
+            f'#!/bin/sh\nexec {sys.executable} {PYWG} --wgpath {self.conf} --wg {self.bin}/wg "$@"\n',
+        )
+
+        table = PeerTable.parse(CONF)
+        for n in range(peers):
+            table.add(f"seed{n}=", address(n))
+        table.dump(self.conf)
+        subprocess.run(
+            [os.path.join(self.bin, "wg"), "syncconf", "wg1", self.conf],
+            env=self.env,
+            check=True,
+        )
+
+        self.client_key = asyncssh.generate_private_key("ssh-ed25519")
+        self.authorized_keys = os.path.join(tmp, "authorized_keys")
+        with open(self.authorized_keys, "wb") as file:
+            file.write(self.client_key.export_public_key())
+        self.acceptor = None
+
+    async def handle(self, process: asyncssh.SSHServerProcess):
+        local = subprocess.Popen(
+            process.command,
+            shell=True,
+            executable="/bin/bash",
+            cwd=self.home,
+            env=self.env,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        await process.redirect(stdin=local.stdin, stdout=local.stdout, stderr=local.stderr)
+        returncode = await asyncio.get_running_loop().run_in_executor(None, local.wait)
+        await process.stdout.drain()
+        await process.stderr.drain()
+        process.exit(returncode)
+
+    async def start(self):
+        self.acceptor = await asyncssh.create_server(
+            asyncssh.SSHServer,
+            "127.0.0.1",
+            0,
+            server_host_keys=[asyncssh.generate_private_key("ssh-ed25519")],
+            authorized_client_keys=self.authorized_keys,
+            process_factory=self.handle,
+        )
+        return self.acceptor.get_port()
+
+    async def close(self):
+        self.acceptor.close()
+        await self.acceptor.wait_closed()
+
+
+class BenchConnection(WgConnection):
+    """Соединение с локальным сервером бенчмарка (порт и ключ вместо настроек)."""
+
+    def __init__(self, host, port, client_key) -> None:
+        super().__init__(host)
+        self.port = port
+        self.client_key = client_key
+
+    async def connect(self):
+        self.connection = await asyncssh.connect(
+            self.host,
+            port=self.port,
+            username=getpass.getuser(),
+            client_keys=[self.client_key],
+            known_hosts=None,
+        )
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def measure(call, count, concurrency):
+    """Выполняет `count` вызовов `call(i)` не более чем по `concurrency` одновременно.
+
+    Returns:
+        tuple[float, list[float]]: Общее время и задержки вызовов (сек).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i):
+        async with semaphore:
+            start = perf_counter()
+            await call(i)
+            latencies.append(perf_counter() - start)
+
+    start = perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return perf_counter() - start, latencies
+
+
+async def run_case(mode, peers, concurrency_levels, ops):
+    """Измеряет операции в одном режиме на свежем окружении с `peers` пирами."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        server = Server(tmp, peers)
+        port = await server.start()
+
+        settings.wg_agent = mode == "agent"
+        settings.wg_agent_socket = None
+        pool = WgConnectionPool(
+            host="127.0.0.1",
+            connection_factory=lambda host: BenchConnection(host, port, server.client_key),
+        )
+        backend = SshBackend(pool)
+        await backend.connect()
+
+        try:
+            for concurrency in concurrency_levels:
+                keys = [f"bench{concurrency}x{i}=" for i in range(ops)]
+                calls = {
+                    "add": lambda i: backend.add(
+                        keys[i], address(peers + concurrency * ops + i)
+                    ),
+                    "ban": lambda i: backend.ban(keys[i]),
+                    "unban": lambda i: backend.ban(keys[i], ban=False),
+                    "list": lambda i: backend.peers(),
+                }
+                for op in OPS:
+                    elapsed, latencies = await measure(calls[op], ops, concurrency)
+                    results.append(
+                        dict(
+                            mode=mode,
+                            peers=peers,
+                            concurrency=concurrency,
+                            op=op,
+                            ops=ops,
+                            seconds=round(elapsed, 4),
+                            throughput=round(ops / elapsed, 2),
+                            p50_ms=round(percentile(latencies, 0.5) * 1000, 2),
+                            p99_ms=round(percentile(latencies, 0.99) * 1000, 2),
+                        )
+                    )
+                    print(
+                        f"{mode:6} peers={peers:<6} c={concurrency:<3} {op:6} "
+                        f"{results[-1]['throughput']:>8.1f} op/s  "
+                        f"p50={results[-1]['p50_ms']:>8.1f} ms  p99={results[-1]['p99_ms']:>8.1f} ms"
+                    )
+        finally:
+            await backend.close()
+            await server.close()
+    return results
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=TESTS,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_baseline(path):
+    with open(path) as file:
+        return {
+            (item["mode"], item["peers"], item["concurrency"], item["op"]): item
+            for item in json.load(file)["results"]
+        }
+
+
+def compare(results, baseline):
+    """Выводит изменение пропускной способности и p99 относительно прошлого запуска."""
+    print("\nСравнение с прошлым запуском:")
+    for item in results:
+        old = baseline.get((item["mode"], item["peers"], item["concurrency"], item["op"]))
+        if old is None:
+            continue
+        print(
+            f"{item['mode']:6} peers={item['peers']:<6} c={item['concurrency']:<3} {item['op']:6} "
+            f"throughput {100 * (item['throughput'] / old['throughput'] - 1):+6.1f}%  "
+            f"p99 {100 * (item['p99_ms'] / old['p99_ms'] - 1):+6.1f}%"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--peers", default="100,1000,5000", help="Количество пиров (через запятую)")
+    parser.add_argument("--concurrency", default="1,8,32", help="Уровни конкурентности")
+    parser.add_argument("--ops", type=int, default=64, help="Операций каждого вида")
+    parser.add_argument("--modes", default="cli,agent", help="Режимы: cli, agent")
+    parser.add_argument("--output", default="bench_wg.json", help="Файл результатов")
+    parser.add_argument("--compare", help="Результаты прошлого запуска для сравнения")
+    args = parser.parse_args()
+
+    peers_levels = [int(value) for value in args.peers.split(",")]
+    concurrency_levels = [int(value) for value in args.concurrency.split(",")]
+
+    baseline = load_baseline(args.compare) if args.compare else None
+
+    results = []
+    for mode in args.modes.split(","):
+        for peers in peers_levels:
+            results.extend(asyncio.run(run_case(mode, peers, concurrency_levels, args.ops)))
+
+    report = dict(
+        meta=dict(
+            revision=revision(),
+            date=datetime.now().isoformat(timespec="seconds"),
+            python=platform.python_version(),
+            platform=platform.platform(),
+            agent_coalesce=settings.wg_agent_coalesce,
+        ),
+        results=results,
+    )
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+    print(f"\nРезультаты записаны в {args.output}")
+
+    if baseline is not None:
+        compare(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
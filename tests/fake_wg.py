@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""Заглушка утилиты `wg` для тестов без wireguard.
+
+Состояние интерфейсов хранится в JSON-файле (FAKE_WG_STATE), каждый вызов
+дописывается в журнал (FAKE_WG_LOG). Поддерживаются команды:
+`set`, `syncconf`, `show <iface> peers`, `show <iface> dump`.
+"""
+
+import json
+import os
+import sys
+
+STATE = os.environ.get("FAKE_WG_STATE", "/tmp/fake_wg_state.json")
+LOG = os.environ.get("FAKE_WG_LOG", "/tmp/fake_wg.log")
+
+
+def load():
+    if os.path.exists(STATE):
+        with open(STATE) as file:
+            return json.load(file)
+    return {}
+
+
+def save(state):
+    with open(STATE, "w") as file:
+        json.dump(state, file)
+
+
+def parse_conf(path):
+    peers, peer = {}, None
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if line.lower() == "[peer]":
+                peer = {}
+            elif peer is not None and "=" in line:
+                key, _, value = line.partition("=")
+                peer[key.strip().lower()] = value.strip()
+                if "publickey" in peer and "allowedips" in peer:
+                    peers[peer["publickey"]] = {
+                        "allowed_ips": peer["allowedips"],
+                        "keepalive": peer.get("persistentkeepalive"),
+                    }
+    return peers
+
+
+def main(args):
+    with open(LOG, "a") as log:
+        log.write(" ".join(args) + "\n")
+
+    state = load()
+    match args:
+        case ["set", iface, "peer", pubkey, "remove"]:
+            state.setdefault(iface, {}).pop(pubkey, None)
+        case ["set", iface, "peer", pubkey, *options]:
+            peer = state.setdefault(iface, {}).setdefault(pubkey, {})
+            for key, value in zip(options[::2], options[1::2]):
+                peer[key.replace("-", "_").replace("persistent_", "")] = value
+        case ["syncconf", iface, path]:
+            peers = parse_conf(path)
+            for pubkey, peer in state.get(iface, {}).items():
+                if pubkey in peers:
+                    peers[pubkey].update(
+                        {k: v for k, v in peer.items() if k not in peers[pubkey]}
+                    )
+            state[iface] = peers
+        case ["show", iface, "peers"]:
+            print("\n".join(state.get(iface, {})))
+        case ["show", iface, "dump"]:
+            print("private\tpublic\t51820\toff")
+            for pubkey, peer in state.get(iface, {}).items():
+                print(
+                    "\t".join(
+                        (
+                            pubkey,
+                            "(none)",
+                            peer.get("endpoint", "(none)"),
+                            peer["allowed_ips"],
+                            str(peer.get("handshake", 0)),
+                            str(peer.get("rx", 0)),
+                            str(peer.get("tx", 0)),
+                            str(peer.get("keepalive") or "off"),
+                        )
+                    )
+                )
+        case _:
+            print(f"Invalid command: {' '.join(args)}", file=sys.stderr)
+            return 1
+
+    save(state)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,99 @@
+import enum
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from ipaddress import IPv4Address, IPv4Interface, IPv6Interface
+from time import perf_counter
+from uuid import uuid4
+
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from db.codec import ModelCodec
+
+OBJECTS = 20000
+
+
+class Steps(enum.Enum):
+    no = "no"
+    wait_yes = "wait_yes"
+
+
+class Entity:
+    columns = (
+        "id", "name", "active", "balance", "stage", "freeze", "updated", "naive",
+        "label", "address", "endpoint", "network", "server_id",
+    )
+
+    def __init__(self, **values):
+        for col, value in values.items():
+            setattr(self, col, value)
+
+
+def entity(n):
+    return Entity(
+        id=n,
+        name=f"name{n}",
+        active=bool(n % 2),
+        balance=Decimal("1234.50"),
+        stage=0.3,
+        freeze=Steps.wait_yes,
+        updated=datetime(2024, 11, 2, 10, 30, 15, 123456, tzinfo=timezone(timedelta(hours=3))),
+        naive=datetime(2024, 11, 2, 10, 30),
+        label=uuid4(),
+        address=IPv4Interface(f"10.1.{n // 256 % 256}.{n % 256}/32"),
+        endpoint=IPv4Address("185.242.107.63"),
+        network=IPv6Interface("fd00::1/64"),
+        server_id=None,
+    )
+
+
+def main():
+    codec = ModelCodec(7, Entity, Entity.columns, (Steps,))
+
+    # Типы значений восстанавливаются точно, None остается None
+    obj = entity(5)
+    restored = codec.build(codec.encode(obj))
+    for col in Entity.columns:
+        value, expected = getattr(restored, col), getattr(obj, col)
+        assert value == expected and type(value) is type(expected), (col, value, expected)
+    assert restored.updated.utcoffset() == timedelta(hours=3)
+    assert codec.build(codec.encode(entity(0))).updated.tzinfo.utcoffset(None) == timedelta(hours=3)
+    utc = Entity(**{**vars(obj), "updated": datetime(2024, 1, 1, tzinfo=timezone.utc)})
+    assert codec.build(codec.encode(utc)).updated.tzinfo is timezone.utc
+
+    # Значения другой модели, другой схемы и поврежденные не декодируются
+    data = codec.encode(obj)
+    assert ModelCodec(8, Entity, Entity.columns, (Steps,)).decode(data) is None
+    assert ModelCodec(7, Entity, Entity.columns[:-1], (Steps,)).decode(data) is None
+    assert codec.decode(data[:-3]) is None and codec.decode(b"\xc1") is None
+    assert codec.decode(b"plain string") is None
+
+    try:
+        codec.encode(Entity(**{**vars(obj), "server_id": object()}))
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("unsupported type encoded")
+
+    # Одно значение вместо хэша строк
+    strings = {col: str(getattr(obj, col)) for col in Entity.columns}
+    hash_size = sum(len(col) + len(value.encode()) for col, value in strings.items())
+    assert len(data) < hash_size * 0.6, (len(data), hash_size)
+
+    objects = [entity(n) for n in range(OBJECTS)]
+    start = perf_counter()
+    encoded = [codec.encode(obj) for obj in objects]
+    encode = perf_counter() - start
+    start = perf_counter()
+    for value in encoded:
+        codec.build(value)
+    decode = perf_counter() - start
+
+    print(f"size={len(data)} bytes (hash of strings {hash_size} bytes)")
+    print(f"{OBJECTS=}  encode={encode * 1e6 / OBJECTS:.1f} usec/op  build={decode * 1e6 / OBJECTS:.1f} usec/op")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
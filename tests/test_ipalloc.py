@@ -0,0 +1,57 @@
+import os
+import sys
+from ipaddress import IPv4Address, IPv4Interface
+from time import perf_counter
+
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from core.exceptions import AddressPoolError
+from wg.ipalloc import IPAllocator
+
+NETWORK = "10.1.0.0/16"
+
+
+def main():
+    ips = IPAllocator(NETWORK, reserved=["10.1.0.1", "10.1.255.0/24"])
+    assert ips.allocate() == IPv4Interface("10.1.0.2/32")
+    assert "10.1.0.1" in ips and "10.1.0.0" in ips
+
+    start = perf_counter()
+    allocated = [ips.allocate() for _ in range(ips.free)]
+    fill = perf_counter() - start
+    assert len(set(allocated)) == len(allocated)
+    assert all(ip.ip < IPv4Address("10.1.255.0") for ip in allocated)
+
+    try:
+        ips.allocate()
+    except AddressPoolError:
+        pass
+    else:
+        raise AssertionError("pool must be exhausted")
+
+    # Освобожденные адреса выдаются повторно, зарезервированные - никогда
+    assert ips.release("10.1.7.7/32")
+    assert not ips.release("10.1.7.7/32")
+    assert not ips.release("10.1.0.1")
+    assert ips.allocate() == IPv4Interface("10.1.7.7/32")
+
+    start = perf_counter()
+    for ip in allocated[:10000]:
+        ips.release(ip)
+    for _ in range(10000):
+        ips.allocate()
+    churn = perf_counter() - start
+
+    # Загрузка из БД: дыры в занятых адресах выдаются первыми, по возрастанию
+    ips = IPAllocator(NETWORK, reserved=["10.1.0.1"])
+    foreign = ips.update(["10.1.0.2/32", "10.1.0.5/32", "10.1.1.0/32", "192.168.0.1/32"])
+    assert foreign == ["192.168.0.1/32"]
+    assert [str(ips.allocate().ip) for _ in range(3)] == ["10.1.0.3", "10.1.0.4", "10.1.0.6"]
+    assert str(ips.allocate().ip) == "10.1.0.7"
+
+    print(f"fill={len(allocated)} addresses in {fill*1000:.1f} msec  churn={churn*1e6/20000:.2f} usec/op")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
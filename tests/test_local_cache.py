@@ -0,0 +1,149 @@
+import asyncio
+import os
+import sys
+from time import perf_counter, sleep
+
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from db.local_cache import INVALIDATE_CHANNEL, LocalCache
+
+LOOKUPS = 100000
+
+
+class PubSub:
+    """Подписка в памяти: сообщения из очереди подписчика."""
+
+    def __init__(self, redis: "Redis"):
+        self.channel = asyncio.Queue()
+        redis.subscribers.append(self.channel)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def subscribe(self, name):
+        assert name == INVALIDATE_CHANNEL
+
+    async def listen(self):
+        yield {"type": "subscribe", "data": 1}
+        while True:
+            data = await self.channel.get()
+            if data is None:
+                raise ConnectionError("lost")
+            yield {"type": "message", "data": data}
+
+
+class Redis:
+    def __init__(self):
+        self.subscribers: list[asyncio.Queue] = []
+
+    def pubsub(self):
+        return PubSub(self)
+
+    def publish(self, data):
+        for channel in self.subscribers:
+            channel.put_nowait(data)
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+def lru_ttl():
+    cache = LocalCache(2, ttl=0.05)
+    cache.set("a", [1], cache.version)
+    cache.set("b", [2], cache.version)
+    assert cache.get("a") == [1]
+    cache.set("c", [3], cache.version)
+    # Вытесняется давно не использованная запись
+    assert cache.get("b") is None and cache.get("a") == [1] and cache.get("c") == [3]
+
+    sleep(0.06)
+    assert cache.get("a") is None and len(cache) == 1
+    assert cache.metrics["evictions"] == 2
+
+    # Запись, инвалидированная во время чтения из Redis, не сохраняется
+    version = cache.version
+    cache.invalidate(["d"])
+    cache.set("d", ["old"], version)
+    assert cache.get("d") is None and cache.metrics["stale"] == 1
+
+    disabled = LocalCache(0, ttl=10)
+    disabled.set("a", [1], disabled.version)
+    assert disabled.get("a") is None and not len(disabled)
+
+
+async def invalidation():
+    redis = Redis()
+    first, second = LocalCache(100, ttl=10, strict=True), LocalCache(100, ttl=10)
+
+    # В строгом режиме без подписки записи не выдаются
+    first.set("data:userdata:1", [{"a": 1}], first.version)
+    assert first.get("data:userdata:1") is None
+
+    first.start(redis, retry=0.01)
+    second.start(redis, retry=0.01)
+    await settle()
+    assert first.connected and second.connected
+
+    for cache in (first, second):
+        cache.set("data:userdata:1", [{"a": 1}], cache.version)
+        cache.set("index:wg_config:1", [{"b": 2}], cache.version)
+        assert cache.get("data:userdata:1") == [{"a": 1}]
+
+    # Изменение в первом процессе: собственное сообщение пропускается
+    first.invalidate(["data:userdata:1"])
+    message = first.message(["data:userdata:1"])
+    redis.publish(message)
+    await settle()
+    assert second.get("data:userdata:1") is None
+    assert second.get("index:wg_config:1") == [{"b": 2}]
+    assert first.get("index:wg_config:1") == [{"b": 2}]
+
+    # Некорректное сообщение очищает кэш
+    redis.publish("garbage")
+    await settle()
+    assert not len(first) and not len(second)
+
+    # Потеря подписки: кэш очищается, строгий кэш не выдает записи до переподключения
+    first.set("data:userdata:2", [{"c": 3}], first.version)
+    assert len(first) == 1
+    redis.publish(None)
+    await settle()
+    assert not first.connected and not len(first)
+    first.set("data:userdata:2", [{"c": 3}], first.version)
+    assert first.get("data:userdata:2") is None
+    await asyncio.sleep(0.05)
+    assert first.connected
+
+    await first.close()
+    await second.close()
+    metrics = second.metrics
+    assert metrics["hits"] == 2 and metrics["misses"] == 1 and metrics["invalidations"] == 2, metrics
+
+
+def speed():
+    cache = LocalCache(10000, ttl=60)
+    keys = [f"data:userdata:{n}" for n in range(1000)]
+    for key in keys:
+        cache.set(key, [{"telegram_id": key}], cache.version)
+
+    start = perf_counter()
+    for n in range(LOOKUPS):
+        assert cache.get(keys[n % 1000]) is not None
+    return perf_counter() - start
+
+
+def main():
+    lru_ttl()
+    asyncio.run(invalidation())
+    elapsed = speed()
+    print(f"{LOOKUPS=}  get={elapsed * 1e6 / LOOKUPS:.2f} usec/op")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import os
+import sys
+import tempfile
+from base64 import b64encode
+from random import choice
+from time import perf_counter
+
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), "..", "src", "wg"))
+
+from pywg import PeerTable
+
+PEERS = (1_000, 10_000, 50_000)
+OPERATIONS = 1_000
+
+HEAD = """[Interface]
+Address = 10.1.0.1/16
+ListenPort = 51820
+PrivateKey = {key}
+"""
+
+
+def gen_key(n):
+    return b64encode(n.to_bytes(32, "big")).decode()
+
+
+def gen_conf(peers):
+    lines = [HEAD.format(key=gen_key(0))]
+    for n in range(1, peers + 1):
+        prefix = "# " if n % 10 == 0 else ""
+        lines.extend(
+            (
+                f"{prefix}[Peer]",
+                f"{prefix}PublicKey = {gen_key(n)}",
+                f"{prefix}AllowedIPs = 10.1.{n >> 8 & 255}.{n & 255}/32",
+                f"{prefix}PersistentKeepalive = 25",
+                "",
+            )
+        )
+    return "\n".join(lines)
+
+
+def bench(peers):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "wg1.conf")
+        with open(path, "w") as file:
+            file.write(gen_conf(peers))
+
+        start = perf_counter()
+        table = PeerTable.load(path)
+        parse = perf_counter() - start
+
+        keys = [choice(list(table.peers)) for _ in range(OPERATIONS)]
+
+        start = perf_counter()
+        for key in keys:
+            peer = table.unban(key) if table.get(key).banned else table.ban(key)
+            table.find(peer.allowed_ips)
+        ops = perf_counter() - start
+
+        start = perf_counter()
+        table.dump(path)
+        dump = perf_counter() - start
+
+        assert len(PeerTable.load(path)) == peers
+
+    print(
+        f"{peers=:<7}  parse={int(parse*1000)} msec  "
+        f"op={ops/OPERATIONS*1_000_000:.2f} usec  dump={int(dump*1000)} msec"
+    )
+
+
+def main():
+    for peers in PEERS:
+        bench(peers)
+
+
+if __name__ == "__main__":
+    main()
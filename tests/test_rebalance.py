@@ -0,0 +1,67 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from wg.rebalance import plan_moves
+
+
+def node(server_id, capacity, active=True):
+    return SimpleNamespace(id=server_id, capacity=capacity, active=active)
+
+
+def configs(server_id, count, start):
+    return [
+        SimpleNamespace(id=start + i, server_id=server_id, freeze="no")
+        for i in range(count)
+    ]
+
+
+def main():
+    nodes = [node(1, 100), node(2, 100), node(3, 100, active=False)]
+    hot, cold, drained = configs(1, 90, 0), configs(2, 10, 1000), configs(3, 50, 2000)
+    traffic = {config.id: 1000 - config.id for config in hot}
+
+    # Разница заполненности уменьшается до порога, лимит не превышается
+    plan = plan_moves(nodes, hot + cold + drained, traffic, max_moves=100, threshold=0.1)
+    assert all(move.source in (1, 3) and move.target == 2 for move in plan)
+    peers = {1: 90, 2: 10, 3: 50}
+    for move in plan:
+        peers[move.source] -= 1
+        peers[move.target] += 1
+    assert abs(peers[1] - peers[2]) <= 10 and peers[2] <= 100
+
+    # В первую очередь переносятся пиры с наименьшим трафиком
+    first = [move.config.id for move in plan if move.source == 1][:3]
+    assert first == [89, 88, 87], first
+
+    # Неактивный сервер не получает пиров
+    assert not any(move.target == 3 for move in plan)
+
+    assert len(plan_moves(nodes, hot + cold, traffic, max_moves=5)) == 5
+    assert plan_moves(nodes, configs(1, 50, 0) + configs(2, 45, 100)) == []
+
+    # Непереносимые конфигурации остаются на месте, но учитываются в заполненности
+    frozen = [
+        SimpleNamespace(id=i, server_id=1, freeze="wait_yes") for i in range(90)
+    ]
+    assert plan_moves(nodes, frozen + cold, movable=lambda c: c.freeze == "no") == []
+
+    # Перенос не делает сервер назначения заполненнее исходного
+    plan = plan_moves([node(1, 10), node(2, 2)], configs(1, 10, 0), max_moves=10)
+    assert len(plan) == 1 and plan[0].target == 2
+
+    # Пиры пула занимают емкость сервера назначения
+    plan = plan_moves([node(1, 10), node(2, 10)], configs(1, 10, 0), max_moves=10)
+    assert len(plan) == 5
+    plan = plan_moves(
+        [node(1, 10), node(2, 10)], configs(1, 10, 0), max_moves=10, pool={2: 8}
+    )
+    assert len(plan) == 1 and plan[0].target == 2
+
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+import enum
+import os
+import sys
+from time import perf_counter
+from types import SimpleNamespace
+
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from wg.reconcile import MismatchKind, plan_reconcile, plan_thaw
+
+CONFIGS = 100000
+
+
+class FreezeSteps(enum.Enum):
+    yes = "yes"
+    wait_yes = "wait_yes"
+    no = "no"
+    wait_no = "wait_no"
+    idle = "idle"
+
+
+def config(config_id, server_id, freeze, address=None):
+    return SimpleNamespace(
+        id=config_id,
+        server_id=server_id,
+        server_public_key=f"key{config_id}=",
+        address=address or f"10.{config_id // 65536}.{config_id // 256 % 256}.{config_id % 256}/32",
+        freeze=freeze,
+    )
+
+
+def peer(config, ban, allowedips=None):
+    return {
+        "publickey": config.server_public_key,
+        "allowedips": allowedips or config.address,
+        "ban": ban,
+    }
+
+
+def main():
+    steps = list(FreezeSteps)[:4]
+    configs = [config(n, n % 2, steps[n % 4]) for n in range(16)]
+    servers = {0: {}, 1: {}}
+    for item in configs:
+        banned = item.freeze in (FreezeSteps.yes, FreezeSteps.wait_no)
+        servers[item.server_id][item.server_public_key] = peer(item, banned)
+
+    # Согласованные конфигурации: только ожидающие операции на сервере
+    plan = plan_reconcile(configs, servers)
+    assert plan.checked == 16 and not plan.mismatches
+    assert {c.freeze for c in plan.ban} == {FreezeSteps.wait_yes}
+    assert {c.freeze for c in plan.unban} == {FreezeSteps.wait_no}
+    assert not (plan.freeze or plan.unfreeze or plan.delete)
+
+    # Каждое расхождение фиксируется отдельно и не прерывает сверку
+    missing, moved, flipped, applied = configs[0], configs[1], configs[2], configs[5]
+    del servers[0][missing.server_public_key]
+    servers[1][moved.server_public_key]["allowedips"] = "10.9.9.9/32"
+    servers[0][flipped.server_public_key]["ban"] = True  # no -> заблокирован
+    servers[1][applied.server_public_key]["ban"] = True  # wait_yes применен
+    servers[1]["orphan="] = {"publickey": "orphan=", "allowedips": "10.8.0.1/32", "ban": False}
+    servers[1]["pool="] = {"publickey": "pool=", "allowedips": "10.8.0.2/32", "ban": True}
+    skipped = config(100, 7, FreezeSteps.no)
+
+    plan = plan_reconcile(configs + [skipped], servers, pool_keys={"pool="})
+    kinds = {(m.kind, m.public_key) for m in plan.mismatches}
+    assert kinds == {
+        (MismatchKind.missing_on_server, missing.server_public_key),
+        (MismatchKind.address, moved.server_public_key),
+        (MismatchKind.ban_state, flipped.server_public_key),
+        (MismatchKind.missing_in_db, "orphan="),
+    }, kinds
+    assert plan.delete == [missing] and plan.checked == 16
+    assert flipped in plan.freeze and applied in plan.freeze
+    assert moved not in plan.ban + plan.unban + plan.freeze + plan.unfreeze
+    summary = plan.summary()
+    assert summary["address"] == 1 and summary["missing_in_db"] == 1 and summary["freeze"] == 2
+
+    # Простаивающая конфигурация заблокирована, как замороженная
+    idle, woken = config(200, 0, FreezeSteps.idle), config(201, 0, FreezeSteps.idle)
+    servers = {0: {idle.server_public_key: peer(idle, True), woken.server_public_key: peer(woken, False)}}
+    plan = plan_reconcile([idle, woken], servers)
+    assert [(m.kind, m.config) for m in plan.mismatches] == [(MismatchKind.ban_state, woken)]
+    assert plan.unfreeze == [woken] and not (plan.freeze or plan.ban or plan.unban)
+
+    # Понижение тарифа: лимит занимают первые по id конфигурации, как в unfreeze_configs
+    user = [
+        config(304, 0, FreezeSteps.idle),
+        config(301, 0, FreezeSteps.no),
+        config(303, 0, FreezeSteps.yes),
+        config(302, 0, FreezeSteps.idle),
+        config(305, 0, FreezeSteps.idle),
+    ]
+    thaw, overflow = plan_thaw(user, 3)
+    assert [c.id for c in thaw] == [302] and [c.id for c in overflow] == [304, 305]
+    thaw, overflow = plan_thaw(user, 0)
+    assert not thaw and [c.id for c in overflow] == [302, 304, 305]
+    thaw, overflow = plan_thaw(user, 15)
+    assert [c.id for c in thaw] == [302, 304, 305] and not overflow
+
+    # Производительность
+    configs = [config(n, n % 4, steps[n % 4]) for n in range(CONFIGS)]
+    servers = {server_id: {} for server_id in range(4)}
+    for item in configs:
+        servers[item.server_id][item.server_public_key] = peer(item, item.freeze == FreezeSteps.yes)
+    for item in configs[::100]:
+        servers[item.server_id].pop(item.server_public_key)
+
+    start = perf_counter()
+    plan = plan_reconcile(configs, servers)
+    elapsed = perf_counter() - start
+    assert plan.checked == CONFIGS and len(plan.delete) == CONFIGS // 100
+
+    print(f"configs={CONFIGS}  plan={elapsed * 1000:.0f} msec  {plan.summary()}")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
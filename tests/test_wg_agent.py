@@ -0,0 +1,153 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+PYWG = os.path.join(TESTS, "..", "src", "wg", "pywg.py")
+FAKE_WG = os.path.join(TESTS, "fake_wg.py")
+
+REQUESTS = 200
+
+CONF = """[Interface]
+Address = 10.1.0.1/16
+ListenPort = 51820
+PrivateKey = cHJpdmF0ZQ==
+"""
+
+
+class Agent:
+    def __init__(self, tmp, *options):
+        env = dict(
+            os.environ,
+            FAKE_WG_STATE=os.path.join(tmp, "state.json"),
+            FAKE_WG_LOG=os.path.join(tmp, "wg.log"),
+        )
+        self.process = subprocess.Popen(
+            [sys.executable, PYWG, "--agent", "--wgpath", os.path.join(tmp, "wg1.conf"),
+             "--wg", FAKE_WG, *options],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            env=env, text=True, bufsize=1,
+        )
+        self.ids = 0
+
+    def send(self, line):
+        self.process.stdin.write(line + "\n")
+        return json.loads(self.process.stdout.readline())
+
+    def request(self, op, **params):
+        self.ids += 1
+        response = self.send(json.dumps({"id": self.ids, "op": op, **params}))
+        assert response["id"] == self.ids
+        return response
+
+    def close(self):
+        self.process.stdin.close()
+        assert self.process.wait(timeout=5) == 0
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "wg1.conf"), "w") as file:
+            file.write(CONF)
+
+        agent = Agent(tmp)
+        try:
+            assert agent.request("ping")["result"] == "pong"
+            assert agent.send("not json") == {"id": None, "ok": False, "error": "BAD REQUEST"}
+            assert not agent.request("unknown")["ok"]
+
+            start = perf_counter()
+            for n in range(REQUESTS):
+                response = agent.request("add", pubkey=f"key{n}=", allowed_ips=f"10.1.0.{n + 2}/32")
+                assert response["result"]["status"] == "done", response
+            single = perf_counter() - start
+
+            assert agent.request("ban", pubkey="key1=")["result"]["status"] == "done"
+            assert agent.request("ban", pubkey="key1=")["result"]["status"] == "skip"
+            assert agent.request("del", pubkey="missing=")["result"]["status"] == "fail"
+
+            result = agent.request(
+                "batch",
+                operations=[
+                    {"mode": "unban", "pubkey": "key1="},
+                    {"mode": "ban", "pubkey": "key2="},
+                    {"mode": "del", "pubkey": "key3="},
+                ],
+            )["result"]
+            assert [op["status"] for op in result] == ["done"] * 3
+
+            # Изменение конфигурации в обход агента перечитывается при следующем запросе
+            with open(os.path.join(tmp, "wg1.conf"), "a") as file:
+                file.write("\n[Peer]\nPublicKey = outside=\nAllowedIPs = 10.1.1.1/32\n")
+
+            peers = {peer["publickey"]: peer for peer in agent.request("list")["result"]}
+            assert len(peers) == REQUESTS
+            assert peers["key2="]["ban"] and not peers["key1="]["ban"]
+            assert "key3=" not in peers and "outside=" in peers
+
+            status = agent.request("status")["result"]
+            assert status["peers"] == REQUESTS and status["banned"] == 1
+
+            start = perf_counter()
+            for _ in range(REQUESTS):
+                agent.request("status")
+            idle = perf_counter() - start
+
+            # Синхронизация с желаемым набором; таблица агента перечитывается
+            desired = [
+                {"pubkey": f"key{n}=", "allowed_ips": f"10.1.0.{n + 2}/32", "ban": n == 1}
+                for n in range(4)
+            ]
+            result = agent.request("sync", peers=desired)["result"]
+            assert result["status"] == "synced" and result["changes"] == {
+                "del": REQUESTS - 3, "new": 1, "ban": 1, "unban": 1
+            }, result
+            assert agent.request("sync", hash=result["hash"])["result"]["status"] == "unchanged"
+            peers = agent.request("list")["result"]
+            assert [(peer["publickey"], peer["ban"]) for peer in peers] == [
+                (f"key{n}=", n == 1) for n in range(4)
+            ]
+        finally:
+            agent.close()
+
+        # Изменения, пришедшие в течение окна, применяются одним пакетом
+        agent = Agent(tmp, "--coalesce", "200")
+        try:
+            start = perf_counter()
+            for n in range(REQUESTS):
+                agent.process.stdin.write(json.dumps(
+                    {"id": n, "op": "add", "pubkey": f"burst{n}=", "allowed_ips": f"10.1.2.{n + 2}/32"}
+                ) + "\n")
+            agent.process.stdin.write(json.dumps(
+                {"id": REQUESTS, "op": "del", "pubkey": "missing="}
+            ) + "\n")
+            responses = {}
+            for _ in range(REQUESTS + 1):
+                response = json.loads(agent.process.stdout.readline())
+                responses[response["id"]] = response
+            burst = perf_counter() - start
+
+            assert sorted(responses) == list(range(REQUESTS + 1))
+            assert all(responses[n]["result"]["status"] == "done" for n in range(REQUESTS))
+            assert responses[REQUESTS]["result"]["status"] == "fail"
+
+            agent.ids = REQUESTS
+            stats = agent.request("stats")["result"]
+            assert stats["operations"] == REQUESTS + 1 and stats["batches"] <= 3, stats
+            assert stats["batch_max"] >= REQUESTS // 2
+
+            peers = agent.request("list")["result"]
+            assert sum(peer["publickey"].startswith("burst") for peer in peers) == REQUESTS
+        finally:
+            agent.close()
+
+    print(f"{REQUESTS=}  add={single*1000/REQUESTS:.2f} msec/op  status={idle*1000/REQUESTS:.3f} msec/op")
+    print(f"coalesced burst={burst*1000:.0f} msec  batches={stats['batches']}  apply_p50={stats['apply_p50']} msec")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
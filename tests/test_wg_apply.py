@@ -0,0 +1,96 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+PYWG = os.path.join(TESTS, "..", "src", "wg", "pywg.py")
+FAKE_WG = os.path.join(TESTS, "fake_wg.py")
+
+sys.path.insert(1, os.path.join(TESTS, "..", "src", "wg"))
+
+from pywg import SYNC_THRESHOLD, PeerTable
+
+PEERS = 100
+
+CONF = """[Interface]
+Address = 10.1.0.1/16
+ListenPort = 51820
+PrivateKey = cHJpdmF0ZQ==
+PostUp = iptables -A FORWARD -i wg1 -j ACCEPT
+"""
+
+
+def pywg(tmp, *args, input=None):
+    env = dict(
+        os.environ,
+        FAKE_WG_STATE=os.path.join(tmp, "state.json"),
+        FAKE_WG_LOG=os.path.join(tmp, "wg.log"),
+    )
+    return subprocess.run(
+        [sys.executable, PYWG, "--wgpath", os.path.join(tmp, "wg1.conf"),
+         "--wg", FAKE_WG, "--raises", *args],
+        input=input, env=env, capture_output=True, text=True, check=True,
+    )
+
+
+def running_peers(tmp):
+    with open(os.path.join(tmp, "state.json")) as file:
+        return set(json.load(file).get("wg1", {}))
+
+
+def expected_peers(tmp):
+    table = PeerTable.load(os.path.join(tmp, "wg1.conf"))
+    return {peer.public_key for peer in table if not peer.banned}
+
+
+def wg_calls(tmp):
+    with open(os.path.join(tmp, "wg.log")) as file:
+        return [line.split()[0] for line in file]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "wg1.conf"), "w") as file:
+            file.write(CONF)
+
+        start = perf_counter()
+        batch = [
+            {"mode": "new", "pubkey": f"key{n}=", "allowed_ips": f"10.1.0.{n + 2}/32"}
+            for n in range(PEERS)
+        ]
+        result = json.loads(pywg(tmp, "--batch", "-", input=json.dumps(batch)).stdout)
+        assert all(op["status"] == "done" for op in result)
+        assert wg_calls(tmp) == ["syncconf"], "bulk changes must use syncconf"
+        assert running_peers(tmp) == expected_peers(tmp)
+        bulk = perf_counter() - start
+
+        start = perf_counter()
+        pywg(tmp, "key1=", "-m", "ban")
+        pywg(tmp, "key2=", "-m", "del")
+        pywg(tmp, "key1=", "-m", "unban")
+        pywg(tmp, "key3=", "-m", "ban")
+        pywg(tmp, "new=", "-ips", "10.1.1.1/32")
+        single = perf_counter() - start
+
+        assert wg_calls(tmp)[1:] == ["set"] * 5, "single changes must use wg set"
+        assert running_peers(tmp) == expected_peers(tmp)
+        assert "key3=" not in running_peers(tmp)
+
+        result = json.loads(
+            pywg(tmp, "--batch", "-", input='{"mode": "ban", "pubkey": "key3="}').stdout
+        )
+        assert result[0]["status"] == "skip"
+        assert len(wg_calls(tmp)) == 6, "nothing changed - nothing applied"
+
+        with open(os.path.join(tmp, "wg1.conf")) as file:
+            assert "PostUp" in file.read()
+
+    print(f"{PEERS=} {SYNC_THRESHOLD=}  bulk={int(bulk*1000)} msec  single={int(single*1000/5)} msec/op")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import asyncio
+import os
+import stat
+import sys
+import tempfile
+from time import perf_counter
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+PYWG = os.path.join(TESTS, "..", "src", "wg", "pywg.py")
+FAKE_WG = os.path.join(TESTS, "fake_wg.py")
+
+sys.path.insert(1, os.path.join(TESTS, "..", "src"))
+os.environ["WG_BACKEND"] = "fake"
+
+from core.exceptions import WireguardError
+from wg.backend import FakeBackend, LocalBackend
+from wg.utils import CLUSTER, IPS, KEYS, WgServerTools
+
+PEERS = 500
+
+CONF = """[Interface]
+Address = 10.1.0.1/16
+ListenPort = 51820
+PrivateKey = cHJpdmF0ZQ==
+"""
+
+
+async def fake():
+    assert isinstance(CLUSTER.default.backend, FakeBackend)
+    await CLUSTER.connect()
+    KEYS.start()
+
+    # Одиночные операции через WgServerTools
+    wg = WgServerTools()
+    config = await wg.move_user("add", user_id=1)
+    await wg.move_user("ban", user_pubkey=config["server_public_key"])
+    peers = {peer["publickey"]: peer for peer in await wg.get_peer_list()}
+    assert peers[config["server_public_key"]]["ban"]
+    await wg.move_user("unban", user_pubkey=config["server_public_key"])
+
+    try:
+        await WgServerTools().move_user("ban", user_pubkey="missing=")
+    except WireguardError:
+        pass
+    else:
+        raise AssertionError("missing peer must raise")
+
+    # Пакет: повторная блокировка - skip, повторное добавление - fail
+    results = await wg.move_users(
+        add=[("new=", "10.1.5.5/32"), (config["server_public_key"], "10.1.5.6/32")],
+        ban=["new=", "new="],
+    )
+    assert [result["status"] for result in results] == ["done", "fail", "done", "skip"]
+
+    stats = await wg.get_peer_stats()
+    assert [peer["publickey"] for peer in stats] == [config["server_public_key"]]
+    probe = await wg.get_server_probe()
+    assert probe["status"] == "active" and probe["peers"] == 1
+    feed = await wg.get_peer_changes()
+    assert feed["full"] and len(feed["peers"]) == 2
+
+    # Синхронизация с набором: повтор и проверка по хэшу ничего не меняют
+    desired = [
+        {"pubkey": config["server_public_key"], "allowed_ips": config["address"], "ban": True},
+        {"pubkey": "synced=", "allowed_ips": "10.1.5.7/32", "ban": False},
+    ]
+    result = await wg.sync_peers(desired)
+    assert result["changes"] == {"del": 1, "ban": 1, "new": 1}, result
+    assert (await wg.sync_peers(desired))["status"] == "unchanged"
+    assert (await wg.sync_peers(digest=result["hash"]))["status"] == "unchanged"
+    await wg.move_user("unban", user_pubkey=config["server_public_key"])
+    assert (await wg.sync_peers(digest=result["hash"]))["status"] == "stale"
+    assert (await wg.sync_peers(desired))["changes"] == {"ban": 1}
+
+    # Пул: адрес, занятый на сервере в обход распределителя, не освобождается
+    taken = str(IPS.allocate())
+    IPS.release(taken)
+    await wg.move_users(add=[("outside=", taken)])
+    assert await wg.create_pool_peers(1) == [] and taken in IPS
+    assert len(await wg.create_pool_peers(2)) == 2
+    await wg.move_users(delete=["outside="])
+
+    start = perf_counter()
+    await asyncio.gather(*(WgServerTools().move_user("add", user_id=n) for n in range(PEERS)))
+    elapsed = perf_counter() - start
+    assert len(await wg.get_peer_list()) == PEERS + 4
+
+    await KEYS.close()
+    return elapsed
+
+
+async def local(tmp):
+    conf = os.path.join(tmp, "wg1.conf")
+    with open(conf, "w") as file:
+        file.write(CONF)
+
+    script = os.path.join(tmp, "pywg")
+    with open(script, "w") as file:
+        file.write(
+            "#!/bin/sh\n"
+            f"export FAKE_WG_STATE={tmp}/state.json FAKE_WG_LOG={tmp}/wg.log\n"
+            f'exec {sys.executable} {PYWG} --wgpath {conf} --wg {FAKE_WG} "$@"\n'
+        )
+    os.chmod(script, os.stat(script).st_mode | stat.S_IEXEC)
+
+    backend = LocalBackend(script)
+    await backend.connect()
+    await backend.add("local=", "10.1.0.2/32")
+    await backend.ban("local=")
+    results = await backend.batch(
+        [{"mode": "new", "pubkey": "other=", "allowed_ips": "10.1.0.3/32"},
+         {"mode": "ban", "pubkey": "local="}]
+    )
+    assert [result["status"] for result in results] == ["done", "skip"]
+    peers = {peer["publickey"]: peer["ban"] for peer in await backend.peers()}
+    assert peers == {"local=": True, "other=": False}
+
+    desired = [{"pubkey": "local=", "allowed_ips": "10.1.0.2/32", "ban": False}]
+    result = await backend.sync(desired)
+    assert result["changes"] == {"del": 1, "unban": 1}, result
+    assert (await backend.sync(digest=result["hash"]))["status"] == "unchanged"
+
+    feed = await backend.changes()
+    changes = await backend.changes(feed["revision"], feed["epoch"])
+    assert not changes["full"] and not changes["peers"]
+
+    start = perf_counter()
+    for _ in range(10):
+        await backend.peers()
+    return (perf_counter() - start) / 10
+
+
+def main():
+    elapsed = asyncio.run(fake())
+    with tempfile.TemporaryDirectory() as tmp:
+        local_elapsed = asyncio.run(local(tmp))
+
+    print(
+        f"fake: {PEERS} adds in {elapsed * 1000:.0f} msec  "
+        f"local: list={local_elapsed * 1000:.0f} msec/op"
+    )
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
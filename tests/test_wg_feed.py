@@ -0,0 +1,90 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+PYWG = os.path.join(TESTS, "..", "src", "wg", "pywg.py")
+FAKE_WG = os.path.join(TESTS, "fake_wg.py")
+
+PEERS = 2000
+
+CONF = """[Interface]
+Address = 10.1.0.1/16
+ListenPort = 51820
+PrivateKey = cHJpdmF0ZQ==
+"""
+
+
+def pywg(tmp, *args, input=None):
+    env = dict(
+        os.environ,
+        FAKE_WG_STATE=os.path.join(tmp, "state.json"),
+        FAKE_WG_LOG=os.path.join(tmp, "wg.log"),
+    )
+    return subprocess.run(
+        [sys.executable, PYWG, "--wgpath", os.path.join(tmp, "wg1.conf"),
+         "--wg", FAKE_WG, "--raises", *args],
+        input=input, env=env, capture_output=True, text=True, check=True,
+    ).stdout
+
+
+def changes(tmp, feed=None):
+    if feed is None:
+        return json.loads(pywg(tmp, "--changes-since", "-1"))
+    return json.loads(
+        pywg(tmp, "--changes-since", str(feed["revision"]), "--epoch", feed["epoch"])
+    )
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "wg1.conf"), "w") as file:
+            file.write(CONF)
+
+        batch = [
+            {"mode": "new", "pubkey": f"key{n}=", "allowed_ips": f"10.1.{n // 250}.{n % 250 + 2}/32"}
+            for n in range(PEERS)
+        ]
+        pywg(tmp, "--batch", "-", input=json.dumps(batch))
+
+        peers = json.loads(pywg(tmp, "-l", "--json"))
+        assert len(peers) == PEERS and not any(peer["ban"] for peer in peers)
+
+        feed = changes(tmp)
+        assert feed["full"] and len(feed["peers"]) == PEERS
+
+        same = changes(tmp, feed)
+        assert not same["full"] and same["peers"] == [] and same["revision"] == feed["revision"]
+
+        pywg(tmp, "key1=", "-m", "ban")
+        pywg(tmp, "key2=", "-m", "del")
+        start = perf_counter()
+        delta = changes(tmp, feed)
+        elapsed = perf_counter() - start
+        assert not delta["full"]
+        assert delta["peers"] == [{"publickey": "key1=", "allowedips": "10.1.0.3/32", "ban": True}]
+        assert delta["removed"] == ["key2="]
+        assert delta["revision"] == feed["revision"] + 2
+
+        # Изменение в обход pywg - новая эпоха и полный список
+        with open(os.path.join(tmp, "wg1.conf"), "a") as file:
+            file.write("\n[Peer]\nPublicKey = manual=\nAllowedIPs = 10.1.200.1/32\n")
+        full = changes(tmp, delta)
+        assert full["full"] and full["epoch"] != delta["epoch"]
+        assert len(full["peers"]) == PEERS
+
+        pywg(tmp, "key3=", "-m", "ban")
+        delta = changes(tmp, full)
+        assert not delta["full"] and [peer["publickey"] for peer in delta["peers"]] == ["key3="]
+
+        assert changes(tmp, dict(delta, epoch="stale"))["full"]
+
+    print(f"{PEERS=}  delta={int(elapsed*1000)} msec  full={len(json.dumps(feed))} bytes  delta={len(json.dumps(delta))} bytes")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+from base64 import b64decode, b64encode
+from time import perf_counter
+
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from wg.keys import KeyPool, generate_keypair, public_key
+
+# RFC 7748, 6.1
+VECTORS = [
+    (
+        "77076d0a7318a57d3c16c17251b26645df4c2f87ebc0992ab177fba51db92c2a",
+        "8520f0098930a754748b7ddcb43ef75a0dbf3a0d26381af4eba4a98eaa9b4e6a",
+    ),
+    (
+        "5dab087e624a8a4b79e17f8b83800ee66f3bb1292618b6fd1c2f8b27ff88e0eb",
+        "de9edb7d7b7dc1b4d35b61c2ece435373f8343c85b78674dadfc7e146f882b4f",
+    ),
+]
+
+KEYS = 1000
+
+
+def b64(hex_key):
+    return b64encode(bytes.fromhex(hex_key)).decode()
+
+
+def wg_pubkey(private_key):
+    return subprocess.run(
+        ["wg", "pubkey"], input=private_key, capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+
+async def pool():
+    keys = KeyPool(size=16)
+    keys.start()
+    await asyncio.sleep(0.1)
+    assert keys.ready == 16
+    pairs = [await keys.get() for _ in range(32)]
+    assert len(set(pairs)) == 32
+    await keys.close()
+
+
+def main():
+    for private, public in VECTORS:
+        assert public_key(b64(private)) == b64(public)
+
+    start = perf_counter()
+    pairs = [generate_keypair() for _ in range(KEYS)]
+    elapsed = perf_counter() - start
+
+    for private_key, public in pairs[:10]:
+        raw = b64decode(private_key)
+        assert len(raw) == 32 and len(public) == 44
+        assert raw[0] & 7 == 0 and raw[31] & 128 == 0 and raw[31] & 64
+        if shutil.which("wg"):
+            assert wg_pubkey(private_key) == public
+
+    assert len({private for private, _ in pairs}) == KEYS
+
+    asyncio.run(pool())
+
+    print(f"{KEYS=}  {elapsed*1e6/KEYS:.1f} usec/keypair  wg={bool(shutil.which('wg'))}")
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+from time import perf_counter
+
+sys.path.insert(1, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from core.exceptions import WireguardError
+from wg.ops import OP_CLASS, OpClass, OpScheduler, op_class
+
+OPERATIONS = 2000
+
+
+async def settle():
+    for _ in range(10):
+        await asyncio.sleep(0)
+
+
+async def order():
+    ops = OpScheduler(2, {"billing": 1, "reconciliation": 1}, timeout=1)
+    started, gate = [], asyncio.Event()
+
+    async def operation(name, cls=None):
+        async with ops.acquire(cls):
+            started.append(name)
+            await gate.wait()
+
+    @op_class(OpClass.reconciliation)
+    async def sweep(n):
+        await asyncio.gather(*(operation(f"sweep{i}") for i in range(n)))
+
+    # Фоновый класс занимает не больше своего лимита
+    tasks = [asyncio.create_task(sweep(4))]
+    await settle()
+    assert started == ["sweep0"]
+    assert ops.metrics["reconciliation"]["queued"] == 3
+
+    # Интерактивная операция не ждет фоновых, а освободившийся слот
+    # получает раньше фоновых и операций биллинга
+    tasks.append(asyncio.create_task(operation("user0")))
+    await settle()
+    assert started == ["sweep0", "user0"]
+    tasks.append(asyncio.create_task(operation("bill0", OpClass.billing)))
+    tasks.append(asyncio.create_task(operation("user1")))
+    await settle()
+    assert OP_CLASS.get() == OpClass.interactive
+
+    gate.set()
+    await asyncio.gather(*tasks)
+    assert started[2] == "user1" and started.index("bill0") < started.index("sweep1"), started
+
+    metrics = ops.metrics
+    assert metrics["reconciliation"]["dispatched"] == 4
+    assert metrics["reconciliation"]["max_queued"] == 3
+    assert metrics["interactive"]["dispatched"] == 2
+    assert all(item["queued"] == item["running"] == 0 for item in metrics.values())
+
+
+async def timeouts():
+    ops = OpScheduler(1, timeout=0.05)
+    async with ops.acquire():
+        try:
+            async with ops.acquire():
+                pass
+        except WireguardError:
+            pass
+        else:
+            raise AssertionError("queue must time out")
+
+        # Отмененная операция освобождает место в очереди
+        task = asyncio.create_task(ops.acquire().__aenter__())
+        await settle()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    assert ops.metrics["interactive"]["timeouts"] == 1
+    assert ops.metrics["interactive"]["queued"] == 0
+    assert ops.metrics["interactive"]["running"] == 0
+
+
+async def throughput():
+    ops = OpScheduler(8, {"billing": 4, "reconciliation": 2})
+    waits = {cls: [] for cls in OpClass}
+
+    async def operation(cls):
+        start = perf_counter()
+        async with ops.acquire(cls):
+            waits[cls].append(perf_counter() - start)
+            await asyncio.sleep(0.001)
+
+    start = perf_counter()
+    await asyncio.gather(
+        *(operation(OpClass.reconciliation) for _ in range(OPERATIONS // 2)),
+        *(operation(OpClass.billing) for _ in range(OPERATIONS // 4)),
+        *(operation(OpClass.interactive) for _ in range(OPERATIONS // 4)),
+    )
+    elapsed = perf_counter() - start
+
+    avg = {cls.name: sum(values) / len(values) * 1000 for cls, values in waits.items()}
+    assert avg["interactive"] < avg["billing"] < avg["reconciliation"], avg
+    return elapsed, avg
+
+
+def main():
+    asyncio.run(order())
+    asyncio.run(timeouts())
+    elapsed, avg = asyncio.run(throughput())
+    print(
+        f"{OPERATIONS=}  {elapsed * 1000:.0f} msec  avg wait: "
+        + "  ".join(f"{name}={value:.1f} msec" for name, value in avg.items())
+    )
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+PYWG = os.path.join(TESTS, "..", "src", "wg", "pywg.py")
+FAKE_WG = os.path.join(TESTS, "fake_wg.py")
+
+sys.path.insert(1, os.path.join(TESTS, "..", "src", "wg"))
+
+from pywg import PeerNotFoundError, PeerRegistry, PeerStateError, PeerTable
+
+PEERS = 10000
+
+CONF = """[Interface]
+Address = 10.1.0.1/16
+ListenPort = 51820
+PrivateKey = cHJpdmF0ZQ==
+PostUp = iptables -A FORWARD -i wg1 -j ACCEPT
+
+[Peer]
+PublicKey = active=
+AllowedIPs = 10.1.0.2/32
+PersistentKeepalive = 25
+
+# [Peer]
+# PublicKey = banned=
+# AllowedIPs = 10.1.0.3/32
+# PersistentKeepalive = 25
+
+[Peer]
+# client laptop
+PublicKey = extra=
+AllowedIPs = 10.1.0.4/32
+"""
+
+
+def pywg(tmp, *args, input=None):
+    env = dict(
+        os.environ,
+        FAKE_WG_STATE=os.path.join(tmp, "state.json"),
+        FAKE_WG_LOG=os.path.join(tmp, "wg.log"),
+    )
+    return subprocess.run(
+        [sys.executable, PYWG, "--wgpath", os.path.join(tmp, "wg1.conf"),
+         "--wg", FAKE_WG, "--raises", *args],
+        input=input, env=env, capture_output=True, text=True, check=True,
+    )
+
+
+def running_peers(tmp):
+    with open(os.path.join(tmp, "state.json")) as file:
+        return set(json.load(file).get("wg1", {}))
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        conf = os.path.join(tmp, "wg1.conf")
+        with open(conf, "w") as file:
+            file.write(CONF)
+
+        # Импорт, включая заблокированных пиров и произвольные строки секций
+        pywg(tmp, "--import")
+        registry = PeerRegistry(PeerRegistry.path_for(conf))
+        assert len(registry) == 3 and registry.count(banned=True) == 1
+        assert registry.get("banned=").banned and not registry.get("active=").banned
+        assert registry.find("10.1.0.4/32").public_key == "extra="
+        assert registry.find("10.1.9.9/32") is None
+        assert registry.render() == PeerTable.load(conf).render()
+
+        try:
+            registry.get("missing=")
+        except PeerNotFoundError:
+            pass
+        else:
+            raise AssertionError("missing peer must raise")
+
+        # Изменения выполняются в реестре, конфигурация генерируется из него
+        batch = [
+            {"mode": "ban", "pubkey": "active="},
+            {"mode": "unban", "pubkey": "banned="},
+            {"mode": "del", "pubkey": "extra="},
+            {"mode": "new", "pubkey": "new=", "allowed_ips": "10.1.0.5/32"},
+            {"mode": "ban", "pubkey": "active="},
+        ]
+        result = json.loads(pywg(tmp, "--batch", "-", input=json.dumps(batch)).stdout)
+        assert [op["status"] for op in result] == ["done"] * 4 + ["skip"]
+        assert registry.get("active=").banned and not registry.get("banned=").banned
+        assert "extra=" not in registry and "new=" in registry
+        assert PeerTable.load(conf).render() == registry.render()
+        assert running_peers(tmp) == {"banned=", "new="}
+
+        # Занятые ключ или адрес и пустой ключ - ошибка, конфигурация не меняется
+        batch = [
+            {"mode": "new", "pubkey": "new=", "allowed_ips": "10.1.0.7/32"},
+            {"mode": "new", "pubkey": "other=", "allowed_ips": "10.1.0.5/32"},
+            {"mode": "new", "allowed_ips": "10.1.0.8/32"},
+            {"mode": "ban", "pubkey": ""},
+        ]
+        result = json.loads(pywg(tmp, "--batch", "-", input=json.dumps(batch)).stdout)
+        assert [op["status"] for op in result] == ["fail"] * 4, result
+        assert "None" not in registry.render() and "other=" not in registry
+
+        # Правка файла в обход реестра перезаписывается следующим изменением
+        with open(conf, "a") as file:
+            file.write("\n[Peer]\nPublicKey = outside=\nAllowedIPs = 10.1.1.1/32\n")
+        pywg(tmp, "new2=", "-ips", "10.1.0.6/32")
+        assert "outside=" not in PeerTable.load(conf)
+        assert [peer["publickey"] for peer in json.loads(pywg(tmp, "-l", "--json").stdout)] == [
+            "active=", "banned=", "new=", "new2="
+        ]
+
+        # Ошибка записи конфигурации откатывает транзакцию реестра
+        try:
+            with registry.transaction():
+                registry.ban("new=")
+                registry.dump(os.path.join(tmp, "missing", "wg1.conf"))
+        except OSError:
+            pass
+        assert not registry.get("new=").banned
+
+        try:
+            registry.add("other=", "10.1.0.5/32")
+        except PeerStateError:
+            pass
+        else:
+            raise AssertionError("duplicate address must raise")
+        registry.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conf = os.path.join(tmp, "wg1.conf")
+        table = PeerTable.parse(CONF.split("\n[Peer]")[0])
+        for n in range(PEERS):
+            table.add(f"key{n}=", f"10.2.{n // 250}.{n % 250 + 1}/32", banned=n % 10 == 0)
+        table.dump(conf)
+
+        start = perf_counter()
+        registry = PeerRegistry.import_conf(conf)
+        imported = perf_counter() - start
+
+        start = perf_counter()
+        for n in range(0, PEERS, 10):
+            registry.get(f"key{n}=")
+            registry.find(f"10.2.{n // 250}.{n % 250 + 1}/32")
+        lookup = (perf_counter() - start) / (PEERS // 10 * 2)
+
+        start = perf_counter()
+        with registry.transaction():
+            registry.unban("key0=")
+            registry.dump(conf)
+        change = perf_counter() - start
+
+        assert registry.count(banned=True) == PEERS // 10 - 1
+        registry.close()
+
+    print(
+        f"peers={PEERS}  import={imported * 1000:.0f} msec  "
+        f"lookup={lookup * 1e6:.1f} usec  change+render={change * 1000:.0f} msec"
+    )
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
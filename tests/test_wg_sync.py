@@ -0,0 +1,152 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+TESTS = os.path.dirname(os.path.abspath(__file__))
+PYWG = os.path.join(TESTS, "..", "src", "wg", "pywg.py")
+FAKE_WG = os.path.join(TESTS, "fake_wg.py")
+
+sys.path.insert(1, os.path.join(TESTS, "..", "src", "wg"))
+
+from pywg import PeerTable, desired_hash
+
+PEERS = 5000
+
+CONF = """[Interface]
+Address = 10.1.0.1/16
+ListenPort = 51820
+PrivateKey = cHJpdmF0ZQ==
+
+[Peer]
+PublicKey = keep=
+AllowedIPs = 10.1.0.2/32
+PersistentKeepalive = 25
+# client laptop
+
+[Peer]
+PublicKey = stale=
+AllowedIPs = 10.1.0.3/32
+
+# [Peer]
+# PublicKey = frozen=
+# AllowedIPs = 10.1.0.4/32
+
+[Peer]
+PublicKey = moved=
+AllowedIPs = 10.1.0.5/32
+"""
+
+
+def pywg(tmp, *args, input=None):
+    env = dict(
+        os.environ,
+        FAKE_WG_STATE=os.path.join(tmp, "state.json"),
+        FAKE_WG_LOG=os.path.join(tmp, "wg.log"),
+    )
+    return subprocess.run(
+        [sys.executable, PYWG, "--wgpath", os.path.join(tmp, "wg1.conf"),
+         "--wg", FAKE_WG, "--raises", *args],
+        input=input, env=env, capture_output=True, text=True, check=True,
+    )
+
+
+def sync(tmp, peers, *args):
+    return json.loads(pywg(tmp, "--sync", "-", *args, input=json.dumps(peers)).stdout)
+
+
+def wg_calls(tmp):
+    with open(os.path.join(tmp, "wg.log")) as file:
+        return [line.split()[0] for line in file]
+
+
+def main():
+    desired = [
+        {"pubkey": "keep=", "allowed_ips": "10.1.0.2/32", "ban": False},
+        {"pubkey": "frozen=", "allowed_ips": "10.1.0.4/32", "ban": False},
+        {"pubkey": "moved=", "allowed_ips": "10.1.0.9/32", "ban": False},
+        {"pubkey": "new=", "allowed_ips": "10.1.0.6", "ban": True},
+    ]
+    assert desired_hash(desired) == desired_hash(desired[::-1])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conf = os.path.join(tmp, "wg1.conf")
+        with open(conf, "w") as file:
+            file.write(CONF)
+
+        # Конфигурация приводится к набору одной командой wg syncconf
+        result = sync(tmp, desired)
+        assert result["status"] == "synced" and not result["failed"]
+        assert result["changes"] == {"del": 2, "new": 2, "unban": 1, "ban": 1}, result
+        table = PeerTable.load(conf)
+        assert {peer.public_key: (peer.allowed_ips, peer.banned) for peer in table} == {
+            "keep=": ("10.1.0.2/32", False),
+            "frozen=": ("10.1.0.4/32", False),
+            "moved=": ("10.1.0.9/32", False),
+            "new=": ("10.1.0.6/32", True),
+        }
+        assert ("# client laptop") in table.get("keep=").lines()
+        assert wg_calls(tmp) == ["syncconf"]
+        with open(os.path.join(tmp, "state.json")) as file:
+            assert set(json.load(file)["wg1"]) == {"keep=", "frozen=", "moved="}
+
+        # Тот же набор и проверка хэша без набора - ничего не делают
+        assert sync(tmp, desired[::-1])["status"] == "unchanged"
+        checked = json.loads(pywg(tmp, "--sync-hash", result["hash"]).stdout)
+        assert checked["status"] == "unchanged"
+        assert wg_calls(tmp) == ["syncconf"]
+
+        # Изменение в обход синхронизации делает состояние устаревшим
+        pywg(tmp, "-m", "ban", "keep=")
+        checked = json.loads(pywg(tmp, "--sync-hash", result["hash"]).stdout)
+        assert checked["status"] == "stale"
+        assert sync(tmp, desired)["changes"] == {"unban": 1}
+
+        # --force синхронизирует интерфейс без изменений конфигурации
+        forced = sync(tmp, desired, "--force")
+        assert forced["status"] == "synced" and forced["changes"] == {}
+
+        # Повтор адреса в наборе - ошибка операции, хэш не сохраняется
+        broken = desired + [{"pubkey": "dup=", "allowed_ips": "10.1.0.2/32", "ban": False}]
+        assert [item["pubkey"] for item in sync(tmp, broken)["failed"]] == ["dup="]
+        assert sync(tmp, broken)["status"] == "synced"
+
+        # Реестр пиров синхронизируется так же
+        pywg(tmp, "--import")
+        assert sync(tmp, desired[:2])["changes"] == {"del": 2}
+        assert [peer["publickey"] for peer in json.loads(pywg(tmp, "-l", "--json").stdout)] == [
+            "keep=", "frozen="
+        ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with open(os.path.join(tmp, "wg1.conf"), "w") as file:
+            file.write(CONF.split("\n\n[Peer]")[0] + "\n")
+        peers = [
+            {"pubkey": f"key{n}=", "allowed_ips": f"10.2.{n // 250}.{n % 250 + 1}/32", "ban": n % 10 == 0}
+            for n in range(PEERS)
+        ]
+
+        start = perf_counter()
+        sync(tmp, peers)
+        full = perf_counter() - start
+
+        peers[1]["ban"] = True
+        start = perf_counter()
+        assert sync(tmp, peers)["changes"] == {"ban": 1}
+        delta = perf_counter() - start
+
+        start = perf_counter()
+        assert json.loads(pywg(tmp, "--sync-hash", desired_hash(peers)).stdout)["status"] == "unchanged"
+        check = perf_counter() - start
+
+    print(
+        f"PEERS={PEERS}  full={full * 1000:.0f} msec  one change={delta * 1000:.0f} msec  "
+        f"hash check={check * 1000:.0f} msec"
+    )
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()